@@ -0,0 +1,68 @@
+import { spawn } from "child_process";
+import { Readable } from "stream";
+
+// Streaming export of practitioners (see data_extraction/export_praticiens.py)
+//   ?format=ndjson|csv|parquet&metier=10,60&specialite=08&departement=54&ville=Nancy&bbox=minLon,minLat,maxLon,maxLat
+// The file is streamed from the exporter's stdout as it is written: memory stays constant on both sides.
+const CONTENT_TYPES: Record<string, string> = {
+  ndjson: "application/x-ndjson; charset=utf-8",
+  csv: "text/csv; charset=utf-8",
+  parquet: "application/vnd.apache.parquet",
+};
+
+export async function GET(req: Request) {
+  const params = new URL(req.url).searchParams;
+  const format = params.get("format") ?? "ndjson";
+  if (!(format in CONTENT_TYPES)) {
+    return Response.json({ success: false, error: `Unknown format: ${format}` }, { status: 400 });
+  }
+
+  const args = ["data_extraction/export_praticiens.py", "--db", "data_extraction/GrandEst.db", "--format", format];
+
+  const metiers = params.get("metier")?.split(",").filter((m) => /^\w+$/.test(m)) ?? [];
+  if (metiers.length) {
+    args.push("--metier", ...metiers);
+  }
+  for (const name of ["specialite", "departement", "ville"]) {
+    const value = params.get(name)?.trim();
+    if (value) {
+      args.push(`--${name}=${value}`);  // single argument: a value starting with "-" is not read as an option
+    }
+  }
+  const bbox = params.get("bbox")?.split(",").map(Number);
+  if (bbox) {
+    if (bbox.length !== 4 || !bbox.every(Number.isFinite)) {
+      return Response.json({ success: false, error: "Expected bbox=minLon,minLat,maxLon,maxLat" }, { status: 400 });
+    }
+    args.push(`--bbox=${bbox.join(",")}`);  // negative longitudes start with "-"
+  }
+
+  // Arguments passed as-is (no shell): filters cannot inject commands
+  const child = spawn(".venv/bin/python3", args, { stdio: ["ignore", "pipe", "pipe"] });
+  child.stderr.on("data", (chunk) => process.stderr.write(chunk));
+  req.signal.addEventListener("abort", () => child.kill());
+
+  // Wait for the first bytes (or the exit) so that a failure before any output becomes a 500
+  const stdout = child.stdout;
+  const first = await new Promise<Buffer | number | null>((resolve) => {
+    stdout.once("data", (chunk: Buffer) => {
+      stdout.pause();
+      resolve(chunk);
+    });
+    child.once("close", (code) => resolve(code));
+    child.once("error", () => resolve(null));
+  });
+  if (first === null || (typeof first === "number" && first !== 0)) {
+    return Response.json({ success: false, error: "Export failed" }, { status: 500 });
+  }
+  if (Buffer.isBuffer(first)) {
+    stdout.unshift(first);
+  }
+
+  return new Response(Readable.toWeb(stdout) as ReadableStream, {
+    headers: {
+      "Content-Type": CONTENT_TYPES[format],
+      "Content-Disposition": `attachment; filename="praticiens.${format}"`,
+    },
+  });
+}
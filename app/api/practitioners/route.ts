@@ -0,0 +1,49 @@
+import { NextResponse } from "next/server";
+import { execFile } from "child_process";
+import util from "util";
+
+const execFilePromise = util.promisify(execFile);
+
+// Geocoded practitioners of a map viewport or around a point (see data_extraction/query_db.py)
+//   ?bbox=minLon,minLat,maxLon,maxLat[&metier=10,60][&limit=500]
+//   ?lat=48.69&lon=6.18[&radius=2][&metier=10][&limit=20]   (radius in km)
+export async function GET(req: Request) {
+  try {
+    const url = new URL(req.url);
+    const params = url.searchParams;
+    const limit = Math.min(Math.max(parseInt(params.get("limit") ?? "500", 10) || 500, 1), 5000);
+    const metiers = params.get("metier")?.split(",").filter((m) => /^\w+$/.test(m)) ?? [];
+
+    const args = ["data_extraction/query_db.py", "--db", "data_extraction/GrandEst.db", "--json", "--limit", String(limit)];
+
+    const bbox = params.get("bbox")?.split(",").map(Number);
+    const lat = Number(params.get("lat"));
+    const lon = Number(params.get("lon"));
+    if (bbox && bbox.length === 4 && bbox.every(Number.isFinite)) {
+      args.push("--bbox", bbox.join(","));
+    } else if (params.has("lat") && params.has("lon") && Number.isFinite(lat) && Number.isFinite(lon)) {
+      const radius = Number(params.get("radius") ?? "1");
+      args.push("--pres", `${lat},${lon}`, "--rayon", String(Number.isFinite(radius) && radius > 0 ? radius : 1));
+    } else {
+      return NextResponse.json(
+        { success: false, error: "Expected bbox=minLon,minLat,maxLon,maxLat or lat & lon" },
+        { status: 400 }
+      );
+    }
+    if (metiers.length) {
+      args.push("--metier", ...metiers);
+    }
+
+    const { stdout } = await execFilePromise(".venv/bin/python3", args, { maxBuffer: 64 * 1024 * 1024 });
+
+    return NextResponse.json({
+      success: true,
+      results: JSON.parse(stdout)
+    });
+  } catch (e: any) {
+    return NextResponse.json(
+      { success: false, error: e.message },
+      { status: 500 }
+    );
+  }
+}
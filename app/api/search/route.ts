@@ -0,0 +1,37 @@
+import { NextResponse } from "next/server";
+import { execFile } from "child_process";
+import util from "util";
+
+const execFilePromise = util.promisify(execFile);
+
+// Search practitioners by name, first name or address (accent-insensitive, see data_extraction/query_db.py)
+export async function GET(req: Request) {
+  try {
+    const url = new URL(req.url);
+    const q = url.searchParams.get("q")?.trim() ?? "";
+    const limit = Math.min(Math.max(parseInt(url.searchParams.get("limit") ?? "20", 10) || 20, 1), 100);
+
+    if (!q) {
+      return NextResponse.json({ success: true, results: [] });
+    }
+
+    // Arguments passed as-is (no shell): the query cannot inject commands
+    const { stdout } = await execFilePromise(".venv/bin/python3", [
+      "data_extraction/query_db.py",
+      "--db", "data_extraction/GrandEst.db",
+      `--recherche=${q}`,  // single argument: a query starting with "-" is not read as an option
+      "--limit", String(limit),
+      "--json",
+    ]);
+
+    return NextResponse.json({
+      success: true,
+      results: JSON.parse(stdout)
+    });
+  } catch (e: any) {
+    return NextResponse.json(
+      { success: false, error: e.message },
+      { status: 500 }
+    );
+  }
+}
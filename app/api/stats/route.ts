@@ -0,0 +1,32 @@
+import { NextResponse } from "next/server";
+import { execFile } from "child_process";
+import util from "util";
+
+const execFilePromise = util.promisify(execFile);
+
+// Database statistics read from the summary tables (see data_extraction/query_db.py get_stats)
+//   ?limit=10  number of cities / specialties returned
+export async function GET(req: Request) {
+  try {
+    const url = new URL(req.url);
+    const limit = Math.min(Math.max(parseInt(url.searchParams.get("limit") ?? "10", 10) || 10, 1), 1000);
+
+    const { stdout } = await execFilePromise(".venv/bin/python3", [
+      "data_extraction/query_db.py",
+      "--db", "data_extraction/GrandEst.db",
+      "--stats",
+      "--limit", String(limit),
+      "--json",
+    ]);
+
+    return NextResponse.json({
+      success: true,
+      stats: JSON.parse(stdout)
+    });
+  } catch (e: any) {
+    return NextResponse.json(
+      { success: false, error: e.message },
+      { status: 500 }
+    );
+  }
+}
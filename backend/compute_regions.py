@@ -7,6 +7,7 @@ Usage example:
 
 """
 
+import os
 import sqlite3
 from typing import Optional, List, Tuple
 import argparse
@@ -30,10 +31,108 @@ except Exception as e:
     )
 
 
-def read_praticiens_and_adresses(db_path: str, metier_ids: list) -> pd.DataFrame:
+def snapshot_path(db_path: str) -> str:
+    """Columnar snapshot written next to the db after each load (see data_extraction/snapshot_praticiens.py)"""
+    return os.path.splitext(db_path)[0] + '.arrow'
+
+
+def snapshot_is_fresh(path: str, db_path: str) -> bool:
+    """The snapshot exists and was written after the last change to the db (or its WAL)"""
+    if not os.path.exists(path):
+        return False
+    db_mtime = max((os.path.getmtime(f) for f in (db_path, db_path + '-wal') if os.path.exists(f)), default=0.0)
+    return os.path.getmtime(path) >= db_mtime
+
+
+def read_snapshot(path: str, metier_ids: list, bbox: Optional[Tuple[float, float, float, float]] = None) -> Optional[pd.DataFrame]:
+    """
+    Praticiens with any of the metier_ids (and inside bbox if given) from the columnar snapshot.
+    The file is memory-mapped and filtered with NumPy masks over zero-copy column views;
+    only the selected rows are materialized.
+    Returns a DataFrame with columns: praticien_id, adresse_id, latitude, longitude, x, y
+    (x/y in EPSG:2154), or None if pyarrow is not installed.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+
+    wanted = {str(m) for m in metier_ids}
+    parts = []
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            metier = batch.column('metier_id')
+            codes = [k for k, v in enumerate(metier.dictionary.to_pylist()) if v in wanted]
+            lat = batch.column('latitude').to_numpy()
+            lon = batch.column('longitude').to_numpy()
+            mask = np.isin(metier.indices.to_numpy(), codes) & np.isfinite(lat) & np.isfinite(lon)
+            if bbox is not None:
+                min_lon, min_lat, max_lon, max_lat = bbox
+                mask &= (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+            if not mask.any():
+                continue
+            selected = batch.filter(pa.array(mask))
+            parts.append(pd.DataFrame({
+                'praticien_id': selected.column('rpps').to_pylist(),
+                'adresse_id': selected.column('adresse_id').to_numpy(zero_copy_only=False),
+                'latitude': lat[mask],
+                'longitude': lon[mask],
+                'x': selected.column('x').to_numpy(),
+                'y': selected.column('y').to_numpy(),
+            }))
+
+    if not parts:
+        raise ValueError(f"No geocoded praticien found for metier_ids={metier_ids}" + (f" in bbox={bbox}" if bbox else ""))
+    return pd.concat(parts, ignore_index=True)
+
+
+def metier_filter(con: sqlite3.Connection, metier_ids: list) -> Tuple[str, list]:
+    """
+    SQL condition on Praticien p for the given metier codes (10, 60...), and its params.
+    Praticien.metier_id is an integer key into Metier (codes in Metier.code);
+    older dbs (see data_extraction/create_database.py migrate_cles) store the codes directly.
+    """
+    placeholders = ','.join(['?']*len(metier_ids))
+    codes = [str(m) for m in metier_ids]
+    if 'code' in [row[1] for row in con.execute("PRAGMA table_info(Metier)")]:
+        return f"p.metier_id IN (SELECT metier_id FROM Metier WHERE code IN ({placeholders}))", codes
+    return f"p.metier_id IN ({placeholders})", codes
+
+
+def read_praticiens_in_bbox(con: sqlite3.Connection, metier_ids: list, bbox: Tuple[float, float, float, float]) -> pd.DataFrame:
+    """
+    Praticiens with any of the metier_ids whose adresse lies in bbox (min_lon, min_lat, max_lon, max_lat).
+    Uses the GeoAdresse R*Tree (see data_extraction/create_database.py) when the db has it,
+    so only the addresses of the viewport are read.
+    Returns a DataFrame with columns: praticien_id, adresse_id, latitude, longitude
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    has_rtree = con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'GeoAdresse'").fetchone()
+    if has_rtree:
+        source = ("FROM GeoAdresse g CROSS JOIN Adresse a ON a.adresse_id = g.adresse_id "
+                  "CROSS JOIN Praticien p ON p.adresse_id = a.adresse_id "
+                  "WHERE g.max_lat >= ? AND g.min_lat <= ? AND g.max_lon >= ? AND g.min_lon <= ? AND")
+        params = [min_lat, max_lat, min_lon, max_lon]
+    else:
+        source = "FROM Adresse a JOIN Praticien p ON p.adresse_id = a.adresse_id WHERE"
+        params = []
+
+    metiers, metier_params = metier_filter(con, metier_ids)
+    q = (f"SELECT p.rpps AS praticien_id, a.adresse_id, a.latitude, a.longitude {source} "
+         f"a.latitude BETWEEN ? AND ? AND a.longitude BETWEEN ? AND ? "
+         f"AND {metiers} AND p.retire_le IS NULL")
+    df = pd.read_sql_query(q, con, params=params + [min_lat, max_lat, min_lon, max_lon] + metier_params)
+    if df.empty:
+        raise ValueError(f"No geocoded praticien found for metier_ids={metier_ids} in bbox={bbox}")
+    return df
+
+
+def read_praticiens_and_adresses(db_path: str, metier_ids: list, bbox: Optional[Tuple[float, float, float, float]] = None) -> pd.DataFrame:
     """
     Connect to the sqlite db, find praticiens with any of the metier_ids, 
-    then get their adresse coords.
+    then get their adresse coords (only inside bbox if given, see read_praticiens_in_bbox).
     Returns a DataFrame with columns: praticien_id, adresse_id, latitude, longitude
     """
     if not metier_ids:
@@ -41,10 +140,13 @@ def read_praticiens_and_adresses(db_path: str, metier_ids: list) -> pd.DataFrame
 
     con = sqlite3.connect(db_path)
     try:
+        if bbox is not None:
+            return read_praticiens_in_bbox(con, metier_ids, bbox)
+
         # fetch praticien ids and adresse_ids
-        placeholders = ','.join(['?']*len(metier_ids))
-        q = f"SELECT rpps AS praticien_id, adresse_id FROM Praticien WHERE metier_id IN ({placeholders})"
-        praticien_df = pd.read_sql_query(q, con, params=metier_ids)
+        metiers, metier_params = metier_filter(con, metier_ids)
+        q = f"SELECT p.rpps AS praticien_id, p.adresse_id FROM Praticien p WHERE {metiers} AND p.retire_le IS NULL"
+        praticien_df = pd.read_sql_query(q, con, params=metier_params)
         
         if praticien_df.empty:
             raise ValueError(f"No praticien found for metier_ids={metier_ids}")
@@ -227,30 +329,46 @@ def generate_voronoi_clipped(
     image_path: str = "data/voronoi_plot.png",
     points_crs: str = "EPSG:4326",
     voronoi_buffer: float = 10000.0,
-    dissolve_regions: bool = False
+    dissolve_regions: bool = False,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    use_snapshot: bool = True
 ) -> gpd.GeoDataFrame:
     """
     Full pipeline: read DB, make points GeoDataFrame, build Voronoi, clip to regions, save result.
+    bbox (min_lon, min_lat, max_lon, max_lat) limits the praticiens to a viewport.
+    With use_snapshot, praticiens are read from the db's columnar snapshot when it is up to date
+    (see read_snapshot), otherwise from SQLite.
     Returns the clipped GeoDataFrame (but also writes to disk).
     """
-    # 1) read praticien + adresse
-    df = read_praticiens_and_adresses(db_path, metier_id)
-
-    # 2) create points GeoDataFrame (assume adresse longitude, latitude)
-    # If your DB saved lat/lon in other order, swap accordingly
-    pts = gpd.GeoDataFrame(
-        df[['praticien_id', 'adresse_id']].copy(),
-        geometry=[Point(xy) for xy in zip(df['longitude'].astype(float), df['latitude'].astype(float))],
-        crs=points_crs
-    )
-
-    # 3) read regions shapefile (zip)
+    # 1) read praticien + adresse (snapshot first)
+    df = None
+    snapshot = snapshot_path(db_path)
+    if use_snapshot and snapshot_is_fresh(snapshot, db_path):
+        df = read_snapshot(snapshot, metier_id, bbox)
+    if df is None:
+        df = read_praticiens_and_adresses(db_path, metier_id, bbox)
+
+    # 2) read regions shapefile (zip)
     regions = gpd.read_file(f"zip://{regions_zip}")
-
-    # 4) project points to regions CRS (so Voronoi computed in same linear units)
     if regions.crs is None:
         raise ValueError("Regions shapefile has no CRS. Set a CRS on the shapefile or pass points_crs matching it.")
-    pts = pts.to_crs(regions.crs)
+
+    # 3) create points GeoDataFrame in the regions CRS (so Voronoi computed in same linear units):
+    # snapshot x/y are already Lambert-93, otherwise project adresse longitude, latitude
+    if 'x' in df and regions.crs.to_epsg() == 2154:
+        pts = gpd.GeoDataFrame(
+            df[['praticien_id', 'adresse_id']].copy(),
+            geometry=gpd.points_from_xy(df['x'], df['y']),
+            crs=regions.crs
+        )
+    else:
+        # If your DB saved lat/lon in other order, swap accordingly
+        pts = gpd.GeoDataFrame(
+            df[['praticien_id', 'adresse_id']].copy(),
+            geometry=[Point(xy) for xy in zip(df['longitude'].astype(float), df['latitude'].astype(float))],
+            crs=points_crs
+        )
+        pts = pts.to_crs(regions.crs)
 
     # Remove duplicate coordinates (critical!)
     pts = pts.drop_duplicates(subset=['geometry'])
@@ -262,12 +380,12 @@ def generate_voronoi_clipped(
             f"Only {len(pts)} unique points after deduplication."
         )
 
-    # 5) build a unified geometry to use as clipping extent (could also use regions.unary_union)
+    # 4) build a unified geometry to use as clipping extent (could also use regions.unary_union)
     unified_regions = unary_union(regions.geometry)
 
     voronoi_gdf = build_voronoi_gdf(pts, clip_extent_geom=unified_regions, buffer=voronoi_buffer)
 
-    # 6) clip voronoi onto regions (gets intersections per region)
+    # 5) clip voronoi onto regions (gets intersections per region)
     clipped = clip_voronoi_to_regions(voronoi_gdf, regions)
 
     # Optionally dissolve by praticien_id so each praticien has a single geometry (if intersections split across multiple region polygons)
@@ -276,7 +394,7 @@ def generate_voronoi_clipped(
         # reattach adresse_id if needed (this may require aggregating — here we keep the first)
         # NOTE: if multiple adresse_id per praticien, adjust accordingly
 
-    # 7) save
+    # 6) save
     if output_path.lower().endswith('.gpkg'):
         clipped.to_file(output_path, layer='voronoi_clipped', driver='GPKG')
     elif output_path.lower().endswith('.shp'):
@@ -331,10 +449,12 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Build Voronoi for praticiens of a given metier and clip to regions shapefile (zip).")
     parser.add_argument("--db", required=True, help="Path to sqlite database (e.g., database.db)")
     parser.add_argument("--regions", required=True, help="Path to zipped shapefile (e.g., regions.zip)")
-    parser.add_argument("--metier", required=True, type=int,nargs="+", help="metier_id to filter praticiens")
+    parser.add_argument("--metier", required=True, type=int,nargs="+", help="metier codes (10, 60...) to filter praticiens")
     parser.add_argument("--out", required=False, default="voronoi_clipped.gpkg", help="Output path (.gpkg or .shp recommended)")
     parser.add_argument("--buffer", required=False, type=float, default=10000.0, help="Buffer distance (same units as regions CRS) used when capping infinite Voronoi faces")
     parser.add_argument("--dissolve", action='store_true', help="Dissolve intersections so result has one geometry per praticien_id")
+    parser.add_argument("--bbox", required=False, help="Only praticiens inside min_lon,min_lat,max_lon,max_lat (degrees)")
+    parser.add_argument("--no-snapshot", action='store_true', help="Read praticiens from SQLite even if the columnar snapshot is up to date")
     args = parser.parse_args()
 
     clipped_gdf = generate_voronoi_clipped(
@@ -343,7 +463,9 @@ if __name__ == "__main__":
         regions_zip=args.regions,
         output_path=args.out,
         voronoi_buffer=args.buffer,
-        dissolve_regions=args.dissolve
+        dissolve_regions=args.dissolve,
+        bbox=tuple(float(v) for v in args.bbox.split(',')) if args.bbox else None,
+        use_snapshot=not args.no_snapshot
     )
     print(f"Wrote {len(clipped_gdf)} clipped Voronoi features to {args.out}")
 
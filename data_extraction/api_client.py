@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Client HTTP partagé par les scripts d'extraction (API FHIR annuaire santé, API Adresse, geo.api)
+- Une session keep-alive par thread
+- Un limiteur de débit adaptatif par hôte : accélère tant que les réponses sont saines,
+  ralentit sur 429/5xx et respecte l'en-tête Retry-After
+- Nouvelles tentatives avec backoff exponentiel et gigue
+- Compteurs par endpoint (requêtes, tentatives, erreurs par statut, histogramme de latence)
+  tenus dans metriques.py
+
+Les échecs définitifs lèvent APIError : une donnée manquante n'est jamais silencieuse.
+Usage: python3 api_client.py   # Vérifie l'accès aux APIs et affiche les compteurs
+"""
+
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+import metriques
+
+# Configuration API (modifiable via les variables d'environnement, ex: serveur de test local)
+API_URL = os.environ.get('ESANTE_API_URL', "https://gateway.api.esante.gouv.fr/fhir")
+API_KEY = os.environ.get('ESANTE_API_KEY', "93f55893-96fa-4364-b558-9396fa2364d7")
+HEADERS = {
+    "ESANTE-API-KEY": API_KEY,
+    "Accept": "application/json"
+}
+
+# API de géocodage
+GEOCODING_API = os.environ.get('GEOCODING_API_URL', "https://api-adresse.data.gouv.fr/search/")
+
+# API découpage administratif
+GEO_API = os.environ.get('GEO_API_URL', "https://geo.api.gouv.fr")
+
+# Serveur de terminologies (nomenclatures des spécialités)
+SMT_API = os.environ.get('SMT_API_URL', "https://smt.esante.gouv.fr/fhir")
+
+# Nouvelles tentatives
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5      # secondes
+BACKOFF_MAX = 60.0      # secondes
+RETRY_AFTER_MAX = 120.0 # secondes : Retry-After plus long ramené à ce plafond
+
+# Limiteur adaptatif (requêtes par seconde, par hôte)
+RATE_INITIAL = 10.0
+RATE_MIN = 0.5
+RATE_MAX = float(os.environ.get('API_RATE_MAX', 50.0))
+RATE_INCREASE = 0.5     # ajouté après chaque réponse saine
+RATE_DECREASE = 0.5     # facteur appliqué sur 429/5xx
+
+# Statuts pour lesquels une nouvelle tentative a un sens
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class APIError(Exception):
+    """Échec définitif d'une requête (après toutes les tentatives)"""
+
+    def __init__(self, endpoint: str, message: str, status: Optional[int] = None):
+        super().__init__(f"{endpoint}: {message}")
+        self.endpoint = endpoint
+        self.status = status
+
+
+class AdaptiveLimiter:
+    """
+    Limiteur de débit AIMD : augmentation additive du débit tant que tout va bien,
+    diminution multiplicative dès que le serveur signale une surcharge.
+    """
+
+    def __init__(self, host: str = '', rate: float = RATE_INITIAL):
+        self.host = host
+        self.rate = rate
+        self.next_slot = 0.0
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Attend le prochain créneau disponible"""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot, self.paused_until)
+            self.next_slot = slot + 1.0 / self.rate
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def success(self):
+        with self.lock:
+            self.rate = min(RATE_MAX, self.rate + RATE_INCREASE)
+        metriques.set_gauge('crawl_http_rate_limit', self.rate, hote=self.host)
+
+    def throttled(self, retry_after: Optional[float] = None):
+        with self.lock:
+            self.rate = max(RATE_MIN, self.rate * RATE_DECREASE)
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        metriques.set_gauge('crawl_http_rate_limit', self.rate, hote=self.host)
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    """Session HTTP keep-alive propre au thread courant"""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        _local.session = session
+    return session
+
+
+def _limiter(url: str) -> AdaptiveLimiter:
+    host = urlparse(url).netloc
+    with _lock:
+        if host not in _limiters:
+            _limiters[host] = AdaptiveLimiter(host)
+        return _limiters[host]
+
+
+def _record(endpoint: str, statut, latency: float):
+    """Enregistre une réponse (ou une erreur réseau) et sa latence"""
+    metriques.inc('crawl_http_requests_total', endpoint=endpoint)
+    metriques.inc('crawl_http_responses_total', endpoint=endpoint, statut=statut)
+    metriques.observe('crawl_http_request_duration_seconds', latency, endpoint=endpoint)
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    """
+    Délai demandé par le serveur (Retry-After en secondes ou date HTTP), plafonné à
+    RETRY_AFTER_MAX : un délai d'une heure bloquerait le thread (et l'hôte) à chaque tentative
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(0.0, delay), RETRY_AFTER_MAX)
+
+
+def _backoff(attempt: int) -> float:
+    """Backoff exponentiel avec gigue complète"""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def request(endpoint: str, url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None,
+            timeout: float = 30, allow_404: bool = False) -> Optional[requests.Response]:
+    """
+    Requête GET avec limitation de débit et nouvelles tentatives.
+
+    Args:
+        endpoint: Nom de l'endpoint pour les compteurs (ex: 'Practitioner', 'geocoder')
+        allow_404: Retourner None sur 404 au lieu de lever APIError
+
+    Raises:
+        APIError: après MAX_RETRIES tentatives, ou immédiatement sur une erreur client (4xx)
+    """
+    limiter = _limiter(url)
+    last_error = None
+
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt:
+            metriques.inc('crawl_http_retries_total', endpoint=endpoint)
+
+        limiter.acquire()
+        start = time.monotonic()
+
+        try:
+            response = _session().get(url, params=params, headers=headers, timeout=timeout)
+        except requests.RequestException as e:
+            _record(endpoint, 'reseau', time.monotonic() - start)
+            last_error = APIError(endpoint, f"erreur réseau: {e}")
+            limiter.throttled()
+            time.sleep(_backoff(attempt))
+            continue
+
+        _record(endpoint, response.status_code, time.monotonic() - start)
+
+        if response.status_code < 400:
+            limiter.success()
+            return response
+
+        if response.status_code == 404 and allow_404:
+            limiter.success()
+            return None
+
+        if response.status_code in RETRY_STATUSES:
+            retry_after = _retry_after(response)
+            limiter.throttled(retry_after)
+            last_error = APIError(endpoint, f"HTTP {response.status_code}", response.status_code)
+            time.sleep(retry_after if retry_after is not None else _backoff(attempt))
+            continue
+
+        # Erreur client : inutile de réessayer
+        metriques.inc('crawl_http_failures_total', endpoint=endpoint)
+        raise APIError(endpoint, f"HTTP {response.status_code}: {response.text[:200]}", response.status_code)
+
+    metriques.inc('crawl_http_failures_total', endpoint=endpoint)
+    raise last_error
+
+
+def get_json(endpoint: str, url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None,
+             timeout: float = 30, allow_404: bool = False) -> Optional[Dict]:
+    """Comme request(), mais retourne le JSON décodé (None sur 404 si allow_404)"""
+    response = request(endpoint, url, params=params, headers=headers, timeout=timeout, allow_404=allow_404)
+    if response is None:
+        return None
+    try:
+        return response.json()
+    except ValueError as e:
+        metriques.inc('crawl_http_failures_total', endpoint=endpoint)
+        raise APIError(endpoint, f"réponse JSON invalide: {e}")
+
+
+def get_fhir(resource: str, path: str = '', params: Optional[Dict] = None, allow_404: bool = False) -> Optional[Dict]:
+    """Requête sur l'API FHIR de l'annuaire santé (ex: get_fhir('Practitioner', '/003-123'))"""
+    return get_json(resource, f"{API_URL}/v2/{resource}{path}", params=params, headers=HEADERS,
+                    allow_404=allow_404)
+
+
+def get_stats() -> Dict[str, Dict]:
+    """Copie des compteurs par endpoint (avec le débit courant de chaque hôte)"""
+    stats = {}
+
+    def endpoint_stats(endpoint):
+        return stats.setdefault(endpoint, {
+            'requetes': 0, 'succes': 0, 'tentatives': 0, 'echecs': 0,
+            'latence_totale': 0.0, 'statuts': {}
+        })
+
+    for labels, count in metriques.series('crawl_http_responses_total'):
+        s = endpoint_stats(labels['endpoint'])
+        statut = int(labels['statut']) if labels['statut'].isdigit() else labels['statut']
+        s['statuts'][statut] = int(count)
+        s['requetes'] += int(count)
+        if isinstance(statut, int) and statut < 400:
+            s['succes'] += int(count)
+    for labels, count in metriques.series('crawl_http_retries_total'):
+        endpoint_stats(labels['endpoint'])['tentatives'] = int(count)
+    for labels, count in metriques.series('crawl_http_failures_total'):
+        endpoint_stats(labels['endpoint'])['echecs'] = int(count)
+    for labels, hist in metriques.series('crawl_http_request_duration_seconds'):
+        s = endpoint_stats(labels['endpoint'])
+        s['latence_totale'] = hist['sum']
+        s['latence_p90'] = metriques.percentile(hist, 0.9)
+
+    for s in stats.values():
+        s['latence_moyenne'] = s['latence_totale'] / s['requetes'] if s['requetes'] else 0.0
+
+    with _lock:
+        rates = {host: limiter.rate for host, limiter in _limiters.items()}
+    return {'endpoints': stats, 'debits': rates}
+
+
+def reset():
+    """Repart de limiteurs et de compteurs neufs (ex: entre deux runs d'un test de charge)"""
+    with _lock:
+        _limiters.clear()
+    metriques.reset()
+
+
+def print_stats():
+    """Affiche les compteurs par endpoint"""
+    stats = get_stats()
+
+    print(f"\n{'='*80}")
+    print(f"🌐 REQUÊTES HTTP")
+    print(f"{'='*80}")
+
+    for endpoint, s in sorted(stats['endpoints'].items()):
+        statuts = ', '.join(f"{k}: {v}" for k, v in sorted(s['statuts'].items(), key=lambda x: str(x[0])))
+        print(f"   • {endpoint}: {s['requetes']} requêtes, {s['succes']} succès, "
+              f"{s['tentatives']} nouvelles tentatives, {s['echecs']} échecs, "
+              f"{s['latence_moyenne'] * 1000:.0f} ms en moyenne, p90 ≤ {s.get('latence_p90')}s ({statuts})")
+
+    for host, rate in sorted(stats['debits'].items()):
+        print(f"   ⚡ {host}: {rate:.1f} req/s")
+
+    print(f"{'='*80}\n")
+
+
+def main():
+    """Point d'entrée principal"""
+    for endpoint, call in (
+        ('Organization', lambda: get_fhir('Organization', params={'_count': 1})),
+        ('geocoder', lambda: get_json('geocoder', GEOCODING_API, params={'q': '1 place Stanislas 54000 Nancy', 'limit': 1})),
+        ('geo', lambda: get_json('geo', f"{GEO_API}/regions")),
+    ):
+        try:
+            call()
+            print(f"✅ {endpoint}")
+        except APIError as e:
+            print(f"❌ {e}")
+
+    print_stats()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Géocodeur local construit à partir d'un extrait de la Base Adresse Nationale (BAN)
+Usage:
+  python3 ban_geocoder.py ingest <adresses-XX.csv[.gz]> [...]
+  python3 ban_geocoder.py geocode "<adresse>"
+Exemples:
+  python3 ban_geocoder.py ingest adresses-54.csv.gz adresses-57.csv.gz
+  python3 ban_geocoder.py geocode "12 rue Saint-Dizier 54000 Nancy"
+
+Les extraits sont disponibles sur https://adresse.data.gouv.fr/data/ban/adresses/latest/csv/
+Une fois la base construite, les fonctions geocode_address() des scripts
+d'extraction l'utilisent en priorité et ne passent par l'API qu'en dernier recours.
+"""
+
+import csv
+import gzip
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+# Base locale (modifiable via la variable d'environnement BAN_DB)
+BAN_DB = os.environ.get('BAN_DB', 'ban_adresses.db')
+
+# Score minimal (coefficient de Dice sur les trigrammes) pour accepter une voie approchée
+SEUIL_FLOU = 0.6
+
+# Abréviations courantes des types de voie
+ABREVIATIONS = {
+    'ALL': 'ALLEE',
+    'AV': 'AVENUE',
+    'AVE': 'AVENUE',
+    'BD': 'BOULEVARD',
+    'BLD': 'BOULEVARD',
+    'BVD': 'BOULEVARD',
+    'CHE': 'CHEMIN',
+    'CHEM': 'CHEMIN',
+    'CRS': 'COURS',
+    'FG': 'FAUBOURG',
+    'FBG': 'FAUBOURG',
+    'IMP': 'IMPASSE',
+    'PL': 'PLACE',
+    'PLE': 'PLACE',
+    'QU': 'QUAI',
+    'R': 'RUE',
+    'RTE': 'ROUTE',
+    'SQ': 'SQUARE',
+    'ST': 'SAINT',
+    'STE': 'SAINTE',
+}
+
+# Indices de répétition (12 BIS, 3 TER, 5 A...)
+REGEX_NUMERO = re.compile(r'^(\d+)\s*(BIS|TER|QUATER|[A-Z](?=\s))?\s+(.*)$')
+REGEX_CODE_POSTAL = re.compile(r'\b(\d{5})\b')
+
+_local = threading.local()
+_disponible = None
+
+
+def normaliser(texte: str) -> str:
+    """Met en majuscules, retire les accents et la ponctuation, développe les abréviations"""
+    if not texte:
+        return ''
+    texte = unicodedata.normalize('NFKD', texte)
+    texte = ''.join(c for c in texte if not unicodedata.combining(c))
+    texte = re.sub(r'[^0-9A-Za-z]+', ' ', texte).upper()
+    mots = [ABREVIATIONS.get(mot, mot) for mot in texte.split()]
+    return ' '.join(mots)
+
+
+def trigrammes(texte: str) -> set:
+    """Trigrammes d'un libellé normalisé (avec bordures pour favoriser les débuts de mots)"""
+    texte = f"  {texte} "
+    return {texte[i:i + 3] for i in range(len(texte) - 2)}
+
+
+def separer_numero(ligne: str) -> Tuple[Optional[str], str]:
+    """Sépare '12 BIS RUE X' en ('12BIS', 'RUE X')"""
+    ligne = normaliser(ligne)
+    match = REGEX_NUMERO.match(ligne)
+    if not match:
+        return None, ligne
+    numero, repetition, voie = match.groups()
+    return f"{int(numero)}{repetition or ''}", voie
+
+
+def creer_base(db_name: str = BAN_DB):
+    """Crée les tables de la base BAN locale"""
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS BanVoie (
+            voie_id INTEGER PRIMARY KEY,
+            code_postal TEXT NOT NULL,
+            voie_norm TEXT NOT NULL,
+            nom_commune TEXT,
+            nb_trigrammes INTEGER NOT NULL,
+            UNIQUE (code_postal, voie_norm)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS BanNumero (
+            voie_id INTEGER NOT NULL,
+            numero TEXT NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            PRIMARY KEY (voie_id, numero)
+        ) WITHOUT ROWID
+    """)
+
+    # Index trigrammes -> voies, restreint au code postal pour la recherche approchée
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS BanTrigramme (
+            code_postal TEXT NOT NULL,
+            trigramme TEXT NOT NULL,
+            voie_id INTEGER NOT NULL,
+            PRIMARY KEY (code_postal, trigramme, voie_id)
+        ) WITHOUT ROWID
+    """)
+
+    conn.commit()
+    return conn
+
+
+def _ouvrir_csv(csv_file: str):
+    """Ouvre un extrait BAN, compressé ou non"""
+    if csv_file.endswith('.gz'):
+        return gzip.open(csv_file, 'rt', encoding='utf-8', newline='')
+    return open(csv_file, 'r', encoding='utf-8', newline='')
+
+
+def ingest_ban(csv_files: List[str], db_name: str = BAN_DB, batch_size: int = 50000):
+    """
+    Charge un ou plusieurs extraits CSV de la BAN (séparateur ';') dans la base locale.
+    Le chargement est idempotent : une adresse déjà présente est remplacée.
+    """
+    conn = creer_base(db_name)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.execute("PRAGMA synchronous = NORMAL")
+
+    # Voies déjà connues (ré-ingestion)
+    voies = {}
+    cursor.execute("SELECT code_postal, voie_norm, voie_id FROM BanVoie")
+    for code_postal, voie_norm, voie_id in cursor.fetchall():
+        voies[(code_postal, voie_norm)] = voie_id
+
+    start_time = time.time()
+    total = 0
+
+    for csv_file in csv_files:
+        print(f"\n📖 Lecture de {csv_file}...")
+        numeros = []
+
+        with _ouvrir_csv(csv_file) as f:
+            reader = csv.DictReader(f, delimiter=';')
+
+            for row in reader:
+                code_postal = row.get('code_postal')
+                voie_norm = normaliser(row.get('nom_voie'))
+                if not code_postal or not voie_norm or not row.get('lat') or not row.get('lon'):
+                    continue
+
+                cle = (code_postal, voie_norm)
+                voie_id = voies.get(cle)
+
+                if voie_id is None:
+                    tri = trigrammes(voie_norm)
+                    cursor.execute("""
+                        INSERT INTO BanVoie (code_postal, voie_norm, nom_commune, nb_trigrammes)
+                        VALUES (?, ?, ?, ?)
+                    """, (code_postal, voie_norm, row.get('nom_commune'), len(tri)))
+                    voie_id = cursor.lastrowid
+                    voies[cle] = voie_id
+                    cursor.executemany(
+                        "INSERT OR IGNORE INTO BanTrigramme (code_postal, trigramme, voie_id) VALUES (?, ?, ?)",
+                        [(code_postal, t, voie_id) for t in tri]
+                    )
+
+                numero = f"{int(row['numero'])}{normaliser(row.get('rep'))}" if row.get('numero', '').isdigit() else ''
+                numeros.append((voie_id, numero, float(row['lat']), float(row['lon'])))
+
+                if len(numeros) >= batch_size:
+                    cursor.executemany("INSERT OR REPLACE INTO BanNumero VALUES (?, ?, ?, ?)", numeros)
+                    total += len(numeros)
+                    numeros = []
+                    print(f"   [{total}] adresses chargées - {len(voies)} voies")
+
+        cursor.executemany("INSERT OR REPLACE INTO BanNumero VALUES (?, ?, ?, ?)", numeros)
+        total += len(numeros)
+        conn.commit()
+
+    elapsed = time.time() - start_time
+
+    print(f"\n{'='*80}")
+    print(f"📊 RÉSULTATS")
+    print(f"{'='*80}")
+    print(f"   ✅ {total} adresses chargées")
+    print(f"   ✅ {len(voies)} voies indexées")
+    print(f"   ⏱️  {elapsed:.1f}s")
+    print(f"{'='*80}\n")
+
+    conn.close()
+    return total
+
+
+def _connexion() -> Optional[sqlite3.Connection]:
+    """Connexion en lecture seule à la base BAN (une par thread), None si absente"""
+    global _disponible
+
+    if _disponible is None:
+        _disponible = os.path.exists(BAN_DB)
+    if not _disponible:
+        return None
+
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(f"file:{BAN_DB}?mode=ro", uri=True)
+        _local.conn = conn
+    return conn
+
+
+def _trouver_voie(conn, code_postal: str, voie_norm: str) -> Optional[int]:
+    """Recherche la voie exacte, puis la plus proche via l'index de trigrammes"""
+    row = conn.execute(
+        "SELECT voie_id FROM BanVoie WHERE code_postal = ? AND voie_norm = ?",
+        (code_postal, voie_norm)
+    ).fetchone()
+    if row:
+        return row[0]
+
+    tri = trigrammes(voie_norm)
+    if not tri:
+        return None
+
+    placeholders = ','.join(['?'] * len(tri))
+    row = conn.execute(f"""
+        SELECT t.voie_id, 2.0 * COUNT(*) / (? + v.nb_trigrammes) AS score
+        FROM BanTrigramme t
+        JOIN BanVoie v ON v.voie_id = t.voie_id
+        WHERE t.code_postal = ? AND t.trigramme IN ({placeholders})
+        GROUP BY t.voie_id
+        ORDER BY score DESC
+        LIMIT 1
+    """, (len(tri), code_postal, *tri)).fetchone()
+
+    if row and row[1] >= SEUIL_FLOU:
+        return row[0]
+    return None
+
+
+def _coordonnees_numero(conn, voie_id: int, numero: Optional[str]) -> Optional[Tuple[float, float]]:
+    """Coordonnées du numéro exact, sinon du numéro le plus proche, sinon du centre de la voie"""
+    if numero:
+        row = conn.execute(
+            "SELECT latitude, longitude FROM BanNumero WHERE voie_id = ? AND numero = ?",
+            (voie_id, numero)
+        ).fetchone()
+        if row:
+            return row
+
+        numero_int = int(re.match(r'\d+', numero).group())
+        row = conn.execute("""
+            SELECT latitude, longitude FROM BanNumero
+            WHERE voie_id = ? AND numero != ''
+            ORDER BY ABS(CAST(numero AS INTEGER) - ?)
+            LIMIT 1
+        """, (voie_id, numero_int)).fetchone()
+        if row:
+            return row
+
+    row = conn.execute(
+        "SELECT AVG(latitude), AVG(longitude) FROM BanNumero WHERE voie_id = ?",
+        (voie_id,)
+    ).fetchone()
+    if row and row[0] is not None:
+        return row
+    return None
+
+
+def geocode(ligne: str, code_postal: str) -> Optional[Tuple[float, float]]:
+    """
+    Géocode (ligne, code postal) avec la base locale.
+    Retourne (latitude, longitude) ou None si la base est absente ou l'adresse introuvable.
+    """
+    conn = _connexion()
+    if conn is None or not ligne or not code_postal:
+        return None
+
+    numero, voie_norm = separer_numero(ligne)
+    voie_id = _trouver_voie(conn, code_postal.strip(), voie_norm)
+    if voie_id is None:
+        return None
+
+    return _coordonnees_numero(conn, voie_id, numero)
+
+
+def geocode_address(address_complete: str) -> Dict[str, Optional[float]]:
+    """
+    Géocode une adresse en texte libre ("12 rue X 54000 Nancy"), même format
+    que les requêtes envoyées à l'API Adresse.
+    """
+    match = REGEX_CODE_POSTAL.search(address_complete or '')
+    if match:
+        coords = geocode(address_complete[:match.start()], match.group(1))
+        if coords:
+            return {'latitude': coords[0], 'longitude': coords[1]}
+
+    return {'latitude': None, 'longitude': None}
+
+
+def main():
+    """Point d'entrée principal"""
+    if len(sys.argv) < 3 or sys.argv[1] not in ('ingest', 'geocode'):
+        print("\n❌ Usage: python3 ban_geocoder.py ingest <adresses-XX.csv[.gz]> [...]")
+        print("          python3 ban_geocoder.py geocode \"<adresse>\"")
+        print("\nExemple: python3 ban_geocoder.py ingest adresses-54.csv.gz\n")
+        sys.exit(1)
+
+    if sys.argv[1] == 'ingest':
+        ingest_ban(sys.argv[2:])
+    else:
+        coords = geocode_address(sys.argv[2])
+        if coords['latitude'] is None:
+            print("❌ Adresse introuvable dans la base BAN locale")
+        else:
+            print(f"✅ GPS: {coords['latitude']}, {coords['longitude']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test de charge du crawler contre le serveur de test local (serveur_test.py)
+- Démarre le serveur dans le processus (ou utilise un serveur déjà lancé avec --externe)
+- Lance le pipeline de load_region_to_db pour chaque nombre de workers demandé,
+  avec une base, un journal et des caches neufs à chaque run
+- Rapporte le débit (tâches/s, praticiens/s, requêtes/s), les nouvelles tentatives,
+  les 429/5xx et les latences par endpoint
+
+Usage:
+    python3 bench_crawl.py                                   # 1, 4 et 8 workers, serveur sans pannes
+    python3 bench_crawl.py --workers 4,16 --latence 80 --gigue 40 --taux-erreur 0.02 --debit-max 200
+    python3 bench_crawl.py --debit-client 500                # relève le plafond du limiteur adaptatif
+    python3 bench_crawl.py --externe http://127.0.0.1:8099   # serveur lancé à part
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import serveur_test
+
+
+def run(region: str, workers: int, limit: int, mode: str, work_dir: str) -> dict:
+    """Un run complet du pipeline ; retourne ses mesures"""
+    # Importés après la configuration de l'environnement (URLs lues à l'import)
+    import api_client
+    import create_database
+    import crawl_state
+    import fetch_city
+    import load_region_to_db
+    import metriques
+    import sinks
+
+    api_client.reset()
+    fetch_city.ORG_CACHE.clear()
+    crawl_state.CRAWL_STATE_DB = os.path.join(work_dir, f"crawl_state_{workers}.db")
+    db_name = os.path.join(work_dir, f"praticiens_{workers}.db")
+
+    with redirect_stdout(io.StringIO()):
+        create_database.create_database(db_name).close()
+        state_conn = crawl_state.connect_state()
+        refresh_id = crawl_state.start_refresh(state_conn, region)
+        load_region_to_db.enqueue_region(state_conn, refresh_id, region, mode)
+
+    start = time.time()
+    sink = sinks.SqliteSink(db_name)
+    results = list(load_region_to_db.run_pipeline(sink, state_conn, refresh_id, workers, limit))
+    sink.close()
+    elapsed = time.time() - start
+
+    state_conn.close()
+
+    requests_total = sum(v for _, v in metriques.series('crawl_http_requests_total'))
+    retries = sum(v for _, v in metriques.series('crawl_http_retries_total'))
+    statuses = {}
+    for labels, count in metriques.series('crawl_http_responses_total'):
+        statuses[labels['statut']] = statuses.get(labels['statut'], 0) + count
+    latencies = {
+        labels['endpoint']: (metriques.percentile(hist, 0.5), metriques.percentile(hist, 0.9))
+        for labels, hist in metriques.series('crawl_http_request_duration_seconds')
+    }
+
+    praticiens = sum(r['praticiens'] for r in results)
+    return {
+        'workers': workers,
+        'duree': elapsed,
+        'taches': len(results),
+        'erreurs': sum(1 for r in results if not r['success']),
+        'praticiens': praticiens,
+        'requetes': requests_total,
+        'tentatives': retries,
+        'statuts': statuses,
+        'latences': latencies,
+        'taches_par_seconde': len(results) / elapsed if elapsed else 0.0,
+        'praticiens_par_seconde': praticiens / elapsed if elapsed else 0.0,
+        'requetes_par_seconde': requests_total / elapsed if elapsed else 0.0,
+    }
+
+
+def print_results(results: list):
+    """Tableau comparatif des runs"""
+    print(f"\n{'='*80}")
+    print(f"📊 RÉSULTATS")
+    print(f"{'='*80}\n")
+    print(f"   {'workers':>7} {'durée':>8} {'tâches/s':>9} {'prat./s':>8} {'req/s':>7} {'retries':>8} {'429':>5} {'5xx':>5} {'échecs':>7}")
+    for r in results:
+        errors_5xx = sum(v for k, v in r['statuts'].items() if k.startswith('5'))
+        print(f"   {r['workers']:>7} {r['duree']:>7.1f}s {r['taches_par_seconde']:>9.2f} "
+              f"{r['praticiens_par_seconde']:>8.1f} {r['requetes_par_seconde']:>7.1f} {r['tentatives']:>8.0f} "
+              f"{r['statuts'].get('429', 0):>5.0f} {errors_5xx:>5.0f} {r['erreurs']:>7}")
+
+    print(f"\n   Latences (p50 / p90, bornes des buckets) du dernier run :")
+    for endpoint, (p50, p90) in sorted(results[-1]['latences'].items()):
+        print(f"   • {endpoint}: ≤ {p50}s / ≤ {p90}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure le débit du crawler contre le serveur de test local.")
+    parser.add_argument("--region", default="Grand Est", help="Région crawlée")
+    parser.add_argument("--workers", default="1,4,8", help="Nombres de workers à comparer (ex: 1,4,8)")
+    parser.add_argument("--limit", type=int, default=None, help="Au plus N tâches par run")
+    parser.add_argument("--departements", action='store_true', help="Mode préfixe de code postal")
+    parser.add_argument("--externe", default=None, help="URL d'un serveur_test.py déjà lancé")
+    parser.add_argument("--jsonl", default=None, help="Ajouter les résultats à ce fichier JSON lines")
+    parser.add_argument("--debit-client", type=float, default=None, help="Débit maximal du limiteur du client (req/s)")
+    for option in ('latence', 'gigue', 'taux_erreur', 'debit_max'):
+        parser.add_argument(f"--{option.replace('_', '-')}", type=float, default=serveur_test.CONFIG[option])
+    for option in ('communes', 'organisations', 'roles'):
+        parser.add_argument(f"--{option}", type=int, default=serveur_test.CONFIG[option])
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_crawl_')
+
+    server = None
+    if args.externe:
+        environment = serveur_test.environment(args.externe)
+    else:
+        server = serveur_test.start_in_thread(
+            latence=args.latence, gigue=args.gigue, taux_erreur=args.taux_erreur, debit_max=args.debit_max,
+            communes=args.communes, organisations=args.organisations, roles=args.roles
+        )
+        environment = server.environment()
+
+    # Pas de base BAN ni de cache d'organisations persistant : tout passe par le serveur
+    os.environ.update(environment)
+    os.environ['BAN_DB'] = os.path.join(work_dir, 'absente.db')
+    os.environ['ORG_CACHE_DB'] = ''
+    os.environ['SPE_CACHE_FILE'] = ''
+    os.environ['COMMUNES_DB'] = os.path.join(work_dir, 'communes.db')
+    if args.debit_client:
+        os.environ['API_RATE_MAX'] = str(args.debit_client)
+
+    import load_region_to_db
+    if args.region not in load_region_to_db.REGIONS:
+        print(f"❌ Région '{args.region}' non reconnue")
+        sys.exit(1)
+
+    print(f"\n🧪 Test de charge sur {environment['ESANTE_API_URL']} (fichiers dans {work_dir})")
+
+    results = []
+    for workers in (int(w) for w in args.workers.split(',')):
+        print(f"   ▶️  {workers} worker(s)...", flush=True)
+        result = run(args.region, workers, args.limit, 'departement' if args.departements else 'commune', work_dir)
+        results.append(result)
+        print(f"      {result['taches']} tâches, {result['praticiens']} praticiens en {result['duree']:.1f}s")
+
+        if args.jsonl:
+            with open(args.jsonl, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({**result, 'ts': time.time()}, ensure_ascii=False) + '\n')
+
+    print_results(results)
+
+    if server:
+        print(f"\n   Côté serveur : {json.dumps(server.get_stats())}")
+        server.shutdown()
+    print()
+
+
+if __name__ == "__main__":
+    main()
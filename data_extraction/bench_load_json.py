@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compare le chargement ligne à ligne (insert_praticiens) et le chargement en masse
+(insert_praticiens_bulk) sur un JSON synthétique au format de fetch_city.py
+Usage: python3 bench_load_json.py [nb_praticiens] [--garder]
+Exemple: python3 bench_load_json.py 100000
+
+Les deux bases doivent contenir exactement les mêmes praticiens et adresses.
+"""
+
+import io
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+from create_database import create_database
+from load_json_to_db import PROFESSIONS, insert_praticiens, insert_praticiens_bulk, tune_for_bulk
+
+# Proportion de praticiens présents deux fois dans le fichier
+TAUX_DOUBLONS = 0.02
+
+
+def generer_json(json_file: str, nb_praticiens: int, seed: int = 42):
+    """JSON de ville synthétique (quelques doublons, spécialités pour les médecins)"""
+    rng = random.Random(seed)
+    praticiens = []
+    for n in range(nb_praticiens):
+        profession = rng.choice(list(PROFESSIONS))
+        specialites = []
+        if profession == '10':
+            code = rng.choice(['01', '02', '03', '06', '08', '13'])
+            specialites = [{'code': f"SM{code}", 'libelle': f"Spécialité {code}"}]
+        numero = rng.randint(1, 200)
+        praticiens.append({
+            'rpps': f"10{n:09d}",
+            'fhir_id': f"003-{n}",
+            'nom': rng.choice(['MARTIN', 'BERNARD', 'DUBOIS', 'LEFÈVRE']),
+            'prenom': rng.choice(['Marie', 'Jean', 'Zoé', 'Loïc']),
+            'civilite': rng.choice(['M', 'MME', 'DR']),
+            'profession_code': profession,
+            'specialites': specialites,
+            'adresse': {
+                'ligne': f"{numero} rue Stanislas",
+                'code_postal': '54000',
+                'ville': 'NANCY',
+                'complete': f"{numero} rue Stanislas, 54000 NANCY",
+                'latitude': 48.69 + rng.random() / 100,
+                'longitude': 6.18 + rng.random() / 100
+            }
+        })
+    praticiens += rng.sample(praticiens, int(nb_praticiens * TAUX_DOUBLONS))
+
+    with open(json_file, 'w', encoding='utf-8') as f:
+        json.dump({'ville': 'Nancy', 'praticiens': praticiens}, f, ensure_ascii=False)
+
+
+def mesurer(db_name: str, praticiens: list, bulk: bool) -> tuple:
+    """Charge les praticiens dans une base neuve ; retourne (durée, stats)"""
+    with redirect_stdout(io.StringIO()):
+        create_database(db_name).close()
+
+    conn = sqlite3.connect(db_name)
+    start = time.time()
+    if bulk:
+        tune_for_bulk(conn)
+        stats = insert_praticiens_bulk(conn, praticiens, progress=False)
+    else:
+        stats = insert_praticiens(conn, praticiens, progress=False)
+    elapsed = time.time() - start
+    conn.close()
+    return elapsed, stats
+
+
+def contenu(db_name: str) -> list:
+    """Praticiens et adresses, pour vérifier que les deux chargements sont équivalents"""
+    conn = sqlite3.connect(db_name)
+    rows = conn.execute("""
+        SELECT p.rpps, p.nom, p.prenom, p.civilite, m.code, s.code, a.ligne, a.code_postal, a.ville,
+               a.latitude, a.longitude
+        FROM Praticien p
+        JOIN Adresse a ON a.adresse_id = p.adresse_id
+        JOIN Metier m ON m.metier_id = p.metier_id
+        LEFT JOIN Specialite s ON s.spe_id = p.spe_id
+        ORDER BY p.rpps
+    """).fetchall()
+    conn.close()
+    return rows
+
+
+def main():
+    """Point d'entrée principal"""
+    args = [arg for arg in sys.argv[1:] if arg != '--garder']
+    nb_praticiens = int(args[0]) if args else 100000
+
+    work_dir = tempfile.mkdtemp(prefix='bench_load_json_')
+    json_file = os.path.join(work_dir, 'praticiens.json')
+
+    print(f"\n🧪 Génération de {nb_praticiens} praticiens ({TAUX_DOUBLONS * 100:.0f}% de doublons)...")
+    generer_json(json_file, nb_praticiens)
+    with open(json_file, 'r', encoding='utf-8') as f:
+        praticiens = json.load(f)['praticiens']
+
+    resultats = {}
+    for mode, bulk in (('ligne à ligne', False), ('bulk', True)):
+        db_name = os.path.join(work_dir, f"{'bulk' if bulk else 'ligne'}.db")
+        print(f"   ▶️  {mode}...", flush=True)
+        resultats[mode] = mesurer(db_name, praticiens, bulk) + (db_name,)
+
+    print(f"\n{'='*80}")
+    print(f"📊 RÉSULTATS ({len(praticiens)} entrées)")
+    print(f"{'='*80}")
+    for mode, (elapsed, stats, _) in resultats.items():
+        print(f"   • {mode:14s} {elapsed:7.2f}s  {len(praticiens) / elapsed:8.0f} praticiens/s  "
+              f"({stats['inseres']} insérés, {stats['doublons']} doublons, {stats['erreurs']} erreurs)")
+
+    speedup = resultats['ligne à ligne'][0] / resultats['bulk'][0]
+    identiques = contenu(resultats['ligne à ligne'][2]) == contenu(resultats['bulk'][2])
+    print(f"\n   ⚡ Accélération: x{speedup:.1f}")
+    print(f"   {'✅' if identiques else '❌'} Contenu des deux bases {'identique' if identiques else 'différent'}")
+    print(f"{'='*80}\n")
+
+    if '--garder' in sys.argv:
+        print(f"📁 Fichiers conservés dans {work_dir}\n")
+    else:
+        shutil.rmtree(work_dir)
+
+    if not identiques:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
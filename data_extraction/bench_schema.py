@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compare l'ancien schéma (Metier, Specialite et Praticien indexées par leurs codes texte et
+le RPPS) et le schéma à clés entières (voir create_database.migrate_cles) sur une base
+synthétique : taille des tables et de leurs index, durée des requêtes courantes
+Usage: python3 bench_schema.py [nb_praticiens] [--garder]
+Exemple: python3 bench_schema.py 200000
+
+La base à clés entières est obtenue en migrant une copie de l'ancienne.
+"""
+
+import io
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+from ban_geocoder import normaliser
+from create_database import INDEXES, PROFESSIONS, VILLE_CLE_SQL, migrate_cles
+from query_db import _par_ville
+
+# Requêtes répétées : on garde la meilleure durée
+REPETITIONS = 5
+
+# Recherches par RPPS par mesure
+NB_RPPS = 2000
+
+VILLES = ['NANCY', 'METZ', 'STRASBOURG', 'REIMS', 'MULHOUSE', 'COLMAR', 'ÉPINAL', 'TROYES']
+
+# Tables comparées (avec leurs index)
+TABLES = ('Metier', 'Specialite', 'Praticien')
+
+
+def creer_base_ancienne(db_name: str, nb_praticiens: int, seed: int = 42):
+    """Base au schéma antérieur aux clés entières (codes texte en clés primaires)"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE Metier (metier_id TEXT PRIMARY KEY, profession TEXT NOT NULL)")
+    cursor.execute("CREATE TABLE Specialite (spe_id TEXT PRIMARY KEY, libelle TEXT NOT NULL)")
+    cursor.execute(f"""
+        CREATE TABLE Adresse (
+            adresse_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ligne TEXT,
+            code_postal TEXT,
+            ville TEXT,
+            complete TEXT,
+            latitude REAL,
+            longitude REAL,
+            cle TEXT,
+            ville_cle TEXT GENERATED ALWAYS AS ({VILLE_CLE_SQL}) VIRTUAL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE Praticien (
+            rpps TEXT PRIMARY KEY,
+            nom TEXT NOT NULL,
+            prenom TEXT NOT NULL,
+            civilite TEXT,
+            metier_id TEXT NOT NULL,
+            spe_id TEXT,
+            adresse_id INTEGER,
+            retire_le TEXT,
+            FOREIGN KEY (metier_id) REFERENCES Metier(metier_id),
+            FOREIGN KEY (spe_id) REFERENCES Specialite(spe_id),
+            FOREIGN KEY (adresse_id) REFERENCES Adresse(adresse_id)
+        )
+    """)
+
+    specialites = [f"{n:02d}" for n in range(1, 41)]
+    cursor.executemany("INSERT INTO Metier VALUES (?, ?)", PROFESSIONS.items())
+    cursor.executemany("INSERT INTO Specialite VALUES (?, ?)",
+                       [('0', 'Aucune spécialité')] + [(code, f"Spécialité {code}") for code in specialites])
+
+    adresses = []
+    for n in range(max(1, nb_praticiens // 3)):
+        ville = rng.choice(VILLES)
+        ligne = f"{rng.randint(1, 200)} rue {n}"
+        adresses.append((ligne, '54000', ville, f"{ligne}, 54000 {ville}",
+                         48 + rng.random(), 6 + rng.random(),
+                         f"{normaliser(ligne)}|54000|{normaliser(ville)}"))
+    cursor.executemany("""
+        INSERT INTO Adresse (ligne, code_postal, ville, complete, latitude, longitude, cle)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, adresses)
+
+    # RPPS dans le désordre (comme un chargement ville par ville)
+    rpps = rng.sample(range(10000000000, 10999999999), nb_praticiens)
+    praticiens = []
+    for n in rpps:
+        metier = rng.choice(list(PROFESSIONS))
+        praticiens.append((
+            str(n),
+            rng.choice(['MARTIN', 'BERNARD', 'DUBOIS', 'LEFÈVRE']),
+            rng.choice(['Marie', 'Jean', 'Zoé', 'Loïc']),
+            rng.choice(['M', 'MME', 'DR']),
+            metier,
+            rng.choice(specialites) if metier == '10' else '0',
+            rng.randint(1, len(adresses)),
+            '2025-01-01' if rng.random() < 0.05 else None,
+        ))
+    cursor.executemany("INSERT INTO Praticien VALUES (?, ?, ?, ?, ?, ?, ?, ?)", praticiens)
+    for sql in INDEXES.values():
+        cursor.execute(sql)
+    conn.commit()
+    conn.close()
+
+
+def tailles(db_name: str) -> dict:
+    """Octets occupés par chaque table comparée et ses index (dbstat), après VACUUM"""
+    conn = sqlite3.connect(db_name)
+    conn.execute("VACUUM")
+    rows = conn.execute(f"""
+        SELECT m.tbl_name, SUM(d.pgsize)
+        FROM dbstat d
+        JOIN sqlite_master m ON m.name = d.name
+        WHERE m.tbl_name IN ({', '.join('?' * len(TABLES))})
+        GROUP BY m.tbl_name
+    """, TABLES).fetchall()
+    conn.close()
+    return dict(rows)
+
+
+def chronometrer(fonction) -> float:
+    """Meilleure durée de REPETITIONS appels (secondes)"""
+    meilleure = float('inf')
+    for _ in range(REPETITIONS):
+        start = time.perf_counter()
+        fonction()
+        meilleure = min(meilleure, time.perf_counter() - start)
+    return meilleure
+
+
+def mesurer_requetes(db_name: str, rpps: list) -> dict:
+    """Durée des requêtes courantes : chargement de compute_regions, ville et métier, RPPS"""
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(Metier)")
+    if 'code' in [row[1] for row in cursor.fetchall()]:
+        metiers = "p.metier_id IN (SELECT metier_id FROM Metier WHERE code IN (?, ?))"
+    else:
+        metiers = "p.metier_id IN (?, ?)"
+
+    def compute():
+        cursor.execute(f"""
+            SELECT p.rpps, p.adresse_id FROM Praticien p
+            WHERE {metiers} AND p.retire_le IS NULL
+        """, ('10', '60')).fetchall()
+
+    def par_ville():
+        for ville in VILLES:
+            _par_ville(conn, "SELECT p.rpps, m.profession, s.libelle, a.ligne", 'Infirmier', ville)
+
+    def par_rpps():
+        for numero in rpps:
+            cursor.execute("""
+                SELECT p.nom, p.prenom, m.profession FROM Praticien p
+                JOIN Metier m ON m.metier_id = p.metier_id
+                WHERE p.rpps = ?
+            """, (numero,)).fetchone()
+
+    def par_metier():
+        cursor.execute("""
+            SELECT m.profession, COUNT(*) FROM Praticien p
+            JOIN Metier m ON m.metier_id = p.metier_id
+            GROUP BY m.profession
+        """).fetchall()
+
+    resultats = {
+        'compute_regions (2 métiers)': chronometrer(compute),
+        f'ville + métier ({len(VILLES)} villes)': chronometrer(par_ville),
+        f'RPPS ({len(rpps)} recherches)': chronometrer(par_rpps),
+        'décompte par métier': chronometrer(par_metier),
+    }
+    conn.close()
+    return resultats
+
+
+def main():
+    """Point d'entrée principal"""
+    args = [arg for arg in sys.argv[1:] if arg != '--garder']
+    nb_praticiens = int(args[0]) if args else 200000
+
+    work_dir = tempfile.mkdtemp(prefix='bench_schema_')
+    ancienne = os.path.join(work_dir, 'ancienne.db')
+    entiers = os.path.join(work_dir, 'entiers.db')
+
+    print(f"\n🧪 Génération de {nb_praticiens} praticiens (ancien schéma)...")
+    creer_base_ancienne(ancienne, nb_praticiens)
+    shutil.copy(ancienne, entiers)
+
+    print("   ▶️  Migration vers les clés entières...", flush=True)
+    conn = sqlite3.connect(entiers)
+    start = time.time()
+    with redirect_stdout(io.StringIO()):
+        migrate_cles(conn)
+    duree_migration = time.time() - start
+    conn.close()
+
+    conn = sqlite3.connect(ancienne)
+    rpps = [row[0] for row in conn.execute("SELECT rpps FROM Praticien ORDER BY random() LIMIT ?", (NB_RPPS,))]
+    conn.close()
+
+    bases = {'ancien schéma': ancienne, 'clés entières': entiers}
+    volumes = {nom: tailles(db) for nom, db in bases.items()}
+    durees = {nom: mesurer_requetes(db, rpps) for nom, db in bases.items()}
+
+    print(f"\n{'='*80}")
+    print(f"📊 RÉSULTATS ({nb_praticiens} praticiens, migration en {duree_migration:.1f}s)")
+    print(f"{'='*80}")
+    print(f"\n   {'Taille (tables et index)':32s} {'ancien schéma':>14s} {'clés entières':>14s}")
+    for table in TABLES + ('Total',):
+        avant, apres = (
+            sum(volume.values()) if table == 'Total' else volume.get(table, 0)
+            for volume in volumes.values()
+        )
+        print(f"   • {table:30s} {avant / 1024:11.0f} Ko {apres / 1024:11.0f} Ko  ({(apres - avant) / avant * 100:+.0f}%)")
+
+    print(f"\n   {'Requête (meilleure de ' + str(REPETITIONS) + ')':32s} {'ancien schéma':>14s} {'clés entières':>14s}")
+    for requete in durees['ancien schéma']:
+        avant, apres = (duree[requete] for duree in durees.values())
+        print(f"   • {requete:30s} {avant * 1000:11.1f} ms {apres * 1000:11.1f} ms  (x{avant / apres:.2f})")
+    print(f"{'='*80}\n")
+
+    if '--garder' in sys.argv:
+        print(f"📁 Fichiers conservés dans {work_dir}\n")
+    else:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
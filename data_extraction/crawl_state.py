@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Journal persistant des crawls de l'annuaire santé (base séparée de la base praticiens)
+- CrawlRefresh : un rafraîchissement complet d'une région, repris tant qu'il n'est pas terminé
+- CrawlTache   : tâches du rafraîchissement (communes, préfixes de code postal,
+                 organisations, praticiens) avec état, tentatives et horodatages
+- CrawlSync    : dernière synchronisation réussie de chaque région (instant UTC), point
+                 de départ du rafraîchissement incrémental suivant (_lastUpdated)
+- CrawlCout    : coût observé de la dernière exécution réussie de chaque commune ou préfixe
+                 (durée, organisations, praticiens), pour ordonner les tâches et estimer
+                 le temps restant des rafraîchissements suivants
+
+Les tâches sont réservées par coût estimé décroissant (les plus longues d'abord).
+
+Plusieurs processus peuvent travailler sur le même rafraîchissement : chaque tâche est
+réservée atomiquement par un seul worker, et une tâche dont le worker a disparu
+(réservation expirée) est reprise par un autre.
+
+Usage: python3 crawl_state.py   # Affiche l'état des rafraîchissements
+"""
+
+import os
+import socket
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Base d'état (modifiable via la variable d'environnement CRAWL_STATE_DB)
+CRAWL_STATE_DB = os.environ.get('CRAWL_STATE_DB', 'crawl_state.db')
+
+# Nombre maximal de tentatives d'une tâche en échec
+MAX_TENTATIVES = 3
+# Durée après laquelle une tâche 'en_cours' est considérée abandonnée
+RESERVATION_MAX = timedelta(hours=1)
+
+# États d'une tâche
+A_FAIRE = 'a_faire'
+EN_COURS = 'en_cours'
+FAIT = 'fait'
+ECHEC = 'echec'
+
+# Types de ressources FHIR -> types de tâches du journal
+TYPES_RESSOURCES = {
+    'Organization': 'organisation',
+    'Practitioner': 'praticien',
+}
+
+
+def connect_state(db_name: str = None) -> sqlite3.Connection:
+    """Connexion à la base d'état, tables créées au besoin"""
+    conn = sqlite3.connect(db_name or CRAWL_STATE_DB, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS CrawlRefresh (
+            refresh_id TEXT PRIMARY KEY,
+            region TEXT NOT NULL,
+            debut TEXT NOT NULL,
+            fin TEXT
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS CrawlTache (
+            tache_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            refresh_id TEXT NOT NULL,
+            type TEXT NOT NULL,
+            cle TEXT NOT NULL,
+            libelle TEXT,
+            etat TEXT NOT NULL DEFAULT 'a_faire',
+            tentatives INTEGER NOT NULL DEFAULT 0,
+            worker TEXT,
+            erreur TEXT,
+            cree_le TEXT NOT NULL,
+            maj_le TEXT NOT NULL,
+            cout_estime REAL NOT NULL DEFAULT 0,
+            UNIQUE (refresh_id, type, cle)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tache_etat ON CrawlTache(refresh_id, etat)")
+
+    # Journal antérieur aux coûts estimés
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(CrawlTache)")]
+    if 'cout_estime' not in columns:
+        cursor.execute("ALTER TABLE CrawlTache ADD COLUMN cout_estime REAL NOT NULL DEFAULT 0")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS CrawlSync (
+            region TEXT PRIMARY KEY,
+            derniere_sync TEXT NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS CrawlCout (
+            type TEXT NOT NULL,
+            cle TEXT NOT NULL,
+            duree REAL NOT NULL,
+            organisations INTEGER NOT NULL,
+            praticiens INTEGER NOT NULL,
+            maj_le TEXT NOT NULL,
+            PRIMARY KEY (type, cle)
+        )
+    """)
+
+    return conn
+
+
+def worker_id() -> str:
+    """Identifiant du worker courant (machine, processus, thread)"""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def start_refresh(conn, region: str) -> str:
+    """Reprend le rafraîchissement non terminé de la région, ou en démarre un nouveau"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT refresh_id FROM CrawlRefresh WHERE region = ? AND fin IS NULL ORDER BY debut DESC LIMIT 1",
+            (region,)
+        ).fetchone()
+        if row:
+            refresh_id = row[0]
+        else:
+            now = datetime.now()
+            refresh_id = f"{region}@{now.strftime('%Y%m%dT%H%M%S.%f')}"
+            conn.execute(
+                "INSERT INTO CrawlRefresh (refresh_id, region, debut) VALUES (?, ?, ?)",
+                (refresh_id, region, now.isoformat())
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return refresh_id
+
+
+def finish_refresh(conn, refresh_id: str) -> bool:
+    """
+    Marque un rafraîchissement comme terminé (le prochain run en démarrera un nouveau)
+    si plus aucune tâche ne reste à faire. Retourne True s'il a été clos.
+    La date de synchronisation n'avance que si aucune tâche n'est en échec définitif
+    (voir failed_tasks) : sinon les runs incrémentaux sauteraient ces communes.
+    """
+    if count_remaining(conn, refresh_id) > 0:
+        return False
+    conn.execute(
+        "UPDATE CrawlRefresh SET fin = ? WHERE refresh_id = ? AND fin IS NULL",
+        (datetime.now().isoformat(), refresh_id)
+    )
+    if failed_tasks(conn, refresh_id):
+        return True
+    
+    # Tout ce qui a changé depuis le début du rafraîchissement reste à synchroniser
+    region, debut = conn.execute(
+        "SELECT region, debut FROM CrawlRefresh WHERE refresh_id = ?", (refresh_id,)
+    ).fetchone()
+    set_last_sync(conn, region, datetime.fromisoformat(debut))
+    return True
+
+
+def failed_tasks(conn, refresh_id: str) -> List[Dict]:
+    """Tâches en échec d'un rafraîchissement : [{'cle', 'libelle', 'tentatives', 'erreur'}]"""
+    rows = conn.execute("""
+        SELECT cle, libelle, tentatives, erreur FROM CrawlTache
+        WHERE refresh_id = ? AND etat = ?
+        ORDER BY libelle, cle
+    """, (refresh_id, ECHEC)).fetchall()
+    return [dict(zip(('cle', 'libelle', 'tentatives', 'erreur'), row)) for row in rows]
+
+
+def fhir_instant(moment: datetime) -> str:
+    """Instant FHIR en UTC (une date sans fuseau est une heure locale)"""
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def get_last_sync(conn, region: str) -> Optional[str]:
+    """Instant de la dernière synchronisation réussie de la région (None si jamais synchronisée)"""
+    row = conn.execute("SELECT derniere_sync FROM CrawlSync WHERE region = ?", (region,)).fetchone()
+    return row[0] if row else None
+
+
+def set_last_sync(conn, region: str, moment: datetime):
+    """Enregistre une synchronisation réussie (sans jamais reculer la date)"""
+    conn.execute("""
+        INSERT INTO CrawlSync (region, derniere_sync) VALUES (?, ?)
+        ON CONFLICT (region) DO UPDATE SET derniere_sync = MAX(derniere_sync, excluded.derniere_sync)
+    """, (region, fhir_instant(moment)))
+
+
+def enqueue_tasks(conn, refresh_id: str, type_tache: str, taches: Iterable[Tuple[str, str]],
+                  couts: Optional[Dict[str, float]] = None):
+    """
+    Ajoute des tâches (cle, libelle) au journal, avec leur coût estimé (couts: {cle: coût},
+    unité libre mais commune à toutes les tâches) ; celles déjà présentes sont conservées telles quelles
+    """
+    couts = couts or {}
+    now = datetime.now().isoformat()
+    conn.execute("BEGIN IMMEDIATE")
+    conn.executemany("""
+        INSERT OR IGNORE INTO CrawlTache (refresh_id, type, cle, libelle, cout_estime, cree_le, maj_le)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [(refresh_id, type_tache, cle, libelle, couts.get(cle, 0.0), now, now) for cle, libelle in taches])
+    conn.execute("COMMIT")
+
+
+def claim_task(conn, refresh_id: str, worker: str, types: Tuple[str, ...] = ('commune', 'prefixe')) -> Optional[Dict]:
+    """
+    Réserve atomiquement la prochaine tâche disponible : à faire, en échec avec des
+    tentatives restantes, ou en cours depuis trop longtemps (worker disparu).
+    Les tâches au coût estimé le plus élevé passent en premier (à tentatives égales).
+    Retourne {'tache_id', 'type', 'cle', 'libelle', 'tentatives', 'cout_estime'} ou None s'il n'y en a plus.
+    """
+    now = datetime.now()
+    expired = (now - RESERVATION_MAX).isoformat()
+    placeholders = ','.join(['?'] * len(types))
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(f"""
+            UPDATE CrawlTache
+            SET etat = ?, worker = ?, tentatives = tentatives + 1, maj_le = ?
+            WHERE tache_id = (
+                SELECT tache_id FROM CrawlTache
+                WHERE refresh_id = ? AND type IN ({placeholders})
+                  AND (etat = ?
+                       OR (etat = ? AND tentatives < ?)
+                       OR (etat = ? AND maj_le < ?))
+                ORDER BY tentatives, cout_estime DESC, tache_id
+                LIMIT 1
+            )
+            RETURNING tache_id, type, cle, libelle, tentatives, cout_estime
+        """, (EN_COURS, worker, now.isoformat(), refresh_id, *types,
+              A_FAIRE, ECHEC, MAX_TENTATIVES, EN_COURS, expired)).fetchone()
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    if row is None:
+        return None
+    return dict(zip(('tache_id', 'type', 'cle', 'libelle', 'tentatives', 'cout_estime'), row))
+
+
+def complete_task(conn, tache_id: int):
+    """Marque une tâche comme terminée"""
+    conn.execute(
+        "UPDATE CrawlTache SET etat = ?, erreur = NULL, maj_le = ? WHERE tache_id = ?",
+        (FAIT, datetime.now().isoformat(), tache_id)
+    )
+
+
+def fail_task(conn, tache_id: int, erreur: str):
+    """Marque une tâche en échec (elle sera reprise tant qu'il reste des tentatives)"""
+    conn.execute(
+        "UPDATE CrawlTache SET etat = ?, erreur = ?, maj_le = ? WHERE tache_id = ?",
+        (ECHEC, erreur, datetime.now().isoformat(), tache_id)
+    )
+
+
+def count_remaining(conn, refresh_id: str) -> int:
+    """Nombre de tâches pas encore terminées (en échec définitif exclues)"""
+    return conn.execute("""
+        SELECT COUNT(*) FROM CrawlTache
+        WHERE refresh_id = ? AND (etat IN (?, ?) OR (etat = ? AND tentatives < ?))
+    """, (refresh_id, A_FAIRE, EN_COURS, ECHEC, MAX_TENTATIVES)).fetchone()[0]
+
+
+def estimate_remaining(conn, refresh_id: str, limit: Optional[int] = None) -> float:
+    """
+    Coût estimé des tâches pas encore terminées (les `limit` prochaines seulement, dans
+    l'ordre de réservation, si limit est donné)
+    """
+    rows = conn.execute("""
+        SELECT cout_estime FROM CrawlTache
+        WHERE refresh_id = ? AND (etat IN (?, ?) OR (etat = ? AND tentatives < ?))
+        ORDER BY tentatives, cout_estime DESC, tache_id
+    """, (refresh_id, A_FAIRE, EN_COURS, ECHEC, MAX_TENTATIVES)).fetchall()
+    return sum(cout for (cout,) in rows[:limit])
+
+
+def record_cost(conn, type_tache: str, cle: str, duree: float, organisations: int, praticiens: int):
+    """Enregistre le coût observé d'une tâche réussie (remplace le précédent)"""
+    conn.execute("""
+        INSERT OR REPLACE INTO CrawlCout (type, cle, duree, organisations, praticiens, maj_le)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (type_tache, cle, duree, organisations, praticiens, datetime.now().isoformat()))
+
+
+def get_costs(conn, type_tache: str) -> Dict[str, Dict]:
+    """Derniers coûts observés : {cle: {'duree', 'organisations', 'praticiens', 'maj_le'}}"""
+    return {
+        cle: {'duree': duree, 'organisations': organisations, 'praticiens': praticiens, 'maj_le': maj_le}
+        for cle, duree, organisations, praticiens, maj_le in conn.execute(
+            "SELECT cle, duree, organisations, praticiens, maj_le FROM CrawlCout WHERE type = ?", (type_tache,)
+        )
+    }
+
+
+def count_by_state(conn, refresh_id: str, types: Tuple[str, ...] = ('commune', 'prefixe')) -> Dict[str, int]:
+    """Nombre de tâches par état"""
+    placeholders = ','.join(['?'] * len(types))
+    counts = {A_FAIRE: 0, EN_COURS: 0, FAIT: 0, ECHEC: 0}
+    for etat, count in conn.execute(f"""
+        SELECT etat, COUNT(*) FROM CrawlTache
+        WHERE refresh_id = ? AND type IN ({placeholders})
+        GROUP BY etat
+    """, (refresh_id, *types)):
+        counts[etat] = count
+    return counts
+
+
+def load_seen(conn, refresh_id: str) -> Dict[str, Set[str]]:
+    """Ensemble des ids déjà récupérés pendant ce rafraîchissement, par type de ressource"""
+    seen = {kind: set() for kind in TYPES_RESSOURCES}
+    for kind, type_tache in TYPES_RESSOURCES.items():
+        for (cle,) in conn.execute(
+            "SELECT cle FROM CrawlTache WHERE refresh_id = ? AND type = ? AND etat = ?",
+            (refresh_id, type_tache, FAIT)
+        ):
+            seen[kind].add(cle)
+    return seen
+
+
+def save_seen(conn, refresh_id: str, kind: str, ids: List[str]):
+    """Enregistre des ids comme récupérés (à appeler une fois les données écrites en base)"""
+    now = datetime.now().isoformat()
+    conn.execute("BEGIN IMMEDIATE")
+    conn.executemany("""
+        INSERT INTO CrawlTache (refresh_id, type, cle, etat, tentatives, cree_le, maj_le)
+        VALUES (?, ?, ?, ?, 1, ?, ?)
+        ON CONFLICT (refresh_id, type, cle) DO UPDATE SET etat = excluded.etat, maj_le = excluded.maj_le
+    """, [(refresh_id, TYPES_RESSOURCES[kind], resource_id, FAIT, now, now) for resource_id in ids])
+    conn.execute("COMMIT")
+
+
+def main():
+    """Point d'entrée principal"""
+    conn = connect_state()
+
+    print(f"\n{'='*80}")
+    print(f"🗂️  RAFRAÎCHISSEMENTS ({CRAWL_STATE_DB})")
+    print(f"{'='*80}\n")
+
+    rows = conn.execute("SELECT refresh_id, debut, fin FROM CrawlRefresh ORDER BY debut").fetchall()
+
+    for refresh_id, debut, fin in rows:
+        etat = f"terminé le {fin[:19]}" if fin else "en cours"
+        print(f"   • {refresh_id} ({etat})")
+
+        for type_tache, etat_tache, count, tentatives in conn.execute("""
+            SELECT type, etat, COUNT(*), MAX(tentatives) FROM CrawlTache
+            WHERE refresh_id = ?
+            GROUP BY type, etat
+            ORDER BY type, etat
+        """, (refresh_id,)):
+            print(f"     {type_tache:13s} {etat_tache:9s} {count:>8} (max {tentatives} tentative(s))")
+
+        for libelle, cle, erreur in conn.execute("""
+            SELECT libelle, cle, erreur FROM CrawlTache
+            WHERE refresh_id = ? AND etat = ? AND tentatives >= ?
+            LIMIT 10
+        """, (refresh_id, ECHEC, MAX_TENTATIVES)):
+            print(f"     ❌ {libelle or cle}: {erreur}")
+
+    if not rows:
+        print("   Aucun rafraîchissement enregistré")
+    
+    for region, derniere_sync in conn.execute("SELECT region, derniere_sync FROM CrawlSync ORDER BY region"):
+        print(f"   🔄 {region} synchronisée jusqu'au {derniere_sync}")
+    
+    for type_tache, count, vides, duree in conn.execute("""
+        SELECT type, COUNT(*), SUM(organisations = 0), SUM(duree) FROM CrawlCout GROUP BY type ORDER BY type
+    """):
+        print(f"   📈 {count} coûts connus ({type_tache}) : {duree/60:.1f} min au total, {vides} sans organisation")
+    print()
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
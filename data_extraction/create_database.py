@@ -2,36 +2,412 @@
 # -*- coding: utf-8 -*-
 """
 Script pour créer la base de données SQLite des praticiens de santé
+Usage: python3 create_database.py                       # Crée et remplit la base (données de Nancy)
+       python3 create_database.py --migrer [db]          # Met une base existante au schéma courant
+       python3 create_database.py --migrer-adresses [db] # Fusionne les adresses en double d'une base existante
 """
 
 import sqlite3
 import json
+import sys
+from typing import Dict, Optional
 
-def create_database(db_name: str = "praticiens_sante.db"):
+from ban_geocoder import normaliser
+from sm import preload_specialites
+
+# Index secondaires (supprimés puis recréés par les chargements en masse, voir load_json_to_db.py)
+INDEXES = {
+    'idx_praticien_metier': "CREATE INDEX IF NOT EXISTS idx_praticien_metier ON Praticien(metier_id)",
+    'idx_praticien_spe': "CREATE INDEX IF NOT EXISTS idx_praticien_spe ON Praticien(spe_id)",
+    # Ville -> adresses -> praticiens d'un métier (requêtes par ville de query_db.py)
+    'idx_praticien_adresse_metier': "CREATE INDEX IF NOT EXISTS idx_praticien_adresse_metier ON Praticien(adresse_id, metier_id)",
+    'idx_adresse_ville': "CREATE INDEX IF NOT EXISTS idx_adresse_ville ON Adresse(ville_cle)",
+}
+
+# Mapping des codes profession (libellés des métiers créés au besoin)
+PROFESSIONS = {
+    '10': 'Médecin',
+    '21': 'Pharmacien',
+    '40': 'Chirurgien-Dentiste',
+    '50': 'Sage-Femme',
+    '60': 'Infirmier',
+    '70': 'Masseur-Kinésithérapeute',
+    '80': 'Pédicure-Podologue',
+    '91': 'Orthophoniste',
+    '86': 'Psychomotricien',
+    '96': 'Orthoptiste',
+    '94': 'Ergothérapeute'
+}
+
+# Tables à clés entières (création, et migration des bases antérieures : voir migrate_cles).
+# Les codes de la nomenclature (métier '10', spécialité '08') et le RPPS sont des colonnes uniques.
+TABLES_CLES = {
+    'Metier': """
+            metier_id INTEGER PRIMARY KEY,
+            code TEXT NOT NULL UNIQUE,
+            profession TEXT NOT NULL""",
+    'Specialite': """
+            spe_id INTEGER PRIMARY KEY,
+            code TEXT NOT NULL UNIQUE,
+            libelle TEXT NOT NULL""",
+    'Praticien': """
+            praticien_id INTEGER PRIMARY KEY,
+            rpps TEXT NOT NULL UNIQUE,
+            nom TEXT NOT NULL,
+            prenom TEXT NOT NULL,
+            civilite TEXT,
+            metier_id INTEGER NOT NULL,
+            spe_id INTEGER,
+            adresse_id INTEGER,
+            retire_le TEXT,
+            FOREIGN KEY (metier_id) REFERENCES Metier(metier_id),
+            FOREIGN KEY (spe_id) REFERENCES Specialite(spe_id),
+            FOREIGN KEY (adresse_id) REFERENCES Adresse(adresse_id)""",
+}
+
+# Tables de référence : (clé entière, libellé), voir ids_par_code
+REFERENTIELS = {
+    'Metier': ('metier_id', 'profession'),
+    'Specialite': ('spe_id', 'libelle'),
+}
+
+# Spécialité des praticiens qui n'en ont pas : (code, libellé)
+SANS_SPECIALITE = ('0', 'Aucune spécialité')
+
+# Ville normalisée d'une adresse (sans accents ni ponctuation, voir cle_adresse) : dernière
+# partie de la clé 'LIGNE|CP|VILLE', donc toujours cohérente avec elle
+VILLE_CLE_SQL = "substr(substr(cle, instr(cle, '|') + 1), instr(substr(cle, instr(cle, '|') + 1), '|') + 1)"
+
+# Caractères repliés dans l'index de recherche : accents retirés, tirets et apostrophes
+# remplacés par des espaces. Appliqué en SQL par les triggers et en Python aux recherches.
+PLIS_RECHERCHE = {
+    **{c: 'A' for c in 'ÀÂÄÁÃÅàâäáãå'}, **{c: 'C' for c in 'Çç'},
+    **{c: 'E' for c in 'ÉÈÊËéèêë'}, **{c: 'I' for c in 'ÎÏÍÌîïíì'},
+    **{c: 'O' for c in 'ÔÖÓÒÕôöóòõ'}, **{c: 'U' for c in 'ÙÛÜÚùûüú'},
+    **{c: 'Y' for c in 'ŸÝÿý'}, **{c: 'N' for c in 'Ññ'},
+    'Œ': 'OE', 'œ': 'OE', 'Æ': 'AE', 'æ': 'AE', '-': ' ', "'": ' ', '’': ' ',
+}
+_PLIS_TABLE = str.maketrans(PLIS_RECHERCHE)
+
+# Texte d'adresse indexé (alias a = Adresse)
+_ADRESSE_RECHERCHE = ("COALESCE(a.complete, TRIM(COALESCE(a.ligne, '') || ' ' || "
+                      "COALESCE(a.code_postal, '') || ' ' || COALESCE(a.ville, '')))")
+
+
+def plier(texte: Optional[str]) -> str:
+    """Texte tel qu'il est indexé pour la recherche (sans accents, en majuscules)"""
+    return (texte or '').translate(_PLIS_TABLE).upper()
+
+
+def _plier_sql(expr: str, par_niveau: int = 16) -> str:
     """
-    Crée la base de données avec les 4 tables
+    Expression SQL équivalente à plier(expr), utilisable dans un trigger.
+    Les REPLACE sont répartis sur des sous-requêtes imbriquées : au-delà d'une trentaine
+    d'appels imbriqués dans une même expression, l'analyseur de SQLite déborde.
+    """
+    plis = list(PLIS_RECHERCHE.items())
+    sql = f"SELECT {expr} AS v"
+    for i in range(0, len(plis), par_niveau):
+        v = 'v'
+        for source, cible in plis[i:i + par_niveau]:
+            v = f"REPLACE({v}, '{source.replace(chr(39), chr(39) * 2)}', '{cible}')"
+        sql = f"SELECT {v} AS v FROM ({sql})"
+    return f"(SELECT UPPER(v) FROM ({sql}))"
+
+
+def _search_triggers() -> Dict[str, str]:
+    nom, prenom = _plier_sql('new.nom'), _plier_sql('new.prenom')
+    adresse = f"(SELECT {_plier_sql(_ADRESSE_RECHERCHE)} FROM Adresse a WHERE a.adresse_id = new.adresse_id)"
+    adresse_maj = _plier_sql(_ADRESSE_RECHERCHE.replace('a.', 'new.'))
+    return {
+        'trg_recherche_praticien_ai': f"""
+            CREATE TRIGGER IF NOT EXISTS trg_recherche_praticien_ai AFTER INSERT ON Praticien BEGIN
+                INSERT INTO RecherchePraticien (rowid, nom, prenom, adresse)
+                VALUES (new.rowid, {nom}, {prenom}, {adresse});
+            END""",
+        'trg_recherche_praticien_au': f"""
+            CREATE TRIGGER IF NOT EXISTS trg_recherche_praticien_au AFTER UPDATE OF nom, prenom, adresse_id ON Praticien BEGIN
+                UPDATE RecherchePraticien SET nom = {nom}, prenom = {prenom}, adresse = {adresse}
+                WHERE rowid = new.rowid;
+            END""",
+        'trg_recherche_praticien_ad': """
+            CREATE TRIGGER IF NOT EXISTS trg_recherche_praticien_ad AFTER DELETE ON Praticien BEGIN
+                DELETE FROM RecherchePraticien WHERE rowid = old.rowid;
+            END""",
+        'trg_recherche_adresse_au': f"""
+            CREATE TRIGGER IF NOT EXISTS trg_recherche_adresse_au AFTER UPDATE OF ligne, code_postal, ville, complete ON Adresse BEGIN
+                UPDATE RecherchePraticien SET adresse = {adresse_maj}
+                WHERE rowid IN (SELECT rowid FROM Praticien WHERE adresse_id = new.adresse_id);
+            END""",
+    }
+
+
+def create_search_index(conn, rebuild: bool = False) -> bool:
+    """
+    Index plein texte (FTS5, trigrammes) des noms, prénoms et adresses des praticiens,
+    tenu à jour par des triggers. Construit à partir des données existantes s'il vient
+    d'être créé (ou si rebuild). Retourne True s'il a été (re)construit.
+    Sans FTS5 ni tokenizer trigram (SQLite < 3.34), la recherche reste en LIKE.
     """
-    conn = sqlite3.connect(db_name)
     cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'RecherchePraticien'")
+    exists = cursor.fetchone() is not None
     
-    # Table Metier
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS Metier (
-            metier_id TEXT PRIMARY KEY,
-            profession TEXT NOT NULL
-        )
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS RecherchePraticien
+            USING fts5(nom, prenom, adresse, tokenize = 'trigram')
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"⚠️  Index de recherche indisponible ({e}) : recherche en LIKE")
+        return False
+    
+    for sql in _search_triggers().values():
+        cursor.execute(sql)
+    
+    if exists and not rebuild:
+        return False
+    
+    # Reconstruction : le même pli, en Python (bien plus rapide que les REPLACE imbriqués)
+    conn.create_function('plier', 1, plier, deterministic=True)
+    cursor.execute("DELETE FROM RecherchePraticien")
+    cursor.execute(f"""
+        INSERT INTO RecherchePraticien (rowid, nom, prenom, adresse)
+        SELECT p.rowid, plier(p.nom), plier(p.prenom), plier({_ADRESSE_RECHERCHE})
+        FROM Praticien p
+        LEFT JOIN Adresse a ON a.adresse_id = p.adresse_id
     """)
+    cursor.execute("INSERT INTO RecherchePraticien (RecherchePraticien) VALUES ('optimize')")
+    conn.commit()
+    return True
+
+
+def drop_search_triggers(conn):
+    """Suspend la mise à jour de l'index de recherche (chargements en masse, voir create_search_index)"""
+    for name in _search_triggers():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+SPATIAL_TRIGGERS = {
+    'trg_geo_adresse_ai': """
+        CREATE TRIGGER IF NOT EXISTS trg_geo_adresse_ai AFTER INSERT ON Adresse
+        WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN
+            INSERT OR REPLACE INTO GeoAdresse (adresse_id, min_lat, max_lat, min_lon, max_lon)
+            VALUES (new.adresse_id, new.latitude, new.latitude, new.longitude, new.longitude);
+        END""",
+    'trg_geo_adresse_au': """
+        CREATE TRIGGER IF NOT EXISTS trg_geo_adresse_au AFTER UPDATE OF latitude, longitude ON Adresse
+        WHEN old.latitude IS NOT new.latitude OR old.longitude IS NOT new.longitude BEGIN
+            DELETE FROM GeoAdresse WHERE adresse_id = old.adresse_id;
+            INSERT INTO GeoAdresse (adresse_id, min_lat, max_lat, min_lon, max_lon)
+            SELECT new.adresse_id, new.latitude, new.latitude, new.longitude, new.longitude
+            WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+        END""",
+    'trg_geo_adresse_ad': """
+        CREATE TRIGGER IF NOT EXISTS trg_geo_adresse_ad AFTER DELETE ON Adresse BEGIN
+            DELETE FROM GeoAdresse WHERE adresse_id = old.adresse_id;
+        END""",
+}
+
+
+def create_spatial_index(conn, rebuild: bool = False) -> bool:
+    """
+    Index spatial (R*Tree) des coordonnées des adresses géocodées, tenu à jour par des
+    triggers. Construit à partir des données existantes s'il vient d'être créé (ou si
+    rebuild). Retourne True s'il a été (re)construit.
+    Les bornes du R*Tree sont arrondies vers l'extérieur (flottants 32 bits) : les
+    requêtes filtrent ensuite sur les coordonnées exactes de Adresse.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'GeoAdresse'")
+    exists = cursor.fetchone() is not None
+    
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS GeoAdresse
+            USING rtree(adresse_id, min_lat, max_lat, min_lon, max_lon)
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"⚠️  Index spatial indisponible ({e}) : recherche géographique séquentielle")
+        return False
     
-    # Table Specialite
+    for sql in SPATIAL_TRIGGERS.values():
+        cursor.execute(sql)
+    
+    if exists and not rebuild:
+        return False
+    
+    cursor.execute("DELETE FROM GeoAdresse")
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS Specialite (
-            spe_id TEXT PRIMARY KEY,
-            libelle TEXT NOT NULL
-        )
+        INSERT INTO GeoAdresse (adresse_id, min_lat, max_lat, min_lon, max_lon)
+        SELECT adresse_id, latitude, latitude, longitude, longitude
+        FROM Adresse
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
     """)
+    conn.commit()
+    return True
+
+
+def drop_spatial_triggers(conn):
+    """Suspend la mise à jour de l'index spatial (chargements en masse, voir create_spatial_index)"""
+    for name in SPATIAL_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+# Département d'un code postal (DOM : 3 chiffres ; la Corse reste '20', voir registre_communes.postal_prefix)
+def departement_sql(code_postal: str) -> str:
+    return (f"CASE WHEN substr({code_postal}, 1, 2) IN ('97', '98') "
+            f"THEN substr({code_postal}, 1, 3) ELSE substr({code_postal}, 1, 2) END")
+
+
+# Tables de statistiques : (colonnes, requête de calcul complet). Le même calcul sert à la
+# reconstruction (chargements en masse, bases antérieures) ; les triggers les tiennent à jour.
+# Petites lignes lues et écrites par clé : tables WITHOUT ROWID (rangées dans l'index de la clé).
+STATS_TABLES = {
+    'StatMetier': (
+        "metier_id INTEGER PRIMARY KEY, actifs INTEGER NOT NULL DEFAULT 0, retires INTEGER NOT NULL DEFAULT 0",
+        "SELECT metier_id, SUM(retire_le IS NULL), SUM(retire_le IS NOT NULL) FROM Praticien GROUP BY metier_id"
+    ),
+    'StatSpecialite': (
+        "spe_id INTEGER PRIMARY KEY, actifs INTEGER NOT NULL DEFAULT 0",
+        "SELECT spe_id, COUNT(*) FROM Praticien WHERE retire_le IS NULL AND spe_id IS NOT NULL GROUP BY spe_id"
+    ),
+    'StatVille': (
+        "ville_cle TEXT PRIMARY KEY, ville TEXT, actifs INTEGER NOT NULL DEFAULT 0",
+        """SELECT a.ville_cle, MAX(a.ville), COUNT(*)
+           FROM Praticien p JOIN Adresse a ON a.adresse_id = p.adresse_id
+           WHERE p.retire_le IS NULL AND a.ville_cle IS NOT NULL
+           GROUP BY a.ville_cle"""
+    ),
+    'StatDepartement': (
+        "departement TEXT PRIMARY KEY, actifs INTEGER NOT NULL DEFAULT 0",
+        f"""SELECT {departement_sql('a.code_postal')}, COUNT(*)
+           FROM Praticien p JOIN Adresse a ON a.adresse_id = p.adresse_id
+           WHERE p.retire_le IS NULL AND a.code_postal IS NOT NULL
+           GROUP BY 1"""
+    ),
+    'StatGlobal': (
+        "cle TEXT PRIMARY KEY, valeur INTEGER NOT NULL DEFAULT 0",
+        """SELECT 'adresses', COUNT(*) FROM Adresse
+           UNION ALL
+           SELECT 'adresses_geocodees', COUNT(*) FROM Adresse WHERE latitude IS NOT NULL AND longitude IS NOT NULL"""
+    ),
+}
+
+
+def _stats_praticien(ligne: str, signe: str) -> str:
+    """Instructions de trigger ajoutant (signe '+') ou retirant ('-') le praticien ligne (new/old) des statistiques"""
+    actif = f"{ligne}.retire_le IS NULL"
+    return f"""
+            INSERT INTO StatMetier (metier_id, actifs, retires)
+            VALUES ({ligne}.metier_id, {signe}({actif}), {signe}({ligne}.retire_le IS NOT NULL))
+            ON CONFLICT (metier_id) DO UPDATE SET actifs = actifs + excluded.actifs, retires = retires + excluded.retires;
+            INSERT INTO StatSpecialite (spe_id, actifs)
+            SELECT {ligne}.spe_id, {signe}1 WHERE {actif} AND {ligne}.spe_id IS NOT NULL
+            ON CONFLICT (spe_id) DO UPDATE SET actifs = actifs + excluded.actifs;
+            INSERT INTO StatVille (ville_cle, ville, actifs)
+            SELECT a.ville_cle, a.ville, {signe}1 FROM Adresse a
+            WHERE a.adresse_id = {ligne}.adresse_id AND {actif} AND a.ville_cle IS NOT NULL
+            ON CONFLICT (ville_cle) DO UPDATE SET actifs = actifs + excluded.actifs;
+            INSERT INTO StatDepartement (departement, actifs)
+            SELECT {departement_sql('a.code_postal')}, {signe}1 FROM Adresse a
+            WHERE a.adresse_id = {ligne}.adresse_id AND {actif} AND a.code_postal IS NOT NULL
+            ON CONFLICT (departement) DO UPDATE SET actifs = actifs + excluded.actifs;"""
+
+
+def _stats_adresse(ligne: str, signe: str) -> str:
+    """Instructions de trigger déplaçant les praticiens actifs de l'adresse ligne (new/old) dans les statistiques par lieu"""
+    actifs = f"(SELECT COUNT(*) FROM Praticien WHERE adresse_id = {ligne}.adresse_id AND retire_le IS NULL)"
+    return f"""
+            INSERT INTO StatVille (ville_cle, ville, actifs)
+            SELECT {ligne}.ville_cle, {ligne}.ville, {signe}{actifs} WHERE {ligne}.ville_cle IS NOT NULL
+            ON CONFLICT (ville_cle) DO UPDATE SET actifs = actifs + excluded.actifs;
+            INSERT INTO StatDepartement (departement, actifs)
+            SELECT {departement_sql(f'{ligne}.code_postal')}, {signe}{actifs} WHERE {ligne}.code_postal IS NOT NULL
+            ON CONFLICT (departement) DO UPDATE SET actifs = actifs + excluded.actifs;"""
+
+
+def _compteur(cle: str, delta: str) -> str:
+    return f"""
+            UPDATE StatGlobal SET valeur = valeur + ({delta}) WHERE cle = '{cle}';"""
+
+
+_GEOCODEE = "({0}.latitude IS NOT NULL AND {0}.longitude IS NOT NULL)"
+
+STATS_TRIGGERS = {
+    'trg_stats_praticien_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_stats_praticien_ai AFTER INSERT ON Praticien BEGIN{_stats_praticien('new', '+')}
+        END""",
+    'trg_stats_praticien_au': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_stats_praticien_au AFTER UPDATE OF metier_id, spe_id, adresse_id, retire_le ON Praticien
+        WHEN old.metier_id IS NOT new.metier_id OR old.spe_id IS NOT new.spe_id
+          OR old.adresse_id IS NOT new.adresse_id OR old.retire_le IS NOT new.retire_le BEGIN{_stats_praticien('old', '-')}{_stats_praticien('new', '+')}
+        END""",
+    'trg_stats_praticien_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_stats_praticien_ad AFTER DELETE ON Praticien BEGIN{_stats_praticien('old', '-')}
+        END""",
+    'trg_stats_adresse_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_stats_adresse_ai AFTER INSERT ON Adresse BEGIN{_compteur('adresses', '1')}{_compteur('adresses_geocodees', _GEOCODEE.format('new'))}
+        END""",
+    'trg_stats_adresse_au': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_stats_adresse_au AFTER UPDATE OF latitude, longitude ON Adresse
+        WHEN {_GEOCODEE.format('old')} != {_GEOCODEE.format('new')} BEGIN{_compteur('adresses_geocodees', f"{_GEOCODEE.format('new')} - {_GEOCODEE.format('old')}")}
+        END""",
+    'trg_stats_adresse_lieu_au': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_stats_adresse_lieu_au AFTER UPDATE OF cle, code_postal ON Adresse
+        WHEN old.cle IS NOT new.cle OR old.code_postal IS NOT new.code_postal BEGIN{_stats_adresse('old', '-')}{_stats_adresse('new', '+')}
+        END""",
+    'trg_stats_adresse_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_stats_adresse_ad AFTER DELETE ON Adresse BEGIN{_compteur('adresses', '-1')}{_compteur('adresses_geocodees', f"-{_GEOCODEE.format('old')}")}
+        END""",
+}
+
+
+def create_stats_tables(conn, rebuild: bool = False) -> bool:
+    """
+    Tables de statistiques (praticiens par métier, spécialité, ville, département ;
+    nombre d'adresses) tenues à jour par des triggers, pour des rapports instantanés
+    (voir query_db.get_stats). Calculées à partir des données existantes si elles viennent
+    d'être créées (ou si rebuild). Retourne True si elles ont été (re)calculées.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'StatGlobal'")
+    exists = cursor.fetchone() is not None
+    
+    for table, (colonnes, _) in STATS_TABLES.items():
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({colonnes}) WITHOUT ROWID")
+    for sql in STATS_TRIGGERS.values():
+        cursor.execute(sql)
+    
+    if exists and not rebuild:
+        return False
+    
+    for table, (_, calcul) in STATS_TABLES.items():
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(f"INSERT INTO {table} {calcul}")
+    conn.commit()
+    return True
+
+
+def drop_stats_triggers(conn):
+    """Suspend la mise à jour des statistiques (chargements en masse, voir create_stats_tables)"""
+    for name in STATS_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def create_database(db_name: str = "praticiens_sante.db"):
+    """
+    Crée la base de données avec les 4 tables
+    """
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    
+    # Tables Metier et Specialite (clé entière, code de la nomenclature unique)
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS Metier ({TABLES_CLES['Metier']})")
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS Specialite ({TABLES_CLES['Specialite']})")
     
     # Table Adresse
-    cursor.execute("""
+    cursor.execute(f"""
         CREATE TABLE IF NOT EXISTS Adresse (
             adresse_id INTEGER PRIMARY KEY AUTOINCREMENT,
             ligne TEXT,
@@ -39,30 +415,30 @@ def create_database(db_name: str = "praticiens_sante.db"):
             ville TEXT,
             complete TEXT,
             latitude REAL,
-            longitude REAL
+            longitude REAL,
+            cle TEXT,
+            ville_cle TEXT GENERATED ALWAYS AS ({VILLE_CLE_SQL}) VIRTUAL
         )
     """)
     
-    # Table Praticien
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS Praticien (
-            rpps TEXT PRIMARY KEY,
-            nom TEXT NOT NULL,
-            prenom TEXT NOT NULL,
-            civilite TEXT,
-            metier_id TEXT NOT NULL,
-            spe_id TEXT,
-            adresse_id INTEGER,
-            FOREIGN KEY (metier_id) REFERENCES Metier(metier_id),
-            FOREIGN KEY (spe_id) REFERENCES Specialite(spe_id),
-            FOREIGN KEY (adresse_id) REFERENCES Adresse(adresse_id)
-        )
-    """)
+    # Table Praticien (clé entière, RPPS unique)
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS Praticien ({TABLES_CLES['Praticien']})")
+    
+    # Base existante : colonnes ajoutées depuis, une seule ligne par adresse, clés entières
+    migrate_praticiens(conn)
+    migrate_adresses(conn)
+    migrate_villes(conn)
+    migrate_cles(conn)
+    ids_par_code(cursor, 'Specialite', dict([SANS_SPECIALITE]))
     
     # Créer des index pour améliorer les performances
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_praticien_metier ON Praticien(metier_id)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_praticien_spe ON Praticien(spe_id)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_praticien_adresse ON Praticien(adresse_id)")
+    for sql in INDEXES.values():
+        cursor.execute(sql)
+    
+    # Recherche plein texte (noms, adresses), index spatial des coordonnées, statistiques
+    create_search_index(conn)
+    create_spatial_index(conn)
+    create_stats_tables(conn)
     
     conn.commit()
     print(f"✅ Base de données '{db_name}' créée avec succès!")
@@ -74,6 +450,263 @@ def create_database(db_name: str = "praticiens_sante.db"):
     return conn
 
 
+def cle_adresse(ligne: Optional[str], code_postal: Optional[str], ville: Optional[str]) -> str:
+    """
+    Clé de déduplication d'une adresse : ligne et ville sans accents, ponctuation ni
+    espaces superflus, abréviations de voie développées ('12 av. Foch' = '12 AVENUE FOCH')
+    """
+    return f"{normaliser(ligne)}|{(code_postal or '').strip()}|{normaliser(ville)}"
+
+
+def get_or_create_adresse(cursor, addr: Dict) -> int:
+    """
+    Identifiant de l'adresse partagée correspondant à addr (créée au besoin).
+    Une adresse existante sans coordonnées reprend celles de addr.
+    """
+    cursor.execute("""
+        INSERT INTO Adresse (ligne, code_postal, ville, complete, latitude, longitude, cle)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (cle) DO UPDATE SET
+            latitude = COALESCE(Adresse.latitude, excluded.latitude),
+            longitude = COALESCE(Adresse.longitude, excluded.longitude)
+        RETURNING adresse_id
+    """, (
+        addr.get('ligne'),
+        addr.get('code_postal'),
+        addr.get('ville'),
+        addr.get('complete'),
+        addr.get('latitude'),
+        addr.get('longitude'),
+        cle_adresse(addr.get('ligne'), addr.get('code_postal'), addr.get('ville'))
+    ))
+    return cursor.fetchone()[0]
+
+
+def ids_par_code(cursor, table: str, libelles: Dict[str, str]) -> Dict[str, int]:
+    """
+    Clés entières des métiers ou des spécialités (table 'Metier' ou 'Specialite') de codes
+    donnés ({code: libellé}), créés au besoin ; une ligne existante garde son libellé
+    """
+    cle, colonne = REFERENTIELS[table]
+    cursor.executemany(
+        f"INSERT INTO {table} (code, {colonne}) VALUES (?, ?) ON CONFLICT (code) DO NOTHING",
+        list(libelles.items())
+    )
+    ids = {}
+    codes = list(libelles)
+    for i in range(0, len(codes), 500):
+        chunk = codes[i:i + 500]
+        cursor.execute(f"SELECT code, {cle} FROM {table} WHERE code IN ({','.join('?' * len(chunk))})", chunk)
+        ids.update(cursor.fetchall())
+    return ids
+
+
+def migrate_praticiens(conn):
+    """
+    Ajoute à une base existante la colonne retire_le de Praticien : date à laquelle le
+    praticien a disparu de l'annuaire (rafraîchissement incrémental), NULL s'il est actif
+    """
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(Praticien)")
+    if 'retire_le' not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE Praticien ADD COLUMN retire_le TEXT")
+        conn.commit()
+
+
+def migrate_villes(conn):
+    """
+    Ajoute à une base existante la ville normalisée des adresses (colonne calculée ville_cle)
+    et ses index ; l'index de Praticien sur adresse_id seul est remplacé par (adresse_id, metier_id)
+    """
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_xinfo(Adresse)")
+    if 'ville_cle' not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE Adresse ADD COLUMN ville_cle TEXT GENERATED ALWAYS AS ({VILLE_CLE_SQL}) VIRTUAL")
+    cursor.execute("DROP INDEX IF EXISTS idx_praticien_adresse")
+    for name in ('idx_praticien_adresse_metier', 'idx_adresse_ville'):
+        cursor.execute(INDEXES[name])
+    conn.commit()
+
+
+def migrate_cles(conn) -> bool:
+    """
+    Passe une base existante aux clés entières : Metier et Specialite sont indexées par une
+    clé entière (le code de la nomenclature devient une colonne unique), Praticien par
+    praticien_id (son ancien rowid : l'index de recherche reste valable) avec le RPPS unique.
+    Les statistiques sont recalculées. Sans effet si la base est déjà migrée.
+    Retourne True si la base a été migrée.
+    """
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(Metier)")
+    if 'code' in [row[1] for row in cursor.fetchall()]:
+        return False
+    
+    conn.commit()
+    cursor.execute("BEGIN")
+    try:
+        # Triggers et statistiques des anciennes tables (recréés par create_search_index et create_stats_tables)
+        drop_search_triggers(conn)
+        drop_stats_triggers(conn)
+        for table in STATS_TABLES:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        
+        for table, colonnes in TABLES_CLES.items():
+            cursor.execute(f"CREATE TABLE {table}_cles ({colonnes})")
+        
+        # Codes utilisés par des praticiens sans ligne de référence : libellé = code (ou PROFESSIONS)
+        cursor.execute("""
+            INSERT INTO Metier_cles (code, profession)
+            SELECT metier_id, profession FROM Metier WHERE metier_id IS NOT NULL
+            UNION
+            SELECT DISTINCT metier_id, metier_id FROM Praticien
+            WHERE metier_id NOT IN (SELECT metier_id FROM Metier WHERE metier_id IS NOT NULL)
+            ORDER BY 1
+        """)
+        cursor.execute("""
+            INSERT INTO Specialite_cles (code, libelle)
+            SELECT spe_id, libelle FROM Specialite WHERE spe_id IS NOT NULL
+            UNION
+            SELECT ?, ? WHERE ? NOT IN (SELECT spe_id FROM Specialite WHERE spe_id IS NOT NULL)
+            UNION
+            SELECT DISTINCT spe_id, spe_id FROM Praticien
+            WHERE spe_id IS NOT NULL AND spe_id != ? AND spe_id NOT IN (SELECT spe_id FROM Specialite WHERE spe_id IS NOT NULL)
+            ORDER BY 1
+        """, (*SANS_SPECIALITE, SANS_SPECIALITE[0], SANS_SPECIALITE[0]))
+        cursor.executemany(
+            "UPDATE Metier_cles SET profession = ? WHERE code = ? AND profession = code",
+            [(profession, code) for code, profession in PROFESSIONS.items()]
+        )
+        cursor.execute("""
+            INSERT INTO Praticien_cles (praticien_id, rpps, nom, prenom, civilite, metier_id, spe_id, adresse_id, retire_le)
+            SELECT p.rowid, p.rpps, p.nom, p.prenom, p.civilite, m.metier_id, s.spe_id, p.adresse_id, p.retire_le
+            FROM Praticien p
+            JOIN Metier_cles m ON m.code = p.metier_id
+            LEFT JOIN Specialite_cles s ON s.code = p.spe_id
+        """)
+        
+        for table in TABLES_CLES:
+            cursor.execute(f"DROP TABLE {table}")
+        for table in TABLES_CLES:
+            cursor.execute(f"ALTER TABLE {table}_cles RENAME TO {table}")
+        for sql in INDEXES.values():
+            cursor.execute(sql)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    
+    create_search_index(conn)
+    create_stats_tables(conn)
+    return True
+
+
+def migrate_adresses(conn) -> Dict[str, int]:
+    """
+    Passe une base existante aux adresses partagées : ajoute et remplit la clé normalisée,
+    rattache les praticiens à une seule ligne par clé (de préférence déjà géocodée),
+    supprime les doublons et les adresses sans praticien, puis crée l'index unique.
+    Sans effet si la base est déjà migrée.
+    
+    Returns:
+        dict: {'fusionnees', 'orphelines'}
+    """
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name = 'idx_adresse_cle'")
+    if cursor.fetchone():
+        return {'fusionnees': 0, 'orphelines': 0}
+    
+    cursor.execute("PRAGMA table_info(Adresse)")
+    if 'cle' not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE Adresse ADD COLUMN cle TEXT")
+    
+    conn.create_function('cle_adresse', 3, cle_adresse, deterministic=True)
+    cursor.execute("UPDATE Adresse SET cle = cle_adresse(ligne, code_postal, ville) WHERE cle IS NULL")
+    
+    # Ligne gardée pour chaque clé en double
+    cursor.execute("DROP TABLE IF EXISTS temp.AdresseFusion")
+    cursor.execute("""
+        CREATE TEMP TABLE AdresseFusion AS
+        SELECT a.adresse_id AS ancien, g.garde AS nouveau
+        FROM Adresse a
+        JOIN (
+            SELECT cle,
+                   COALESCE(MIN(CASE WHEN latitude IS NOT NULL THEN adresse_id END), MIN(adresse_id)) AS garde
+            FROM Adresse
+            GROUP BY cle
+            HAVING COUNT(*) > 1
+        ) g ON a.cle = g.cle
+        WHERE a.adresse_id != g.garde
+    """)
+    cursor.execute("CREATE INDEX temp.idx_fusion ON AdresseFusion(ancien)")
+    
+    cursor.execute("""
+        UPDATE Praticien
+        SET adresse_id = (SELECT nouveau FROM AdresseFusion WHERE ancien = Praticien.adresse_id)
+        WHERE adresse_id IN (SELECT ancien FROM AdresseFusion)
+    """)
+    cursor.execute("DELETE FROM Adresse WHERE adresse_id IN (SELECT ancien FROM AdresseFusion)")
+    fusionnees = cursor.rowcount
+    cursor.execute("DROP TABLE temp.AdresseFusion")
+    
+    # Adresses laissées par des praticiens en doublon (anciens chargements)
+    cursor.execute("""
+        DELETE FROM Adresse
+        WHERE adresse_id NOT IN (SELECT adresse_id FROM Praticien WHERE adresse_id IS NOT NULL)
+    """)
+    orphelines = cursor.rowcount
+    
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_adresse_cle ON Adresse(cle)")
+    conn.commit()
+    
+    return {'fusionnees': fusionnees, 'orphelines': orphelines}
+
+
+def migrate_database(conn):
+    """
+    Met une base existante au schéma courant : retire_le, adresses partagées, ville normalisée,
+    clés entières, index de recherche et spatial, statistiques. Sans effet sur une base à jour.
+    Réservé aux chargements et à create_database.py --migrer : les lectures ne modifient pas
+    la base (voir verifier_schema).
+    """
+    migrate_praticiens(conn)
+    stats = migrate_adresses(conn)
+    migrate_villes(conn)
+    if stats['fusionnees'] or stats['orphelines']:
+        print(f"🔧 Adresses migrées: {stats['fusionnees']} doublons fusionnés, {stats['orphelines']} orphelines supprimées")
+    if migrate_cles(conn):
+        print("🔧 Métiers, spécialités et praticiens migrés vers des clés entières")
+    if create_search_index(conn):
+        print("🔎 Index de recherche construit")
+    if create_spatial_index(conn):
+        print("🗺️  Index spatial construit")
+    if create_stats_tables(conn):
+        print("📊 Statistiques calculées")
+
+
+class SchemaPerime(Exception):
+    """Base à migrer avant d'être lue (python3 create_database.py --migrer base.db)"""
+
+
+def verifier_schema(conn):
+    """
+    Vérifie, sans rien modifier, qu'une base ouverte en lecture a le schéma courant
+    (clés entières, voir migrate_cles). Lève SchemaPerime sinon.
+    """
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(Metier)")
+    colonnes = [row[1] for row in cursor.fetchall()]
+    if not colonnes:
+        raise SchemaPerime("Base sans table Metier : lancez d'abord create_database.py")
+    if 'code' not in colonnes:
+        raise SchemaPerime("Base antérieure aux clés entières : migrez-la avec python3 create_database.py --migrer <base>")
+
+
+def connect_lecture(db_name: str) -> sqlite3.Connection:
+    """Connexion en lecture seule (requêtes, exports) : la base n'est jamais modifiée"""
+    return sqlite3.connect(f"file:{db_name}?mode=ro", uri=True)
+
+
 def load_metiers(cursor):
     """
     Charge les métiers depuis professions_a_filtrer.txt
@@ -86,7 +719,7 @@ def load_metiers(cursor):
             if '|' in line:
                 metier_id, profession = line.split('|', 1)
                 cursor.execute(
-                    "INSERT OR IGNORE INTO Metier (metier_id, profession) VALUES (?, ?)",
+                    "INSERT OR IGNORE INTO Metier (code, profession) VALUES (?, ?)",
                     (metier_id, profession)
                 )
     
@@ -105,8 +738,8 @@ def load_specialites_from_nancy(cursor):
     
     # Ajouter la spécialité '0' pour les non-médecins
     cursor.execute(
-        "INSERT OR IGNORE INTO Specialite (spe_id, libelle) VALUES (?, ?)",
-        ('0', 'Aucune spécialité')
+        "INSERT OR IGNORE INTO Specialite (code, libelle) VALUES (?, ?)",
+        SANS_SPECIALITE
     )
     
     # Charger les spécialités depuis le fichier Nancy
@@ -122,7 +755,7 @@ def load_specialites_from_nancy(cursor):
                 libelle = spe['libelle']
                 
                 cursor.execute(
-                    "INSERT OR IGNORE INTO Specialite (spe_id, libelle) VALUES (?, ?)",
+                    "INSERT OR IGNORE INTO Specialite (code, libelle) VALUES (?, ?)",
                     (spe_id, libelle)
                 )
     
@@ -142,7 +775,7 @@ def insert_praticiens_from_json(cursor, json_file: str = 'praticiens_nancy.json'
         data = json.load(f)
     
     praticiens_inserted = 0
-    adresses_inserted = 0
+    adresses = set()
     
     # Mapping des professions vers les codes métier
     profession_to_code = {
@@ -158,21 +791,9 @@ def insert_praticiens_from_json(cursor, json_file: str = 'praticiens_nancy.json'
         # Récupérer le code métier
         metier_id = profession_to_code.get(prat['profession'], '99')  # 99 = Autre
         
-        # Insérer l'adresse et récupérer l'ID
-        addr = prat['adresse']
-        cursor.execute("""
-            INSERT INTO Adresse (ligne, code_postal, ville, complete, latitude, longitude)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            addr.get('ligne'),
-            addr.get('code_postal'),
-            addr.get('ville'),
-            addr.get('complete'),
-            addr.get('latitude'),
-            addr.get('longitude')
-        ))
-        adresse_id = cursor.lastrowid
-        adresses_inserted += 1
+        # Adresse partagée (créée au besoin) et son ID
+        adresse_id = get_or_create_adresse(cursor, prat['adresse'])
+        adresses.add(adresse_id)
         
         # Déterminer la spécialité
         spe_id = '0'  # Par défaut : aucune spécialité
@@ -181,7 +802,7 @@ def insert_praticiens_from_json(cursor, json_file: str = 'praticiens_nancy.json'
             code = prat['specialites'][0]['code']
             spe_id = code[2:] if code.startswith('SM') else code
         
-        # Insérer le praticien
+        # Insérer le praticien (clés entières du métier et de la spécialité)
         try:
             cursor.execute("""
                 INSERT INTO Praticien (rpps, nom, prenom, civilite, metier_id, spe_id, adresse_id)
@@ -191,8 +812,8 @@ def insert_praticiens_from_json(cursor, json_file: str = 'praticiens_nancy.json'
                 prat['nom'],
                 prat['prenom'],
                 prat['civilite'],
-                metier_id,
-                spe_id,
+                ids_par_code(cursor, 'Metier', {metier_id: prat['profession'] if metier_id != '99' else 'Autre'})[metier_id],
+                ids_par_code(cursor, 'Specialite', {spe_id: spe_id})[spe_id],
                 adresse_id
             ))
             praticiens_inserted += 1
@@ -200,7 +821,7 @@ def insert_praticiens_from_json(cursor, json_file: str = 'praticiens_nancy.json'
             print(f"   ⚠️ Doublon ignoré: {prat['rpps']} - {prat['nom']} {prat['prenom']}")
     
     print(f"✅ {praticiens_inserted} praticiens insérés")
-    print(f"✅ {adresses_inserted} adresses insérées")
+    print(f"✅ {len(adresses)} adresses distinctes")
 
 
 def display_stats(cursor):
@@ -219,22 +840,21 @@ def display_stats(cursor):
     cursor.execute("SELECT COUNT(*) FROM Specialite")
     print(f"   Spécialités: {cursor.fetchone()[0]}")
     
-    # Nombre d'adresses
-    cursor.execute("SELECT COUNT(*) FROM Adresse")
+    # Nombre d'adresses (tables de statistiques, voir create_stats_tables)
+    cursor.execute("SELECT valeur FROM StatGlobal WHERE cle = 'adresses'")
     print(f"   Adresses: {cursor.fetchone()[0]}")
     
     # Nombre de praticiens
-    cursor.execute("SELECT COUNT(*) FROM Praticien")
+    cursor.execute("SELECT COALESCE(SUM(actifs + retires), 0) FROM StatMetier")
     print(f"   Praticiens: {cursor.fetchone()[0]}")
     
     # Répartition par métier
     print("\n📋 Répartition par métier:")
     cursor.execute("""
-        SELECT m.profession, COUNT(p.rpps) as count
-        FROM Metier m
-        LEFT JOIN Praticien p ON m.metier_id = p.metier_id
-        GROUP BY m.metier_id, m.profession
-        HAVING COUNT(p.rpps) > 0
+        SELECT m.profession, s.actifs + s.retires as count
+        FROM StatMetier s
+        JOIN Metier m ON m.metier_id = s.metier_id
+        WHERE s.actifs + s.retires > 0
         ORDER BY count DESC
     """)
     
@@ -244,15 +864,13 @@ def display_stats(cursor):
     # Top 5 spécialités
     print("\n🏥 Top 5 spécialités:")
     cursor.execute("""
-        SELECT s.libelle, COUNT(p.rpps) as count
-        FROM Specialite s
-        LEFT JOIN Praticien p ON s.spe_id = p.spe_id
-        WHERE s.spe_id != '0'
-        GROUP BY s.spe_id, s.libelle
-        HAVING COUNT(p.rpps) > 0
+        SELECT sp.libelle, s.actifs as count
+        FROM StatSpecialite s
+        JOIN Specialite sp ON sp.spe_id = s.spe_id
+        WHERE sp.code != ? AND s.actifs > 0
         ORDER BY count DESC
         LIMIT 5
-    """)
+    """, (SANS_SPECIALITE[0],))
     
     for row in cursor.fetchall():
         print(f"   • {row[0]}: {row[1]}")
@@ -264,6 +882,23 @@ def main():
     """
     Point d'entrée principal
     """
+    if len(sys.argv) > 1 and sys.argv[1] == '--migrer':
+        db_name = sys.argv[2] if len(sys.argv) > 2 else "praticiens_sante.db"
+        conn = sqlite3.connect(db_name)
+        migrate_database(conn)
+        conn.close()
+        print(f"✅ {db_name}: base au schéma courant")
+        return
+    
+    if len(sys.argv) > 1 and sys.argv[1] == '--migrer-adresses':
+        db_name = sys.argv[2] if len(sys.argv) > 2 else "praticiens_sante.db"
+        conn = sqlite3.connect(db_name)
+        stats = migrate_adresses(conn)
+        conn.close()
+        print(f"✅ {db_name}: {stats['fusionnees']} adresses en double fusionnées, "
+              f"{stats['orphelines']} adresses sans praticien supprimées")
+        return
+    
     print("\n" + "="*80)
     print("🏥 CRÉATION DE LA BASE DE DONNÉES PRATICIENS DE SANTÉ")
     print("="*80)
@@ -278,6 +913,11 @@ def main():
     # Charger les spécialités
     load_specialites_from_nancy(cursor)
     
+    # Compléter avec toute la nomenclature (libellés officiels)
+    count = preload_specialites(conn)
+    if count:
+        print(f"✅ {count} spécialités de la nomenclature préchargées")
+    
     # Insérer les praticiens de Nancy
     insert_praticiens_from_json(cursor)
     
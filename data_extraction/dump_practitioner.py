@@ -5,17 +5,10 @@ Script pour dumper TOUTES les infos d'un praticien depuis l'API
 Usage: python3 dump_practitioner.py <RPPS>
 """
 
-import requests
 import json
 import sys
 
-# Configuration API
-API_URL = "https://gateway.api.esante.gouv.fr/fhir"
-API_KEY = "93f55893-96fa-4364-b558-9396fa2364d7"
-HEADERS = {
-    "ESANTE-API-KEY": API_KEY,
-    "Accept": "application/json"
-}
+from api_client import API_URL, HEADERS, APIError, request
 
 
 def dump_practitioner(rpps: str):
@@ -33,13 +26,14 @@ def dump_practitioner(rpps: str):
     print("-" * 80)
     
     try:
-        response = requests.get(
+        response = request(
+            'Practitioner',
             f"{API_URL}/v2/Practitioner/{rpps}",
             headers=HEADERS,
-            timeout=30
+            allow_404=True
         )
         
-        if response.status_code == 200:
+        if response is not None:
             practitioner_data = response.json()
             all_data['practitioner'] = practitioner_data
             print("✅ Succès")
@@ -47,11 +41,10 @@ def dump_practitioner(rpps: str):
             print(f"\nRéponse JSON:")
             print(json.dumps(practitioner_data, indent=2, ensure_ascii=False))
         else:
-            print(f"❌ Code HTTP: {response.status_code}")
-            print(f"Réponse: {response.text}")
+            print(f"❌ Code HTTP: 404")
             all_data['practitioner'] = None
         
-    except Exception as e:
+    except APIError as e:
         print(f"❌ Erreur: {e}")
         all_data['practitioner'] = None
     
@@ -62,14 +55,15 @@ def dump_practitioner(rpps: str):
     print("-" * 80)
     
     try:
-        response = requests.get(
+        response = request(
+            'PractitionerRole',
             f"{API_URL}/v2/PractitionerRole",
             headers=HEADERS,
             params={'practitioner': f'Practitioner/{rpps}', '_count': 100},
-            timeout=30
+            allow_404=True
         )
         
-        if response.status_code == 200:
+        if response is not None:
             role_data = response.json()
             all_data['practitionerRole'] = role_data
             print("✅ Succès")
@@ -77,11 +71,10 @@ def dump_practitioner(rpps: str):
             print(f"\nRéponse JSON:")
             print(json.dumps(role_data, indent=2, ensure_ascii=False))
         else:
-            print(f"❌ Code HTTP: {response.status_code}")
-            print(f"Réponse: {response.text}")
+            print(f"❌ Code HTTP: 404")
             all_data['practitionerRole'] = None
         
-    except Exception as e:
+    except APIError as e:
         print(f"❌ Erreur: {e}")
         all_data['practitionerRole'] = None
     
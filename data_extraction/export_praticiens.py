@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Export des praticiens de la base en NDJSON, CSV ou Parquet, au fil de l'eau : la base est
+lue par blocs de EXPORT_CHUNK lignes, écrits aussitôt (mémoire constante quel que soit le
+volume, un département entier comme toute la base)
+
+Filtres combinables : métiers, spécialité, département, ville, rectangle (bbox)
+
+Usage: python3 export_praticiens.py [--db base.db] [--format ndjson|csv|parquet] [--sortie fichier|-]
+                                    [--metier 10 60] [--specialite 08] [--departement 54]
+                                    [--ville Nancy] [--bbox ouest,sud,est,nord] [--avec-retires]
+Le format Parquet nécessite pyarrow (pip install pyarrow).
+"""
+
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from ban_geocoder import normaliser
+from create_database import SchemaPerime, connect_lecture, departement_sql, verifier_schema
+from registre_communes import postal_prefix
+
+# Lignes lues et écrites à la fois
+EXPORT_CHUNK = 5000
+
+FORMATS = ('ndjson', 'csv', 'parquet')
+
+# Colonnes exportées : (nom, expression SQL, type Parquet) ; metier_id et spe_id : codes de la nomenclature
+COLONNES = (
+    ('rpps', 'p.rpps', 'string'),
+    ('nom', 'p.nom', 'string'),
+    ('prenom', 'p.prenom', 'string'),
+    ('civilite', 'p.civilite', 'string'),
+    ('metier_id', 'm.code', 'string'),
+    ('profession', 'm.profession', 'string'),
+    ('spe_id', 's.code', 'string'),
+    ('specialite', 's.libelle', 'string'),
+    ('ligne', 'a.ligne', 'string'),
+    ('code_postal', 'a.code_postal', 'string'),
+    ('ville', 'a.ville', 'string'),
+    ('latitude', 'a.latitude', 'float64'),
+    ('longitude', 'a.longitude', 'float64'),
+    ('retire_le', 'p.retire_le', 'string'),
+)
+NOMS = tuple(nom for nom, _, _ in COLONNES)
+
+
+def build_query(metiers: Optional[Sequence[str]] = None, specialite: Optional[str] = None,
+                departement: Optional[str] = None, ville: Optional[str] = None,
+                bbox: Optional[Tuple[float, float, float, float]] = None,
+                avec_retires: bool = False, geo_index: bool = True) -> Tuple[str, List]:
+    """
+    Requête d'export et ses paramètres. Sans ORDER BY : les lignes sortent dans l'ordre de la
+    table, sans tri intermédiaire, et peuvent être écrites dès qu'elles sont lues.
+
+    Args:
+        bbox: (ouest, sud, est, nord) en degrés
+        geo_index: Utiliser l'index GeoAdresse (voir create_database.create_spatial_index)
+    """
+    conditions = []
+    params = []
+    if not avec_retires:
+        conditions.append("p.retire_le IS NULL")
+    if metiers:
+        conditions.append(f"p.metier_id IN (SELECT metier_id FROM Metier WHERE code IN ({', '.join('?' * len(metiers))}))")
+        params.extend(metiers)
+    if specialite:
+        code = specialite.strip().upper()
+        conditions.append("p.spe_id = (SELECT spe_id FROM Specialite WHERE code = ?)")
+        params.append(code[2:] if code.startswith('SM') else code)
+    if departement:
+        conditions.append(f"{departement_sql('a.code_postal')} = ?")
+        params.append(postal_prefix(departement.strip().upper()))
+    if ville:
+        conditions.append("a.ville_cle = ?")
+        params.append(normaliser(ville))
+    if bbox:
+        ouest, sud, est, nord = bbox
+        if geo_index:
+            conditions.append("""a.adresse_id IN (
+                SELECT adresse_id FROM GeoAdresse
+                WHERE max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?
+            )""")
+            params.extend([sud, nord, ouest, est])
+        conditions.append("a.latitude BETWEEN ? AND ? AND a.longitude BETWEEN ? AND ?")
+        params.extend([sud, nord, ouest, est])
+
+    # Filtre sur l'adresse : jointure interne (le planificateur peut partir des adresses)
+    jointure_adresse = "JOIN" if departement or ville or bbox else "LEFT JOIN"
+    sql = f"""
+        SELECT {', '.join(expr for _, expr, _ in COLONNES)}
+        FROM Praticien p
+        {jointure_adresse} Adresse a ON a.adresse_id = p.adresse_id
+        LEFT JOIN Metier m ON m.metier_id = p.metier_id
+        LEFT JOIN Specialite s ON s.spe_id = p.spe_id
+        {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+    """
+    return sql, params
+
+
+def iter_blocs(conn, chunk: int = EXPORT_CHUNK, **filtres) -> Iterator[List[tuple]]:
+    """Praticiens correspondant aux filtres (voir build_query), par blocs d'au plus chunk lignes"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'GeoAdresse'")
+    geo_index = cursor.fetchone() is not None
+
+    sql, params = build_query(geo_index=geo_index, **filtres)
+    cursor.execute(sql, params)
+    while True:
+        bloc = cursor.fetchmany(chunk)
+        if not bloc:
+            return
+        yield bloc
+
+
+def write_ndjson(blocs: Iterator[List[tuple]], out) -> int:
+    """Un praticien par ligne (objet JSON) ; retourne le nombre de lignes écrites"""
+    count = 0
+    for bloc in blocs:
+        out.write(''.join(json.dumps(dict(zip(NOMS, row)), ensure_ascii=False) + '\n' for row in bloc))
+        count += len(bloc)
+    return count
+
+
+def write_csv(blocs: Iterator[List[tuple]], out) -> int:
+    """CSV avec ligne d'en-tête ; retourne le nombre de lignes écrites"""
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(NOMS)
+    count = 0
+    for bloc in blocs:
+        writer.writerows(bloc)
+        count += len(bloc)
+    return count
+
+
+def write_parquet(blocs: Iterator[List[tuple]], out) -> int:
+    """Parquet, un groupe de lignes par bloc ; retourne le nombre de lignes écrites"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Le format Parquet nécessite pyarrow : pip install pyarrow")
+
+    schema = pa.schema([(nom, getattr(pa, type_)()) for nom, _, type_ in COLONNES])
+    count = 0
+    with pq.ParquetWriter(out, schema) as writer:
+        for bloc in blocs:
+            colonnes = list(zip(*bloc))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(valeurs, type=champ.type) for valeurs, champ in zip(colonnes, schema)],
+                schema=schema
+            ))
+            count += len(bloc)
+    return count
+
+
+def export_praticiens(conn, fmt: str, sortie: str, chunk: int = EXPORT_CHUNK, **filtres) -> int:
+    """
+    Exporte les praticiens correspondant aux filtres (voir build_query) dans sortie
+    ('-' : sortie standard). Retourne le nombre de praticiens exportés.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Format inconnu: {fmt} (attendu: {', '.join(FORMATS)})")
+    blocs = iter_blocs(conn, chunk, **filtres)
+    write = {'ndjson': write_ndjson, 'csv': write_csv, 'parquet': write_parquet}[fmt]
+
+    if sortie == '-':
+        if fmt != 'parquet':
+            count = write(blocs, sys.stdout)
+            sys.stdout.flush()
+            return count
+        # Parquet : fichier temporaire sur disque puis copie (ParquetWriter attend un fichier)
+        with tempfile.TemporaryFile() as tmp:
+            count = write(blocs, tmp)
+            tmp.seek(0)
+            shutil.copyfileobj(tmp, sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+        return count
+
+    # Fichier temporaire renommé à la fin : pas d'export à moitié écrit sous le nom final
+    tmp = f"{sortie}.{os.getpid()}.tmp"
+    try:
+        if fmt == 'parquet':
+            count = write(blocs, tmp)
+        else:
+            with open(tmp, 'w', encoding='utf-8', newline='') as f:
+                count = write(blocs, f)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, sortie)
+    return count
+
+
+def main():
+    """Point d'entrée principal"""
+    parser = argparse.ArgumentParser(description="Exporte les praticiens de la base (NDJSON, CSV, Parquet)")
+    parser.add_argument('--db', default="praticiens_sante.db", help="Base SQLite")
+    parser.add_argument('--format', choices=FORMATS, default='ndjson', help="Format de sortie")
+    parser.add_argument('--sortie', default='-', help="Fichier de sortie ('-' : sortie standard)")
+    parser.add_argument('--metier', nargs='+', help="Métiers (codes : 10, 60...)")
+    parser.add_argument('--specialite', help="Spécialité (08 ou SM08)")
+    parser.add_argument('--departement', help="Département (54, 2A, 974...)")
+    parser.add_argument('--ville', help="Ville (accents et casse ignorés)")
+    parser.add_argument('--bbox', help="Rectangle ouest,sud,est,nord (degrés)")
+    parser.add_argument('--avec-retires', action='store_true', help="Inclure les praticiens retirés de l'annuaire")
+    parser.add_argument('--chunk', type=int, default=EXPORT_CHUNK, help="Lignes lues et écrites à la fois")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ Base introuvable: {args.db}", file=sys.stderr)
+        sys.exit(1)
+
+    conn = connect_lecture(args.db)
+    start_time = time.time()
+    try:
+        verifier_schema(conn)
+        count = export_praticiens(
+            conn, args.format, args.sortie, args.chunk,
+            metiers=args.metier,
+            specialite=args.specialite,
+            departement=args.departement,
+            ville=args.ville,
+            bbox=tuple(float(v) for v in args.bbox.split(',')) if args.bbox else None,
+            avec_retires=args.avec_retires,
+        )
+    except (RuntimeError, ValueError, SchemaPerime) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+    except BrokenPipeError:
+        # Lecteur parti (téléchargement interrompu) : la sortie standard est redirigée vers
+        # /dev/null pour que sa fermeture à la sortie de l'interpréteur n'échoue pas à nouveau
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        print("⚠️  Export interrompu : sortie fermée par le lecteur", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        conn.close()
+
+    # Messages sur la sortie d'erreur : la sortie standard peut porter les données
+    destination = "la sortie standard" if args.sortie == '-' else args.sortie
+    print(f"✅ {count} praticiens exportés ({args.format}) vers {destination} en {time.time() - start_time:.1f}s",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
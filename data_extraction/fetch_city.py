@@ -1,40 +1,52 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-Script pour récupérer TOUS les praticiens d'une ville et les sauvegarder en JSON
+Script pour récupérer TOUS les praticiens d'une ville et les sauvegarder en NDJSON
+(un praticien par ligne, écrit dès qu'il est résolu)
 Usage: python3 fetch_city.py <ville>
 Exemple: python3 fetch_city.py Nancy
+
+Relancer la commande après une interruption reprend le fichier existant : les
+praticiens déjà écrits ne sont pas récupérés à nouveau.
 """
 
-import requests
 import json
+import os
 import sys
-import time
-from typing import List, Dict, Optional
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Dict, Optional
 from sm import get_spe
+import ban_geocoder
+import metriques
+from ndjson_praticiens import NdjsonWriter
+from api_client import API_URL, HEADERS, GEOCODING_API, APIError, get_json, get_fhir
 
-# Configuration API
-API_URL = "https://gateway.api.esante.gouv.fr/fhir"
-API_KEY = "93f55893-96fa-4364-b558-9396fa2364d7"
-HEADERS = {
-    "ESANTE-API-KEY": API_KEY,
-    "Accept": "application/json"
-}
-
-# API de géocodage
-GEOCODING_API = "https://api-adresse.data.gouv.fr/search/"
+# Cache des adresses d'organisations déjà résolues : {org_id: adresse ou None}
+# Partagé par tous les crawls du processus, et persisté entre les runs dans ORG_CACHE_DB
+# (chaîne vide = pas de persistance)
+ORG_CACHE = {}
+ORG_CACHE_DB = os.environ.get('ORG_CACHE_DB', 'cache_organisations.db')
+ORG_CACHE_TTL_DAYS = 30
+ORG_CACHE_WORKERS = 8
+_org_cache_lock = threading.Lock()
+_org_cache_local = threading.local()
+_seen_lock = threading.Lock()
 
 
 def geocode_address(address_complete: str) -> Dict[str, Optional[float]]:
     """Géocode une adresse pour obtenir latitude/longitude"""
+    # Base BAN locale en priorité (pas de réseau ni de quota)
+    coords = ban_geocoder.geocode_address(address_complete)
+    metriques.cache_access('ban', coords['latitude'] is not None)
+    if coords['latitude'] is not None:
+        return coords
+    
+    # Un échec n'est pas bloquant : geocode_addresses.py complétera les coordonnées manquantes
     try:
-        response = requests.get(
-            GEOCODING_API,
-            params={'q': address_complete, 'limit': 1},
-            timeout=5
-        )
-        response.raise_for_status()
-        data = response.json()
+        data = get_json('geocoder', GEOCODING_API, params={'q': address_complete, 'limit': 1}, timeout=5)
         
         if data.get('features') and len(data['features']) > 0:
             coords = data['features'][0]['geometry']['coordinates']
@@ -42,7 +54,7 @@ def geocode_address(address_complete: str) -> Dict[str, Optional[float]]:
                 'longitude': coords[0],
                 'latitude': coords[1]
             }
-    except Exception:
+    except APIError:
         pass
     
     return {'longitude': None, 'latitude': None}
@@ -104,7 +116,6 @@ def get_full_address(addresses: List[Dict]) -> Optional[Dict]:
     # Géocoder l'adresse
     geocode_query = f"{' '.join(lines)} {postal} {city}"
     coords = geocode_address(geocode_query)
-    time.sleep(0.05)  # Petit délai pour ne pas surcharger l'API
     
     return {
         'ligne': ', '.join(lines),
@@ -130,16 +141,19 @@ def extract_codes(code_list: List[Dict]) -> List[Dict]:
 
 
 def get_practitioner_details(practitioner_id: str) -> Optional[Dict]:
-    """Récupère les détails d'un praticien"""
+    """
+    Récupère les détails d'un praticien (None s'il n'existe pas ou n'a pas de RPPS)
+    Lève APIError si l'API ne répond pas
+    """
+    practitioner = get_fhir('Practitioner', f"/{practitioner_id}", allow_404=True)
+    if practitioner is None:
+        return None
+    return parse_practitioner(practitioner)
+
+
+def parse_practitioner(practitioner: Dict) -> Optional[Dict]:
+    """Informations utiles d'une ressource Practitioner (None si elle n'a pas de RPPS)"""
     try:
-        response = requests.get(
-            f"{API_URL}/v2/Practitioner/{practitioner_id}",
-            headers=HEADERS,
-            timeout=30
-        )
-        response.raise_for_status()
-        practitioner = response.json()
-        
         # Extraire les informations de base
         names = practitioner.get('name', [])
         name_info = names[0] if names else {}
@@ -189,156 +203,482 @@ def get_practitioner_details(practitioner_id: str) -> Optional[Dict]:
             'prefix': ' '.join(name_info.get('prefix', [])),
             'rpps': rpps,
             'profession_code': profession_code,
-            'specialites': specialites
+            'specialites': specialites,
+            'active': practitioner.get('active', True)
         }
         
     except Exception:
         return None
 
 
+def _org_cache_connect() -> Optional[sqlite3.Connection]:
+    """Connexion au cache persistant des organisations (une par thread), None si désactivé"""
+    if not ORG_CACHE_DB:
+        return None
+    conn = getattr(_org_cache_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(ORG_CACHE_DB, timeout=30)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS CacheOrganisation (
+                org_id TEXT PRIMARY KEY,
+                adresse TEXT,
+                maj_le TEXT NOT NULL
+            )
+        """)
+        _org_cache_local.conn = conn
+    return conn
+
+
+def load_org_cache(org_ids: List[str]):
+    """Charge depuis le cache persistant les adresses encore valides des organisations données"""
+    missing = [org_id for org_id in org_ids if org_id not in ORG_CACHE]
+    conn = _org_cache_connect()
+    if conn is None or not missing:
+        return
+    
+    limit = (datetime.now() - timedelta(days=ORG_CACHE_TTL_DAYS)).isoformat()
+    # Par paquets pour rester sous la limite de paramètres SQLite
+    for i in range(0, len(missing), 500):
+        chunk = missing[i:i + 500]
+        placeholders = ','.join(['?'] * len(chunk))
+        rows = conn.execute(
+            f"SELECT org_id, adresse FROM CacheOrganisation WHERE maj_le >= ? AND org_id IN ({placeholders})",
+            (limit, *chunk)
+        ).fetchall()
+        with _org_cache_lock:
+            for org_id, adresse in rows:
+                ORG_CACHE[org_id] = json.loads(adresse)
+
+
+def save_org_cache(entries: Dict[str, Optional[Dict]]):
+    """
+    Enregistre des adresses résolues dans le cache persistant. Les adresses sans coordonnées
+    (géocodage en échec, peut-être passager) n'y sont pas gardées : le prochain run les géocodera.
+    """
+    entries = {
+        org_id: adresse for org_id, adresse in entries.items()
+        if adresse is None or adresse['latitude'] is not None
+    }
+    conn = _org_cache_connect()
+    if conn is None or not entries:
+        return
+    
+    now = datetime.now().isoformat()
+    conn.executemany(
+        "INSERT OR REPLACE INTO CacheOrganisation (org_id, adresse, maj_le) VALUES (?, ?, ?)",
+        [(org_id, json.dumps(adresse, ensure_ascii=False), now) for org_id, adresse in entries.items()]
+    )
+    conn.commit()
+
+
+def resolve_organization_addresses(orgs: List[Dict]):
+    """
+    Remplit le cache avec les adresses des organisations issues de la recherche
+    (elles contiennent déjà l'adresse : seul le géocodage reste à faire, en parallèle)
+    """
+    load_org_cache([org['id'] for org in orgs])
+    
+    todo = [org for org in orgs if org['id'] not in ORG_CACHE]
+    metriques.inc('crawl_cache_requests_total', len(orgs) - len(todo), cache='organisations', resultat='hit')
+    metriques.inc('crawl_cache_requests_total', len(todo), cache='organisations', resultat='miss')
+    if not todo:
+        return
+    
+    with ThreadPoolExecutor(max_workers=ORG_CACHE_WORKERS) as executor:
+        addresses = list(executor.map(lambda org: get_full_address(org['address']), todo))
+    
+    resolved = {org['id']: addr for org, addr in zip(todo, addresses)}
+    with _org_cache_lock:
+        ORG_CACHE.update(resolved)
+    save_org_cache(resolved)
+
+
 def get_organization_address(org_ref: str) -> Optional[Dict]:
-    """Récupère l'adresse d'une organisation"""
+    """Récupère l'adresse d'une organisation (depuis le cache si déjà résolue)"""
     if not org_ref:
         return None
     
     org_id = org_ref.split('/')[-1]
     
-    try:
-        response = requests.get(
-            f"{API_URL}/v2/Organization/{org_id}",
-            headers=HEADERS,
-            timeout=30
-        )
-        response.raise_for_status()
-        org = response.json()
-        
-        return get_full_address(org.get('address', []))
-        
-    except Exception:
+    metriques.cache_access('organisations', org_id in ORG_CACHE)
+    if org_id in ORG_CACHE:
+        return ORG_CACHE[org_id]
+    
+    org = get_fhir('Organization', f"/{org_id}", allow_404=True)
+    if org is None:
         return None
+    
+    addr = get_full_address(org.get('address', []))
+    
+    with _org_cache_lock:
+        ORG_CACHE[org_id] = addr
+    save_org_cache({org_id: addr})
+    
+    return addr
 
 
-def fetch_all_practitioners_from_city(city: str) -> List[Dict]:
-    """Récupère TOUS les praticiens d'une ville (toutes professions)"""
-    print(f"\n{'='*80}")
-    print(f"🔍 RÉCUPÉRATION DE TOUS LES PRATICIENS DE {city.upper()}")
-    print(f"{'='*80}\n")
+def get_all_pages(url: str, params: Dict) -> List[Dict]:
+    """
+    Récupère toutes les entrées d'une recherche FHIR en suivant les liens 'next' du Bundle
+    Lève APIError si une page ne peut pas être récupérée
+    """
+    entries = []
     
-    # Étape 1: Récupérer les organisations de la ville
-    print(f"📍 Recherche des organisations à {city}...")
+    endpoint = url.rstrip('/').split('/')[-1]
     
-    try:
-        response = requests.get(
-            f"{API_URL}/v2/Organization",
-            headers=HEADERS,
-            params={
-                'address-city': city,
-                '_count': 500
-            },
-            timeout=30
-        )
-        response.raise_for_status()
-        data = response.json()
-        
-        orgs = []
-        for entry in data.get('entry', []):
-            org = entry.get('resource', {})
-            orgs.append({
-                'id': org.get('id'),
-                'name': org.get('name', 'N/A'),
-                'ref': f"Organization/{org.get('id')}"
-            })
-        
-        print(f"   ✅ {len(orgs)} organisations trouvées\n")
+    while url:
+        data = get_json(endpoint, url, params=params, headers=HEADERS)
+        entries.extend(data.get('entry', []))
         
-    except Exception as e:
-        print(f"   ❌ Erreur: {e}")
-        return []
+        # Le lien 'next' contient déjà tous les paramètres de la recherche
+        url = next((link['url'] for link in data.get('link', []) if link.get('relation') == 'next'), None)
+        params = None
+    
+    return entries
+
+
+def search_organizations(params: Dict) -> List[Dict]:
+    """Recherche des organisations (toutes les pages). Lève une exception en cas d'échec"""
+    orgs = []
+    for entry in get_all_pages(f"{API_URL}/v2/Organization", {**params, '_count': 500}):
+        org = entry.get('resource', {})
+        orgs.append({
+            'id': org.get('id'),
+            'name': org.get('name', 'N/A'),
+            'ref': f"Organization/{org.get('id')}",
+            'address': org.get('address', [])
+        })
+    return orgs
+
+
+def find_organizations_in_city(city: str) -> List[Dict]:
+    """Organisations d'une ville"""
+    return search_organizations({'address-city': city})
+
+
+def find_organizations_by_postal_prefix(prefix: str, extra_params: Optional[Dict] = None) -> List[Dict]:
+    """Organisations dont le code postal commence par `prefix` (département, ex: '54')"""
+    orgs = search_organizations({'address-postalcode': prefix, **(extra_params or {})})
+    # La recherche FHIR sur les chaînes est un "commence par" : vérifier quand même
+    return [
+        org for org in orgs
+        if any((a.get('postalCode') or '').startswith(prefix) for a in org['address'])
+    ]
+
+
+def forget_organizations(org_ids: List[str]):
+    """Oublie les adresses en cache d'organisations modifiées (elles seront résolues à nouveau)"""
+    with _org_cache_lock:
+        for org_id in org_ids:
+            ORG_CACHE.pop(org_id, None)
+    
+    conn = _org_cache_connect()
+    if conn is None or not org_ids:
+        return
+    for i in range(0, len(org_ids), 500):
+        chunk = org_ids[i:i + 500]
+        conn.execute(f"DELETE FROM CacheOrganisation WHERE org_id IN ({','.join('?' * len(chunk))})", chunk)
+    conn.commit()
+
+
+def find_changes(since: str, prefixes: List[str]) -> Dict:
+    """
+    Ressources modifiées depuis l'instant FHIR `since` (recherches _lastUpdated=ge...)
+    
+    Returns:
+        dict: {
+            'organisations': organisations de la région modifiées (format de search_organizations),
+            'roles': {id praticien: {'rpps', 'codes_postaux'}} pour les rôles créés, modifiés
+                     ou clos (RPPS et codes postaux des organisations lus dans les _include),
+            'praticiens': {id: ressource Practitioner} des praticiens modifiés
+        }
+    Les rôles et praticiens ne se filtrent pas par lieu côté API : ils couvrent tout l'annuaire.
+    """
+    # ge plutôt que gt : les instants sont à la seconde, et réappliquer un changement est sans effet
+    changed = {'_lastUpdated': f"ge{since}"}
+    
+    orgs = {}
+    for prefix in prefixes:
+        for org in find_organizations_by_postal_prefix(prefix, changed):
+            orgs[org['id']] = org
+    
+    entries = get_all_pages(f"{API_URL}/v2/PractitionerRole", {
+        **changed,
+        '_include': ['PractitionerRole:organization', 'PractitionerRole:practitioner'],
+        '_count': 500
+    })
+    included = {
+        f"{e['resource'].get('resourceType')}/{e['resource'].get('id')}": e['resource']
+        for e in entries if e.get('search', {}).get('mode') == 'include'
+    }
+    roles = {}
+    for entry in entries:
+        role = entry.get('resource', {})
+        if entry.get('search', {}).get('mode') == 'include' or role.get('resourceType') != 'PractitionerRole':
+            continue
+        pract_ref = role.get('practitioner', {}).get('reference')
+        if not pract_ref:
+            continue
+        change = roles.setdefault(pract_ref.split('/')[-1], {'rpps': None, 'codes_postaux': set()})
+        practitioner = included.get(pract_ref)
+        if practitioner and change['rpps'] is None:
+            details = parse_practitioner(practitioner)
+            change['rpps'] = details['rpps'] if details else None
+        org = included.get(role.get('organization', {}).get('reference'))
+        for addr in (org or {}).get('address', []):
+            if addr.get('postalCode'):
+                change['codes_postaux'].add(addr['postalCode'])
+    
+    practitioners = {}
+    for entry in get_all_pages(f"{API_URL}/v2/Practitioner", {**changed, '_count': 500}):
+        resource = entry.get('resource', {})
+        if resource.get('id'):
+            practitioners[resource['id']] = resource
+    
+    return {
+        'organisations': list(orgs.values()),
+        'roles': roles,
+        'praticiens': practitioners
+    }
+
+
+def practitioners_of_organizations(org_ids: List[str]) -> set:
+    """Ids des praticiens ayant un rôle dans ces organisations"""
+    practitioners = set()
+    for org_id in org_ids:
+        for entry in get_all_pages(f"{API_URL}/v2/PractitionerRole", {'organization': org_id, '_count': 100}):
+            pract_ref = entry.get('resource', {}).get('practitioner', {}).get('reference')
+            if pract_ref:
+                practitioners.add(pract_ref.split('/')[-1])
+    return practitioners
+
+
+def refresh_practitioner(pract_id: str, prefixes: List[str], resource: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    État actuel d'un praticien pour le rafraîchissement incrémental
+    
+    Args:
+        pract_id: Id FHIR du praticien
+        prefixes: Préfixes de code postal de la région
+        resource: Ressource Practitioner déjà lue (sinon elle est récupérée)
+    
+    Returns:
+        {'rpps', 'praticien'} où praticien est au format de fetch_practitioners_from_orgs,
+        ou None s'il n'exerce plus dans la région (inactif ou sans rôle actif avec une adresse
+        valide) ; None tout court si le praticien est introuvable ou sans RPPS.
+        Lève APIError si l'API ne répond pas.
+    """
+    practitioner = parse_practitioner(resource) if resource else get_practitioner_details(pract_id)
+    if not practitioner:
+        return None
+    
+    result = {'rpps': practitioner['rpps'], 'praticien': None}
+    if not practitioner['active']:
+        return result
+    
+    for entry in get_all_pages(f"{API_URL}/v2/PractitionerRole", {'practitioner': pract_id, '_count': 100}):
+        role = entry.get('resource', {})
+        if not role.get('active', True):
+            continue
+        addr = get_organization_address(role.get('organization', {}).get('reference'))
+        if addr and addr['ligne'] and any(addr['code_postal'].startswith(prefix) for prefix in prefixes):
+            result['praticien'] = {
+                'rpps': practitioner['rpps'],
+                'fhir_id': pract_id,
+                'nom': practitioner['family'],
+                'prenom': practitioner['given'],
+                'civilite': practitioner['prefix'],
+                'profession_code': practitioner['profession_code'],
+                'specialites': practitioner['specialites'],
+                'adresse': addr
+            }
+            break
+    
+    return result
+
+
+def claim_seen(seen: Optional[Dict], kind: str, resource_id: str) -> bool:
+    """Réserve un id pour ce crawl : False s'il a déjà été récupéré (ou réservé par un autre thread)"""
+    if seen is None:
+        return True
+    with _seen_lock:
+        if resource_id in seen[kind]:
+            return False
+        seen[kind].add(resource_id)
+        return True
+
+
+def release_seen(seen: Optional[Dict], kind: str, resource_ids: List[str]):
+    """Libère des ids réservés par un crawl qui a échoué, pour qu'ils soient repris"""
+    if seen is None:
+        return
+    with _seen_lock:
+        seen[kind].difference_update(resource_ids)
+
+
+def fetch_practitioners_from_orgs(orgs: List[Dict], verbose: bool = True, seen: Optional[Dict] = None) -> List[Dict]:
+    """
+    Récupère les praticiens rattachés à une liste d'organisations
+    
+    Args:
+        orgs: Organisations issues de search_organizations()
+        verbose: Afficher la progression
+        seen: {'Organization': set(), 'Practitioner': set()} partagé entre les crawls d'un
+              même rafraîchissement, pour ne récupérer chaque praticien qu'une seule fois
+    """
+    return list(iter_practitioners_from_orgs(orgs, verbose, seen))
+
+
+def iter_practitioners_from_orgs(orgs: List[Dict], verbose: bool = True, seen: Optional[Dict] = None,
+                                 skip: Optional[set] = None) -> Iterator[Dict]:
+    """
+    Comme fetch_practitioners_from_orgs, en générant chaque praticien dès qu'il est résolu
+    
+    Args:
+        skip: Ids FHIR des praticiens à ne pas récupérer (déjà écrits, reprise)
+    """
+    log = print if verbose else (lambda *args, **kwargs: None)
+    
+    # Résoudre (et géocoder) une seule fois l'adresse de chaque organisation
+    log(f"📍 Résolution des adresses des organisations...")
+    resolve_organization_addresses(orgs)
+    log(f"   ✅ {len(orgs)} adresses d'organisations en cache\n")
     
     # Étape 2: Pour chaque organisation, récupérer les praticiens
-    print(f"🔄 Récupération des praticiens...\n")
+    log(f"🔄 Récupération des praticiens...\n")
     
     all_practitioners = {}  # {pract_id: [org_refs]}
     
     for i, org in enumerate(orgs, 1):
         if i % 10 == 0:
-            print(f"   [{i}/{len(orgs)}] organisations traitées - {len(all_practitioners)} praticiens uniques")
+            log(f"   [{i}/{len(orgs)}] organisations traitées - {len(all_practitioners)} praticiens uniques")
         
-        try:
-            response = requests.get(
-                f"{API_URL}/v2/PractitionerRole",
-                headers=HEADERS,
-                params={
-                    'organization': org['id'],
-                    '_count': 100
-                },
-                timeout=30
-            )
-            response.raise_for_status()
-            role_data = response.json()
+        entries = get_all_pages(
+            f"{API_URL}/v2/PractitionerRole",
+            {
+                'organization': org['id'],
+                '_count': 100
+            }
+        )
+        
+        for entry in entries:
+            role = entry.get('resource', {})
+            pract_ref = role.get('practitioner', {}).get('reference')
             
-            for entry in role_data.get('entry', []):
-                role = entry.get('resource', {})
-                pract_ref = role.get('practitioner', {}).get('reference')
+            if pract_ref:
+                pract_id = pract_ref.split('/')[-1]
                 
-                if pract_ref:
-                    pract_id = pract_ref.split('/')[-1]
-                    
-                    if pract_id not in all_practitioners:
-                        all_practitioners[pract_id] = []
-                    all_practitioners[pract_id].append(org['ref'])
-            
-            time.sleep(0.05)
-            
-        except Exception:
-            pass
+                if pract_id not in all_practitioners:
+                    all_practitioners[pract_id] = []
+                all_practitioners[pract_id].append(org['ref'])
+    
+    # Ne garder que les praticiens pas encore récupérés (pendant ce rafraîchissement, ou déjà écrits)
+    all_practitioners = {
+        pract_id: org_refs for pract_id, org_refs in all_practitioners.items()
+        if pract_id not in (skip or ()) and claim_seen(seen, 'Practitioner', pract_id)
+    }
     
-    print(f"\n   ✅ {len(all_practitioners)} praticiens uniques trouvés\n")
+    log(f"\n   ✅ {len(all_practitioners)} praticiens uniques trouvés\n")
     
     # Étape 3: Récupérer les détails de chaque praticien
-    print(f"🔄 Récupération des détails (informations + adresses + géocodage)...\n")
+    log(f"🔄 Récupération des détails (informations + adresses + géocodage)...\n")
     
-    result = []
+    valid = 0
     total = len(all_practitioners)
     processed = 0
+    rendus = set()  # Praticiens générés : les autres sont libérés à la fin
     
-    for pract_id, org_refs in all_practitioners.items():
-        processed += 1
-        
-        if processed % 20 == 0:
-            print(f"   [{processed}/{total}] praticiens traités - {len(result)} avec adresse valide")
-        
-        # Récupérer les détails du praticien
-        practitioner = get_practitioner_details(pract_id)
-        
-        if not practitioner:
-            continue
-        
-        # Trouver une adresse valide
-        valid_address = None
-        for org_ref in org_refs:
-            addr = get_organization_address(org_ref)
-            if addr and addr['ligne']:
-                valid_address = addr
-                break
-        
-        if not valid_address:
-            continue
-        
-        # Ajouter à la liste
-        result.append({
-            'rpps': practitioner['rpps'],
-            'nom': practitioner['family'],
-            'prenom': practitioner['given'],
-            'civilite': practitioner['prefix'],
-            'profession_code': practitioner['profession_code'],
-            'specialites': practitioner['specialites'],
-            'adresse': valid_address
-        })
+    try:
+        for pract_id, org_refs in all_practitioners.items():
+            processed += 1
+            
+            if processed % 20 == 0:
+                log(f"   [{processed}/{total}] praticiens traités - {valid} avec adresse valide")
+            
+            # Récupérer les détails du praticien
+            practitioner = get_practitioner_details(pract_id)
+            
+            if not practitioner:
+                continue
+            
+            # Trouver une adresse valide
+            valid_address = None
+            for org_ref in org_refs:
+                addr = get_organization_address(org_ref)
+                if addr and addr['ligne']:
+                    valid_address = addr
+                    break
+            
+            if not valid_address:
+                continue
+            
+            valid += 1
+            rendus.add(pract_id)
+            yield {
+                'rpps': practitioner['rpps'],
+                'fhir_id': pract_id,
+                'nom': practitioner['family'],
+                'prenom': practitioner['given'],
+                'civilite': practitioner['prefix'],
+                'profession_code': practitioner['profession_code'],
+                'specialites': practitioner['specialites'],
+                'adresse': valid_address
+            }
+    except APIError:
+        # Rendre tous les praticiens pour qu'une nouvelle tentative les récupère
+        rendus = set()
+        raise
+    finally:
+        # Sans détails ou sans adresse ici (ou non atteints) : un autre crawl peut les récupérer
+        release_seen(seen, 'Practitioner', [pract_id for pract_id in all_practitioners if pract_id not in rendus])
     
-    print(f"\n   ✅ {len(result)} praticiens avec adresse valide\n")
+    log(f"\n   ✅ {valid} praticiens avec adresse valide\n")
+
+
+def fetch_all_practitioners_from_city(city: str, verbose: bool = True, seen: Optional[Dict] = None) -> List[Dict]:
+    """
+    Récupère TOUS les praticiens d'une ville (toutes professions)
+    Lève une exception si la recherche des organisations échoue
+    """
+    return list(iter_all_practitioners_from_city(city, verbose, seen))
+
+
+def iter_all_practitioners_from_city(city: str, verbose: bool = True, seen: Optional[Dict] = None,
+                                     skip: Optional[set] = None) -> Iterator[Dict]:
+    """Comme fetch_all_practitioners_from_city, en générant chaque praticien dès qu'il est résolu"""
+    log = print if verbose else (lambda *args, **kwargs: None)
     
-    return result
+    log(f"\n{'='*80}")
+    log(f"🔍 RÉCUPÉRATION DE TOUS LES PRATICIENS DE {city.upper()}")
+    log(f"{'='*80}\n")
+    
+    # Étape 1: Récupérer les organisations de la ville
+    log(f"📍 Recherche des organisations à {city}...")
+    orgs = [org for org in find_organizations_in_city(city) if claim_seen(seen, 'Organization', org['id'])]
+    log(f"   ✅ {len(orgs)} organisations trouvées\n")
+    
+    yield from iter_practitioners_from_orgs(orgs, verbose, seen, skip)
+
+
+def fetch_all_practitioners_from_postal_prefix(prefix: str, verbose: bool = True, seen: Optional[Dict] = None) -> List[Dict]:
+    """
+    Récupère TOUS les praticiens dont l'organisation a un code postal commençant par `prefix`
+    (ex: '54' pour la Meurthe-et-Moselle) : une seule recherche au lieu d'une par commune
+    """
+    log = print if verbose else (lambda *args, **kwargs: None)
+    
+    log(f"\n{'='*80}")
+    log(f"🔍 RÉCUPÉRATION DE TOUS LES PRATICIENS DU CODE POSTAL {prefix}*")
+    log(f"{'='*80}\n")
+    
+    log(f"📍 Recherche des organisations ({prefix}*)...")
+    orgs = [
+        org for org in find_organizations_by_postal_prefix(prefix)
+        if claim_seen(seen, 'Organization', org['id'])
+    ]
+    log(f"   ✅ {len(orgs)} organisations trouvées\n")
+    
+    return fetch_practitioners_from_orgs(orgs, verbose, seen)
 
 
 def main():
@@ -349,29 +689,30 @@ def main():
         sys.exit(1)
     
     city = sys.argv[1]
+    filename = f"praticiens_{city.lower()}_complet.ndjson"
     
-    # Récupérer tous les praticiens
-    praticiens = fetch_all_practitioners_from_city(city)
+    # Chaque praticien est écrit dès qu'il est résolu : un arrêt ne perd que celui en cours
+    with NdjsonWriter(filename) as writer:
+        if writer.repris:
+            print(f"\n⏭️  Reprise de {filename}: {writer.repris} praticiens déjà écrits")
+        try:
+            for prat in iter_all_practitioners_from_city(city, skip=writer.fhir_ids):
+                writer.write(prat)
+        except Exception as e:
+            print(f"   ❌ Erreur: {e}")
+            print(f"   💾 {writer.ecrits} praticiens écrits dans {filename}, relancer pour reprendre")
+            sys.exit(1)
     
-    if not praticiens:
+    total = writer.repris + writer.ecrits
+    if not total:
+        os.remove(filename)
         print("❌ Aucun praticien trouvé")
         return
     
-    # Sauvegarder en JSON
-    filename = f"praticiens_{city.lower()}_complet.json"
-    
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump({
-            'ville': city,
-            'date': '2025-11-19',
-            'total': len(praticiens),
-            'praticiens': praticiens
-        }, f, indent=2, ensure_ascii=False)
-    
     print(f"\n{'='*80}")
     print(f"💾 SAUVEGARDE")
     print(f"{'='*80}")
-    print(f"   ✅ {len(praticiens)} praticiens sauvegardés dans {filename}")
+    print(f"   ✅ {total} praticiens dans {filename} ({writer.ecrits} ajoutés par ce run)")
     print(f"{'='*80}\n")
 
 
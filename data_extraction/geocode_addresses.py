@@ -2,106 +2,157 @@
 # -*- coding: utf-8 -*-
 """
 Script pour géocoder toutes les adresses de la base de données
-Usage: python3 geocode_addresses.py
+Usage: python3 geocode_addresses.py [--db praticiens_sante.db] [--workers 8] [--chunk 500]
+       python3 geocode_addresses.py --depuis-debut   # Ignore la reprise d'un passage interrompu
 """
 
+import argparse
 import sqlite3
-import requests
-import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from typing import Optional, Tuple
+import ban_geocoder
+from api_client import GEOCODING_API, APIError, get_json, print_stats
+from snapshot_praticiens import refresh_snapshot
 
-# API de géocodage du gouvernement français
-GEOCODING_API = "https://api-adresse.data.gouv.fr/search/"
+# Requêtes de géocodage en parallèle (sessions keep-alive par thread, débit régulé par api_client)
+GEOCODE_WORKERS = 8
+# Adresses lues, géocodées puis écrites par paquet
+GEOCODE_CHUNK = 500
 
 
 def geocode_address(address_complete: str) -> Tuple[Optional[float], Optional[float]]:
     """
     Géocode une adresse pour obtenir (latitude, longitude)
     """
+    # Base BAN locale en priorité (pas de réseau ni de quota)
+    coords = ban_geocoder.geocode_address(address_complete)
+    if coords['latitude'] is not None:
+        return (coords['latitude'], coords['longitude'])
+    
     try:
-        response = requests.get(
-            GEOCODING_API,
-            params={'q': address_complete, 'limit': 1},
-            timeout=5
-        )
-        response.raise_for_status()
-        data = response.json()
+        data = get_json('geocoder', GEOCODING_API, params={'q': address_complete, 'limit': 1}, timeout=5)
         
         if data.get('features') and len(data['features']) > 0:
             coords = data['features'][0]['geometry']['coordinates']
             return (coords[1], coords[0])  # (latitude, longitude)
-    except Exception as e:
+    except APIError:
+        # Compté comme échec : l'adresse sera retentée au prochain lancement
         pass
     
     return (None, None)
 
 
-def geocode_all_addresses(db_name: str = "praticiens_sante.db"):
+def build_query(ligne: Optional[str], postal: Optional[str], ville: Optional[str], complete: Optional[str]) -> str:
+    """Requête de géocodage d'une adresse de la base"""
+    if ligne and postal and ville:
+        return f"{ligne} {postal} {ville}"
+    return complete
+
+
+def get_marker(conn) -> int:
+    """Dernier adresse_id traité par un passage interrompu (0 = début)"""
+    conn.execute("CREATE TABLE IF NOT EXISTS GeocodageReprise (dernier_id INTEGER NOT NULL, maj_le TEXT NOT NULL)")
+    row = conn.execute("SELECT dernier_id FROM GeocodageReprise").fetchone()
+    return row[0] if row else 0
+
+
+def set_marker(conn, dernier_id: Optional[int]):
+    """Enregistre l'avancement (None = passage terminé, le suivant repartira du début)"""
+    conn.execute("DELETE FROM GeocodageReprise")
+    if dernier_id is not None:
+        conn.execute(
+            "INSERT INTO GeocodageReprise (dernier_id, maj_le) VALUES (?, ?)",
+            (dernier_id, datetime.now().isoformat())
+        )
+
+
+def geocode_all_addresses(db_name: str = "praticiens_sante.db", workers: int = GEOCODE_WORKERS,
+                          chunk_size: int = GEOCODE_CHUNK, restart: bool = False):
     """
     Géocode toutes les adresses de la base qui n'ont pas encore de coordonnées
+    
+    Les adresses sont lues par paquets de chunk_size (dans l'ordre des identifiants) ;
+    dans un paquet, chaque requête distincte n'est géocodée qu'une fois, par `workers`
+    threads, puis les coordonnées sont écrites en une seule transaction avec l'avancement :
+    un passage interrompu reprend après le dernier paquet écrit (restart = repartir du début).
     """
     conn = sqlite3.connect(db_name)
     cursor = conn.cursor()
     
+    start_id = 0 if restart else get_marker(conn)
+    
     # Compter les adresses sans coordonnées
     cursor.execute("""
         SELECT COUNT(*) 
         FROM Adresse 
-        WHERE latitude IS NULL OR longitude IS NULL
-    """)
+        WHERE (latitude IS NULL OR longitude IS NULL) AND adresse_id > ?
+    """, (start_id,))
     total_to_geocode = cursor.fetchone()[0]
     
     if total_to_geocode == 0:
+        set_marker(conn, None)
+        conn.commit()
         print("\n✅ Toutes les adresses sont déjà géocodées !\n")
         conn.close()
+        refresh_snapshot(db_name)
         return
     
     print(f"\n{'='*80}")
     print(f"🗺️  GÉOCODAGE DES ADRESSES")
     print(f"{'='*80}")
-    print(f"   📍 {total_to_geocode} adresses à géocoder\n")
-    
-    # Récupérer toutes les adresses sans coordonnées
-    cursor.execute("""
-        SELECT adresse_id, ligne, code_postal, ville, complete
-        FROM Adresse
-        WHERE latitude IS NULL OR longitude IS NULL
-    """)
-    
-    addresses = cursor.fetchall()
+    if start_id:
+        print(f"   ⏭️  Reprise après l'adresse {start_id} (--depuis-debut pour tout reprendre)")
+    print(f"   📍 {total_to_geocode} adresses à géocoder ({workers} en parallèle, paquets de {chunk_size})\n")
     
     geocoded_count = 0
     failed_count = 0
+    done = 0
+    last_id = start_id
     
-    for i, (addr_id, ligne, postal, ville, complete) in enumerate(addresses, 1):
-        if i % 50 == 0:
-            print(f"   [{i}/{total_to_geocode}] {geocoded_count} géocodées, {failed_count} échecs")
-            conn.commit()  # Commit régulier
-        
-        # Construire la requête de géocodage
-        if ligne and postal and ville:
-            query = f"{ligne} {postal} {ville}"
-        else:
-            query = complete
-        
-        # Géocoder
-        latitude, longitude = geocode_address(query)
-        
-        if latitude and longitude:
-            # Mettre à jour la base
-            cursor.execute("""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # Paquet suivant (pagination sur la clé : rien n'est chargé d'avance)
+            rows = cursor.execute("""
+                SELECT adresse_id, ligne, code_postal, ville, complete
+                FROM Adresse
+                WHERE (latitude IS NULL OR longitude IS NULL) AND adresse_id > ?
+                ORDER BY adresse_id
+                LIMIT ?
+            """, (last_id, chunk_size)).fetchall()
+            if not rows:
+                break
+            
+            # Une seule requête par adresse distincte du paquet
+            by_query = {}
+            for addr_id, ligne, postal, ville, complete in rows:
+                by_query.setdefault(build_query(ligne, postal, ville, complete), []).append(addr_id)
+            queries = list(by_query)
+            results = executor.map(geocode_address, queries)
+            
+            updates = []
+            for query, (latitude, longitude) in zip(queries, results):
+                if latitude and longitude:
+                    updates.extend((latitude, longitude, addr_id) for addr_id in by_query[query])
+                    geocoded_count += len(by_query[query])
+                else:
+                    failed_count += len(by_query[query])
+            
+            last_id = rows[-1][0]
+            cursor.executemany("""
                 UPDATE Adresse
                 SET latitude = ?, longitude = ?
                 WHERE adresse_id = ?
-            """, (latitude, longitude, addr_id))
-            geocoded_count += 1
-        else:
-            failed_count += 1
-        
-        # Délai pour ne pas surcharger l'API
-        time.sleep(0.05)  # 50ms entre chaque requête
+            """, updates)
+            set_marker(conn, last_id)
+            conn.commit()
+            
+            done += len(rows)
+            print(f"   [{done}/{total_to_geocode}] {geocoded_count} géocodées, {failed_count} échecs "
+                  f"({len(queries)} requêtes distinctes dans le paquet)")
     
-    # Dernier commit
+    # Passage complet : le prochain retentera les échecs depuis le début
+    set_marker(conn, None)
     conn.commit()
     
     print(f"\n{'='*80}")
@@ -119,16 +170,25 @@ def geocode_all_addresses(db_name: str = "praticiens_sante.db"):
     
     percentage = (total_geocoded / total_addresses * 100) if total_addresses > 0 else 0
     print(f"📈 Base de données: {total_geocoded}/{total_addresses} adresses géocodées ({percentage:.1f}%)\n")
+    print_stats()
     
     conn.close()
+    refresh_snapshot(db_name)
 
 
 def main():
     """Point d'entrée principal"""
+    parser = argparse.ArgumentParser(description="Géocode les adresses de la base sans coordonnées.")
+    parser.add_argument("--db", default="praticiens_sante.db", help="Base de données")
+    parser.add_argument("--workers", type=int, default=GEOCODE_WORKERS, help="Requêtes de géocodage en parallèle")
+    parser.add_argument("--chunk", type=int, default=GEOCODE_CHUNK, help="Adresses lues et écrites par paquet")
+    parser.add_argument("--depuis-debut", action='store_true', help="Ignorer la reprise d'un passage interrompu")
+    args = parser.parse_args()
+    
     print("\n🗺️  Géocodage de toutes les adresses de la base de données...")
-    print("   (Utilise l'API Adresse du gouvernement français)\n")
+    print("   (Base BAN locale, puis API Adresse du gouvernement français)\n")
     
-    geocode_all_addresses()
+    geocode_all_addresses(args.db, workers=args.workers, chunk_size=args.chunk, restart=args.depuis_debut)
 
 
 if __name__ == "__main__":
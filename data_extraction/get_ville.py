@@ -3,42 +3,36 @@
 """
 Script pour récupérer les praticiens d'une ville avec toutes leurs informations
 Usage: python3 get_ville.py Nancy
+
+Les praticiens sont affichés et écrits dans praticiens_<ville>.ndjson au fur et à mesure
+(un par ligne) ; relancer la commande reprend le fichier sans récupérer à nouveau les
+praticiens déjà écrits.
 """
 
-import requests
-import json
+import os
 import sys
-import time
-from typing import List, Dict, Optional
-
-# Configuration API
-API_URL = "https://gateway.api.esante.gouv.fr/fhir"
-API_KEY = "93f55893-96fa-4364-b558-9396fa2364d7"
-HEADERS = {
-    "ESANTE-API-KEY": API_KEY,
-    "Accept": "application/json"
-}
+from typing import Iterator, List, Dict, Optional
 
-# API de géocodage du gouvernement français
-GEOCODING_API = "https://api-adresse.data.gouv.fr/search/"
+# Clients API (débit adaptatif, nouvelles tentatives)
+from api_client import GEOCODING_API, APIError, get_json, get_fhir
 
 # Import de la fonction pour récupérer les spécialités
 from sm import get_spe
+import ban_geocoder
+from ndjson_praticiens import NdjsonWriter
 
 
 def geocode_address(address_complete: str) -> Dict[str, Optional[float]]:
     """
     Géocode une adresse française pour obtenir latitude et longitude
-    Utilise l'API Adresse du gouvernement français (gratuite)
+    Utilise la base BAN locale si elle existe, sinon l'API Adresse du gouvernement français (gratuite)
     """
+    coords = ban_geocoder.geocode_address(address_complete)
+    if coords['latitude'] is not None:
+        return coords
+    
     try:
-        response = requests.get(
-            GEOCODING_API,
-            params={'q': address_complete, 'limit': 1},
-            timeout=5
-        )
-        response.raise_for_status()
-        data = response.json()
+        data = get_json('geocoder', GEOCODING_API, params={'q': address_complete, 'limit': 1}, timeout=5)
         
         if data.get('features') and len(data['features']) > 0:
             coords = data['features'][0]['geometry']['coordinates']
@@ -46,7 +40,7 @@ def geocode_address(address_complete: str) -> Dict[str, Optional[float]]:
                 'longitude': coords[0],
                 'latitude': coords[1]
             }
-    except Exception as e:
+    except APIError as e:
         print(f"   ⚠️ Erreur géocodage: {e}")
     
     return {
@@ -69,14 +63,7 @@ def get_organizations_by_city(city: str, max_results: int = 500) -> List[Dict]:
     }
     
     try:
-        response = requests.get(
-            f"{API_URL}/v2/Organization",
-            headers=HEADERS,
-            params=params,
-            timeout=30
-        )
-        response.raise_for_status()
-        data = response.json()
+        data = get_fhir('Organization', params=params)
         
         entries = data.get('entry', [])
         
@@ -91,7 +78,7 @@ def get_organizations_by_city(city: str, max_results: int = 500) -> List[Dict]:
         
         print(f"   📦 {len(organizations)} organisations trouvées...")
         
-    except Exception as e:
+    except APIError as e:
         print(f"   ❌ Erreur lors de la récupération: {e}")
     
     print(f"✅ Total: {len(organizations)} organisations à {city}\n")
@@ -167,8 +154,6 @@ def get_full_address(addresses: List[Dict]) -> Dict:
         # Construire une requête propre pour le géocodage
         geocode_query = f"{' '.join(lines)} {postal} {city}"
         coords = geocode_address(geocode_query)
-        # Petit délai pour ne pas surcharger l'API
-        time.sleep(0.1)
     
     return {
         'ligne': ', '.join(lines) if lines else None,
@@ -191,14 +176,7 @@ def get_practitioner_roles_by_organization(org_reference: str) -> List[Dict]:
     }
     
     try:
-        response = requests.get(
-            f"{API_URL}/v2/PractitionerRole",
-            headers=HEADERS,
-            params=params,
-            timeout=30
-        )
-        response.raise_for_status()
-        data = response.json()
+        data = get_fhir('PractitionerRole', params=params)
         
         roles = []
         for entry in data.get('entry', []):
@@ -212,7 +190,8 @@ def get_practitioner_roles_by_organization(org_reference: str) -> List[Dict]:
         
         return roles
         
-    except Exception as e:
+    except APIError as e:
+        print(f"   ⚠️ {e}", end=" ")
         return []
 
 
@@ -239,13 +218,7 @@ def get_practitioner_details(practitioner_ref: str) -> Optional[Dict]:
     practitioner_id = practitioner_ref.split('/')[-1]
     
     try:
-        response = requests.get(
-            f"{API_URL}/v2/Practitioner/{practitioner_id}",
-            headers=HEADERS,
-            timeout=30
-        )
-        response.raise_for_status()
-        practitioner = response.json()
+        practitioner = get_fhir('Practitioner', f"/{practitioner_id}")
         
         # Extraire les informations
         names = practitioner.get('name', [])
@@ -285,7 +258,8 @@ def get_practitioner_details(practitioner_ref: str) -> Optional[Dict]:
             'specialites_sm': specialites_sm  # Liste des codes SM bruts
         }
         
-    except Exception as e:
+    except APIError as e:
+        print(f"   ⚠️ {e}")
         return None
 
 
@@ -293,6 +267,14 @@ def get_practitioners_in_city(city: str, max_orgs: int = 100) -> List[Dict]:
     """
     Fonction principale : récupère tous les praticiens d'une ville
     """
+    return list(iter_practitioners_in_city(city, max_orgs))
+
+
+def iter_practitioners_in_city(city: str, max_orgs: int = 100, skip: Optional[set] = None) -> Iterator[Dict]:
+    """
+    Comme get_practitioners_in_city, en générant chaque praticien dès que son profil est construit
+    (skip : références 'Practitioner/...' ou ids des praticiens déjà écrits, non récupérés)
+    """
     print(f"\n{'='*80}")
     print(f"🏥 RECHERCHE DES PRATICIENS À {city.upper()}")
     print(f"{'='*80}\n")
@@ -302,7 +284,7 @@ def get_practitioners_in_city(city: str, max_orgs: int = 100) -> List[Dict]:
     
     if not organizations:
         print(f"❌ Aucune organisation trouvée à {city}")
-        return []
+        return
     
     # Créer un dictionnaire des organisations pour un accès rapide
     orgs_dict = {org['reference']: org for org in organizations}
@@ -335,12 +317,15 @@ def get_practitioners_in_city(city: str, max_orgs: int = 100) -> List[Dict]:
                 practitioners_orgs[pract_ref] = []
             practitioners_orgs[pract_ref].append(org)
     
-    # Étape 3 : Construire la liste finale des praticiens
-    all_practitioners = []
+    # Étape 3 : Construire les profils des praticiens
+    count = 0
     
     print(f"\n🔄 Construction des profils praticiens...\n")
     
     for pract_ref, orgs in practitioners_orgs.items():
+        if skip and pract_ref.split('/')[-1] in skip:
+            continue
+        
         # Récupérer les détails du praticien
         practitioner = get_practitioner_details(pract_ref)
         
@@ -388,7 +373,9 @@ def get_practitioners_in_city(city: str, max_orgs: int = 100) -> List[Dict]:
                     'libelle': spe_label
                 })
         
-        all_practitioners.append({
+        count += 1
+        yield {
+            'fhir_id': pract_ref.split('/')[-1],
             'nom': practitioner['family'],
             'prenom': practitioner['given'],
             'civilite': practitioner['prefix'],
@@ -397,10 +384,9 @@ def get_practitioners_in_city(city: str, max_orgs: int = 100) -> List[Dict]:
             'specialites': specialites if specialites else None,
             'organisation': valid_org_name,
             'adresse': valid_address
-        })
+        }
     
-    print(f"\n✅ Total: {len(all_practitioners)} praticiens avec adresse valide\n")
-    return all_practitioners
+    print(f"\n✅ Total: {count} praticiens avec adresse valide\n")
 
 
 def display_results(practitioners: List[Dict], city: str):
@@ -412,43 +398,33 @@ def display_results(practitioners: List[Dict], city: str):
     print(f"{'='*80}\n")
     
     for i, p in enumerate(practitioners, 1):
-        print(f"\n{'─'*80}")
-        print(f"👤 PRATICIEN #{i}")
-        print(f"{'─'*80}")
-        print(f"Nom:          {p['civilite']} {p['prenom']} {p['nom']}")
-        print(f"RPPS:         {p['rpps']}")
-        print(f"Profession:   {p['profession']}")
-        
-        if p.get('specialites'):
-            print(f"\n🏥 Spécialités:")
-            for spec in p['specialites']:
-                print(f"   • {spec['code']} : {spec['libelle']}")
-        
-        print(f"\nOrganisation: {p['organisation']}")
-        addr = p['adresse']
-        if addr['ligne']:
-            print(f"Adresse:      {addr['ligne']}")
-        if addr['code_postal'] and addr['ville']:
-            print(f"              {addr['code_postal']} {addr['ville']}")
-        if addr['pays']:
-            print(f"              {addr['pays']}")
+        display_practitioner(i, p)
 
 
-def save_to_json(practitioners: List[Dict], city: str):
+def display_practitioner(i: int, p: Dict):
     """
-    Sauvegarde les résultats dans un fichier JSON
+    Affiche un praticien
     """
-    filename = f"praticiens_{city.lower()}.json"
+    print(f"\n{'─'*80}")
+    print(f"👤 PRATICIEN #{i}")
+    print(f"{'─'*80}")
+    print(f"Nom:          {p['civilite']} {p['prenom']} {p['nom']}")
+    print(f"RPPS:         {p['rpps']}")
+    print(f"Profession:   {p['profession']}")
     
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump({
-            'ville': city,
-            'date': '2025-11-18',
-            'total': len(practitioners),
-            'praticiens': practitioners
-        }, f, indent=2, ensure_ascii=False)
+    if p.get('specialites'):
+        print(f"\n🏥 Spécialités:")
+        for spec in p['specialites']:
+            print(f"   • {spec['code']} : {spec['libelle']}")
     
-    print(f"\n💾 Résultats sauvegardés dans: {filename}")
+    print(f"\nOrganisation: {p['organisation']}")
+    addr = p['adresse']
+    if addr['ligne']:
+        print(f"Adresse:      {addr['ligne']}")
+    if addr['code_postal'] and addr['ville']:
+        print(f"              {addr['code_postal']} {addr['ville']}")
+    if addr['pays']:
+        print(f"              {addr['pays']}")
 
 
 def main():
@@ -457,17 +433,22 @@ def main():
     """
     # Récupérer la ville depuis les arguments ou utiliser Nancy par défaut
     city = sys.argv[1] if len(sys.argv) > 1 else "Nancy"
+    filename = f"praticiens_{city.lower()}.ndjson"
     
-    # Récupérer les praticiens
-    practitioners = get_practitioners_in_city(city, max_orgs=100)
+    # Afficher et sauvegarder chaque praticien dès qu'il est récupéré ; un fichier existant
+    # est repris sans récupérer à nouveau les praticiens déjà écrits
+    with NdjsonWriter(filename) as writer:
+        if writer.repris:
+            print(f"\n⏭️  Reprise de {filename}: {writer.repris} praticiens déjà écrits")
+        for p in iter_practitioners_in_city(city, max_orgs=100, skip=writer.fhir_ids):
+            if writer.write(p):
+                display_practitioner(writer.repris + writer.ecrits, p)
     
-    if practitioners:
-        # Afficher les résultats
-        display_results(practitioners, city)
-        
-        # Sauvegarder dans un fichier JSON
-        save_to_json(practitioners, city)
+    total = writer.repris + writer.ecrits
+    if total:
+        print(f"\n💾 {writer.ecrits} praticiens ajoutés dans: {filename} ({total} au total)")
     else:
+        os.remove(filename)
         print(f"\n❌ Aucun praticien trouvé à {city}")
 
 
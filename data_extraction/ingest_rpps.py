@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chargement direct de l'extraction nationale RPPS (annuaire santé en open data), sans crawl FHIR
+Usage:
+  python3 ingest_rpps.py ingest <PS_LibreAcces_Personne_activite.txt[.zip]> [--db praticiens_sante.db]
+                                [--departements 54,57] [--professions 10,21] [--batch 50000]
+  python3 ingest_rpps.py generer <fichier.txt> <nb_praticiens> [--separateur ';']
+
+Le fichier (séparateur '|' ou ';', des millions de lignes) est lu en flux : la mémoire utilisée
+ne dépend pas de sa taille. Une ligne par activité : les lignes d'un même praticien sont
+regroupées et la première activité avec une adresse est retenue. Les praticiens, spécialités
+et métiers sont écrits par lots dans de grandes transactions.
+
+Les coordonnées GPS ne sont pas dans l'extraction : lancer ensuite geocode_addresses.py
+(qui utilise la base BAN locale si elle existe).
+
+Extraction disponible sur https://annuaire.sante.fr (rubrique Extractions en libre accès)
+"""
+
+import argparse
+import csv
+import io
+import random
+import re
+import sqlite3
+import sys
+import time
+import unicodedata
+import zipfile
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional
+
+from create_database import SANS_SPECIALITE, ids_par_code
+from load_json_to_db import PROFESSIONS, check_database, create_indexes, drop_indexes, tune_for_bulk, write_batch
+from snapshot_praticiens import refresh_snapshot
+
+# Colonnes utilisées, sous leur nom normalisé (voir _normaliser_entete)
+COLONNES = {
+    'rpps': 'identifiant_pp',
+    'nom': 'nom_d_exercice',
+    'prenom': 'prenom_d_exercice',
+    'civilite_exercice': 'code_civilite_d_exercice',
+    'civilite': 'code_civilite',
+    'profession': 'code_profession',
+    'profession_libelle': 'libelle_profession',
+    'type_savoir_faire': 'code_type_savoir_faire',
+    'savoir_faire': 'code_savoir_faire',
+    'savoir_faire_libelle': 'libelle_savoir_faire',
+    'numero': 'numero_voie_coord_structure',
+    'indice': 'indice_repetition_voie_coord_structure',
+    'type_voie': 'libelle_type_de_voie_coord_structure',
+    'voie': 'libelle_voie_coord_structure',
+    'code_postal': 'code_postal_coord_structure',
+    'commune': 'libelle_commune_coord_structure',
+    'cedex': 'bureau_cedex_coord_structure',
+}
+OBLIGATOIRES = ('rpps', 'nom', 'profession', 'code_postal')
+
+# Type de savoir-faire « Spécialité ordinale » (codes SMxx, comme dans l'API FHIR)
+TYPE_SPECIALITE = 'S'
+
+
+def _normaliser_entete(nom: str) -> str:
+    """'Libellé Voie (coord. structure)' -> 'libelle_voie_coord_structure'"""
+    nom = unicodedata.normalize('NFKD', nom).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '_', nom.lower()).strip('_')
+
+
+def _ouvrir(fichier: str):
+    """Ouvre l'extraction en texte (le zip distribué est lu sans être décompressé sur disque)"""
+    if fichier.endswith('.zip'):
+        archive = zipfile.ZipFile(fichier)
+        membre = next(n for n in archive.namelist() if n.lower().endswith(('.txt', '.csv')))
+        return io.TextIOWrapper(archive.open(membre), encoding='utf-8-sig', newline='')
+    return open(fichier, 'r', encoding='utf-8-sig', newline='')
+
+
+def lire_lignes(f) -> Iterator[Dict[str, str]]:
+    """Lignes du fichier sous forme {champ: valeur} (champs de COLONNES), séparateur détecté"""
+    entete = f.readline()
+    separateur = '|' if entete.count('|') > entete.count(';') else ';'
+    colonnes = [_normaliser_entete(c) for c in entete.rstrip('\r\n').split(separateur)]
+
+    positions = {}
+    for champ, colonne in COLONNES.items():
+        if colonne in colonnes:
+            positions[champ] = colonnes.index(colonne)
+
+    manquantes = [champ for champ in OBLIGATOIRES if champ not in positions]
+    if manquantes:
+        raise ValueError(f"Colonnes absentes de l'en-tête: {', '.join(COLONNES[c] for c in manquantes)}")
+
+    # Les extractions '|' ne sont pas quotées (apostrophes et guillemets isolés dans les libellés)
+    quoting = csv.QUOTE_NONE if separateur == '|' else csv.QUOTE_MINIMAL
+    for row in csv.reader(f, delimiter=separateur, quoting=quoting):
+        yield {champ: (row[i].strip() if i < len(row) else '') for champ, i in positions.items()}
+
+
+def _adresse(ligne: Dict[str, str]) -> Optional[Dict]:
+    """Adresse au format de la table Adresse (None si incomplète)"""
+    voie = ' '.join(p for p in (ligne.get('type_voie'), ligne.get('voie')) if p)
+    numero = f"{ligne.get('numero', '')}{ligne.get('indice', '').lower()}"
+    ville = ligne.get('commune') or re.sub(r'\s+CEDEX.*$', '', ligne.get('cedex', ''), flags=re.I)
+
+    if not voie or not ligne['code_postal'] or not ville:
+        return None
+
+    rue = f"{numero} {voie}".strip()
+    return {
+        'ligne': rue,
+        'code_postal': ligne['code_postal'],
+        'ville': ville,
+        'complete': f"{rue}, {ligne['code_postal']} {ville}",
+    }
+
+
+def praticiens(lignes: Iterator[Dict[str, str]], departements: Optional[List[str]] = None,
+               professions: Optional[List[str]] = None) -> Iterator[Dict]:
+    """
+    Un praticien par identifiant (lignes consécutives regroupées) avec sa première activité
+    localisée, filtrée par départements (préfixes de code postal) et professions
+    """
+    prefixes = tuple(departements) if departements else None
+
+    for rpps, activites in groupby(lignes, key=lambda l: l['rpps']):
+        if not rpps:
+            continue
+
+        for ligne in activites:
+            if professions and ligne['profession'] not in professions:
+                continue
+            if prefixes and not ligne['code_postal'].startswith(prefixes):
+                continue
+            adresse = _adresse(ligne)
+            if adresse is None:
+                continue
+
+            specialite = None
+            if ligne.get('type_savoir_faire') == TYPE_SPECIALITE and ligne.get('savoir_faire', '').startswith('SM'):
+                specialite = (ligne['savoir_faire'][2:], ligne.get('savoir_faire_libelle') or ligne['savoir_faire'])
+
+            yield {
+                'rpps': rpps,
+                'nom': ligne['nom'],
+                'prenom': ligne.get('prenom', ''),
+                'civilite': ligne.get('civilite_exercice') or ligne.get('civilite') or None,
+                'metier_code': ligne['profession'],
+                'spe_code': specialite[0] if specialite else SANS_SPECIALITE[0],
+                'profession_libelle': ligne.get('profession_libelle') or PROFESSIONS.get(ligne['profession'], 'Autre'),
+                'specialite': specialite,
+                'adresse': adresse,
+            }
+            break
+
+
+def _ecrire_lot(conn, lot: List[Dict]) -> int:
+    """Écrit un lot dans une transaction ; retourne le nombre de praticiens nouveaux"""
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        ids_par_code(cursor, 'Metier', {p['metier_code']: p['profession_libelle'] for p in lot})
+        ids_par_code(cursor, 'Specialite', dict(p['specialite'] for p in lot if p['specialite']))
+        nouveaux = len(write_batch(cursor, lot, update_existing=True))
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    return nouveaux
+
+
+def ingest_rpps(fichier: str, db_name: str = "praticiens_sante.db", batch_size: int = 50000,
+                departements: Optional[List[str]] = None, professions: Optional[List[str]] = None) -> Dict:
+    """
+    Charge l'extraction RPPS dans la base
+
+    Returns:
+        dict: {'praticiens', 'nouveaux', 'mis_a_jour', 'duree'}
+    """
+    print(f"\n{'='*80}")
+    print(f"📂 CHARGEMENT DE L'EXTRACTION RPPS")
+    print(f"{'='*80}\n")
+
+    conn = sqlite3.connect(db_name, timeout=60, isolation_level=None)
+    if not check_database(conn):
+        conn.close()
+        return {}
+
+    tune_for_bulk(conn)
+
+    print(f"📖 Lecture de {fichier}...")
+    if departements:
+        print(f"   Départements: {', '.join(departements)}")
+    if professions:
+        print(f"   Professions: {', '.join(professions)}")
+
+    start_time = time.time()
+    total = 0
+    nouveaux = 0
+    lot = []
+
+    # Index secondaires reconstruits une seule fois à la fin
+    drop_indexes(conn)
+    try:
+        with _ouvrir(fichier) as f:
+            for praticien in praticiens(lire_lignes(f), departements, professions):
+                lot.append(praticien)
+                if len(lot) >= batch_size:
+                    nouveaux += _ecrire_lot(conn, lot)
+                    total += len(lot)
+                    lot = []
+                    elapsed = time.time() - start_time
+                    print(f"   [{total}] praticiens chargés ({nouveaux} nouveaux) - {total / elapsed:.0f}/s")
+
+        if lot:
+            nouveaux += _ecrire_lot(conn, lot)
+            total += len(lot)
+    finally:
+        print("🔧 Reconstruction des index...")
+        create_indexes(conn)
+
+    conn.execute("PRAGMA optimize")
+    conn.close()
+    refresh_snapshot(db_name)
+    elapsed = time.time() - start_time
+
+    print(f"\n{'='*80}")
+    print(f"📊 RÉSULTATS")
+    print(f"{'='*80}")
+    print(f"   ✅ {total} praticiens lus ({nouveaux} nouveaux, {total - nouveaux} mis à jour)")
+    print(f"   ⏱️  {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} praticiens/s)")
+    print(f"{'='*80}\n")
+    print("💡 Coordonnées GPS : lancer geocode_addresses.py\n")
+
+    return {'praticiens': total, 'nouveaux': nouveaux, 'mis_a_jour': total - nouveaux, 'duree': elapsed}
+
+
+# En-tête de l'extraction « Personne activité » (ordre du fichier officiel)
+ENTETE_RPPS = [
+    "Type d'identifiant PP", "Identifiant PP", "Identification nationale PP", "Code civilité d'exercice",
+    "Libellé civilité d'exercice", "Code civilité", "Libellé civilité", "Nom d'exercice", "Prénom d'exercice",
+    "Code profession", "Libellé profession", "Code catégorie professionnelle", "Libellé catégorie professionnelle",
+    "Code type savoir-faire", "Libellé type savoir-faire", "Code savoir-faire", "Libellé savoir-faire",
+    "Code mode exercice", "Libellé mode exercice", "Numéro SIRET site", "Numéro SIREN site", "Numéro FINESS site",
+    "Numéro FINESS établissement juridique", "Identifiant technique de la structure", "Raison sociale site",
+    "Enseigne commerciale site", "Complément destinataire (coord. structure)",
+    "Complément point géographique (coord. structure)", "Numéro Voie (coord. structure)",
+    "Indice répétition voie (coord. structure)", "Code type de voie (coord. structure)",
+    "Libellé type de voie (coord. structure)", "Libellé Voie (coord. structure)",
+    "Mention distribution (coord. structure)", "Bureau cedex (coord. structure)",
+    "Code postal (coord. structure)", "Code commune (coord. structure)", "Libellé commune (coord. structure)",
+    "Code pays (coord. structure)", "Libellé pays (coord. structure)", "Téléphone (coord. structure)",
+    "Téléphone 2 (coord. structure)", "Télécopie (coord. structure)", "Adresse e-mail (coord. structure)",
+    "Code Département (structure)", "Libellé Département (structure)", "Ancien identifiant de la structure",
+    "Autorité d'enregistrement", "Code secteur d'activité", "Libellé secteur d'activité",
+    "Code section tableau pharmaciens", "Libellé section tableau pharmaciens", "Code rôle", "Libellé rôle",
+    "Code genre activité", "Libellé genre activité",
+]
+
+
+def generer_echantillon(fichier: str, nb_praticiens: int, separateur: str = '|', seed: int = 42):
+    """
+    Génère un faux fichier d'extraction (même en-tête que l'officiel) : 1 à 3 activités par
+    praticien, dont certaines sans adresse, des libellés avec apostrophes et quelques cedex
+    """
+    rng = random.Random(seed)
+    noms = ["MARTIN", "BERNARD", "D'ALMEIDA", "LE GOFF", "N'DIAYE", "MÜLLER", "DUBOIS", "LEFÈVRE"]
+    prenoms = ["Marie", "Jean-Pierre", "Zoé", "Hélène", "François", "Inès", "Loïc", "Anaïs"]
+    voies = [("RUE", "DE L'ÉGLISE"), ("AV", "DU GÉNÉRAL LECLERC"), ("PL", "STANISLAS"), ("BD", "JEAN JAURÈS")]
+    communes = [("54000", "Nancy"), ("57000", "Metz"), ("67000", "Strasbourg"), ("75011", "Paris"),
+                ("69003", "Lyon"), ("13001", "Marseille"), ("20000", "Ajaccio")]
+    index = {nom: i for i, nom in enumerate(ENTETE_RPPS)}
+
+    with open(fichier, 'w', encoding='utf-8', newline='') as f:
+        f.write(separateur.join(ENTETE_RPPS) + separateur + '\n')
+
+        for n in range(nb_praticiens):
+            rpps = f"10{n:09d}"
+            profession = rng.choice(list(PROFESSIONS))
+            nom, prenom = rng.choice(noms), rng.choice(prenoms)
+
+            for activite in range(rng.randint(1, 3)):
+                row = [''] * len(ENTETE_RPPS)
+                row[index["Type d'identifiant PP"]] = '8'
+                row[index["Identifiant PP"]] = rpps
+                row[index["Identification nationale PP"]] = f"8{rpps}"
+                row[index["Code civilité d'exercice"]] = 'DR' if profession == '10' else ''
+                row[index["Code civilité"]] = rng.choice(['M', 'MME'])
+                row[index["Nom d'exercice"]] = nom
+                row[index["Prénom d'exercice"]] = prenom
+                row[index["Code profession"]] = profession
+                row[index["Libellé profession"]] = PROFESSIONS[profession]
+                if profession == '10' and rng.random() < 0.7:
+                    code = rng.choice(['01', '02', '03', '06', '08', '13', '54'])
+                    row[index["Code type savoir-faire"]] = TYPE_SPECIALITE
+                    row[index["Code savoir-faire"]] = f"SM{code}"
+                    row[index["Libellé savoir-faire"]] = f"Spécialité {code}"
+
+                # Une activité sur cinq sans adresse (remplaçants, activités sans site)
+                if rng.random() < 0.8:
+                    code_postal, commune = rng.choice(communes)
+                    type_voie, voie = rng.choice(voies)
+                    row[index["Numéro Voie (coord. structure)"]] = str(rng.randint(1, 120))
+                    row[index["Indice répétition voie (coord. structure)"]] = rng.choice(['', '', '', 'B'])
+                    row[index["Libellé type de voie (coord. structure)"]] = {
+                        'RUE': 'Rue', 'AV': 'Avenue', 'PL': 'Place', 'BD': 'Boulevard'}[type_voie]
+                    row[index["Code type de voie (coord. structure)"]] = type_voie
+                    row[index["Libellé Voie (coord. structure)"]] = voie
+                    row[index["Code postal (coord. structure)"]] = code_postal
+                    if rng.random() < 0.05:
+                        row[index["Bureau cedex (coord. structure)"]] = f"{commune.upper()} CEDEX"
+                    else:
+                        row[index["Libellé commune (coord. structure)"]] = commune
+
+                if separateur == ';':
+                    row = [f'"{v}"' if ';' in v or '"' in v else v for v in row]
+                f.write(separateur.join(row) + separateur + '\n')
+
+    print(f"✅ {nb_praticiens} praticiens générés dans {fichier}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chargement de l'extraction RPPS en libre accès.")
+    sub = parser.add_subparsers(dest='commande', required=True)
+
+    ingest = sub.add_parser('ingest', help="Charger une extraction dans la base")
+    ingest.add_argument("fichier", help="Extraction RPPS (.txt, .csv ou .zip)")
+    ingest.add_argument("--db", default="praticiens_sante.db", help="Base de données cible")
+    ingest.add_argument("--departements", default=None, help="Préfixes de code postal à garder (ex: 54,57)")
+    ingest.add_argument("--professions", default=None, help="Codes profession à garder (ex: 10,21)")
+    ingest.add_argument("--batch", type=int, default=50000, help="Praticiens par transaction")
+
+    generer = sub.add_parser('generer', help="Générer un fichier d'exemple")
+    generer.add_argument("fichier")
+    generer.add_argument("nb_praticiens", type=int)
+    generer.add_argument("--separateur", default='|', choices=['|', ';'])
+
+    args = parser.parse_args()
+
+    if args.commande == 'generer':
+        generer_echantillon(args.fichier, args.nb_praticiens, args.separateur)
+        return
+
+    try:
+        ingest_rpps(
+            args.fichier,
+            db_name=args.db,
+            batch_size=args.batch,
+            departements=args.departements.split(',') if args.departements else None,
+            professions=args.professions.split(',') if args.professions else None
+        )
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"❌ Erreur: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
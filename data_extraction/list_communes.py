@@ -1,30 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-Script pour lister toutes les communes d'une région
+Script pour lister toutes les communes d'une région (registre local des communes,
+chargé depuis geo.api.gouv.fr la première fois : voir registre_communes.py)
 Usage: python3 list_communes.py "Grand Est"
 """
 
-import requests
+from registre_communes import REGIONS, connect_registre, get_communes
 import sys
 
-# Codes région INSEE
-REGIONS = {
-    'Auvergne-Rhône-Alpes': '84',
-    'Bourgogne-Franche-Comté': '27',
-    'Bretagne': '53',
-    'Centre-Val de Loire': '24',
-    'Corse': '94',
-    'Grand Est': '44',
-    'Hauts-de-France': '32',
-    'Île-de-France': '11',
-    'Normandie': '28',
-    'Nouvelle-Aquitaine': '75',
-    'Occitanie': '76',
-    'Pays de la Loire': '52',
-    'Provence-Alpes-Côte d\'Azur': '93'
-}
-
 
 def list_communes_in_region(region_name: str):
     """
@@ -42,47 +26,17 @@ def list_communes_in_region(region_name: str):
     print(f"\n{'='*80}")
     print(f"🗺️  COMMUNES DE LA RÉGION: {region_name.upper()}")
     print(f"{'='*80}\n")
-    print(f"🔍 Récupération des données via geo.api.gouv.fr...\n")
+    print(f"🔍 Lecture du registre des communes...\n")
     
     try:
-        # Étape 1 : Récupérer les départements de la région
-        print(f"   1️⃣ Récupération des départements...")
-        response_depts = requests.get(
-            f"https://geo.api.gouv.fr/departements",
-            params={'codeRegion': region_code},
-            timeout=30
-        )
-        response_depts.raise_for_status()
-        departements = response_depts.json()
-        
-        print(f"      ✅ {len(departements)} départements trouvés\n")
+        conn = connect_registre()
+        try:
+            communes = get_communes(conn, region_name, order='population')
+        finally:
+            conn.close()
         
-        # Étape 2 : Récupérer les communes de chaque département
-        print(f"   2️⃣ Récupération des communes par département...")
-        communes = []
-        
-        for i, dept in enumerate(departements, 1):
-            dept_code = dept['code']
-            dept_nom = dept['nom']
-            print(f"      [{i}/{len(departements)}] {dept_nom} ({dept_code})...", end=' ')
-            
-            try:
-                response = requests.get(
-                    f"https://geo.api.gouv.fr/departements/{dept_code}/communes",
-                    params={'fields': 'nom,code,codesPostaux,codeDepartement,population'},
-                    timeout=30
-                )
-                response.raise_for_status()
-                communes_dept = response.json()
-                communes.extend(communes_dept)
-                print(f"{len(communes_dept)} communes")
-            except Exception as e:
-                print(f"❌ Erreur: {e}")
-        
-        print(f"\n      ✅ Total: {len(communes)} communes récupérées\n")
-        
-        # Trier par population (les plus grandes en premier)
-        communes_sorted = sorted(communes, key=lambda x: x.get('population', 0), reverse=True)
+        # Déjà triées par population (les plus grandes en premier)
+        communes_sorted = communes
         
         # Grouper par département
         by_dept = {}
@@ -163,15 +117,12 @@ def export_communes_to_file(region_name: str):
         return
     
     try:
-        response = requests.get(
-            f"https://geo.api.gouv.fr/regions/{region_code}/communes",
-            params={'fields': 'nom,code,population'},
-            timeout=60
-        )
-        response.raise_for_status()
-        communes = response.json()
-        
-        communes_sorted = sorted(communes, key=lambda x: x.get('population', 0), reverse=True)
+        conn = connect_registre()
+        try:
+            communes_sorted = get_communes(conn, region_name, order='population')
+        finally:
+            conn.close()
+        communes = communes_sorted
         
         filename = f"communes_{region_name.lower().replace(' ', '_').replace('-', '_')}.txt"
         
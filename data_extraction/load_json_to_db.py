@@ -1,69 +1,41 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-Script pour alimenter la base de données depuis un JSON de ville
-Usage: python3 load_json_to_db.py <fichier_json>
-Exemple: python3 load_json_to_db.py praticiens_nancy_complet.json
+Script pour alimenter la base de données depuis un fichier de ville (NDJSON de fetch_city.py,
+lu ligne à ligne, ou ancien JSON)
+Usage: python3 load_json_to_db.py <fichier> [--bulk]
+Exemple: python3 load_json_to_db.py praticiens_nancy_complet.ndjson
+
+--bulk : chargement en masse (gros fichiers) en une seule transaction, par lots avec
+executemany, pragmas adaptés et index secondaires reconstruits à la fin.
 """
 
 import sqlite3
-import json
 import sys
 import os
-from sm import get_spe
-
-# Mapping des codes profession
-PROFESSIONS = {
-    '10': 'Médecin',
-    '21': 'Pharmacien',
-    '40': 'Chirurgien-Dentiste',
-    '50': 'Sage-Femme',
-    '60': 'Infirmier',
-    '70': 'Masseur-Kinésithérapeute',
-    '80': 'Pédicure-Podologue',
-    '91': 'Orthophoniste',
-    '86': 'Psychomotricien',
-    '96': 'Orthoptiste',
-    '94': 'Ergothérapeute'
-}
-
-
-def load_json_to_database(json_file: str, db_name: str = "praticiens_sante.db"):
-    """Charge les praticiens depuis un JSON dans la base de données"""
-    
-    print(f"\n{'='*80}")
-    print(f"📂 CHARGEMENT DEPUIS JSON VERS BASE DE DONNÉES")
-    print(f"{'='*80}\n")
-    
-    # Charger le JSON
-    print(f"📖 Lecture de {json_file}...")
-    try:
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except Exception as e:
-        print(f"❌ Erreur lors de la lecture du fichier: {e}")
-        return
-    
-    ville = data.get('ville', 'Inconnu')
-    praticiens = data.get('praticiens', [])
-    
-    print(f"   ✅ {len(praticiens)} praticiens à insérer pour {ville}\n")
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from create_database import (INDEXES, PROFESSIONS, SANS_SPECIALITE, cle_adresse, create_search_index, create_spatial_index, create_stats_tables,
+                             drop_search_triggers, drop_spatial_triggers, drop_stats_triggers, get_or_create_adresse, ids_par_code,
+                             migrate_database)
+from sm import get_spe, preload_specialites
+from snapshot_praticiens import refresh_snapshot
+from ndjson_praticiens import read_praticiens
+
+# Praticiens par executemany en mode bulk
+BULK_BATCH_SIZE = 5000
+
+
+def insert_praticiens(conn, praticiens, progress: bool = True) -> dict:
+    """
+    Insère des praticiens (format de fetch_city.py, liste ou itérable) dans la base
     
-    # Connexion à la base
-    conn = sqlite3.connect(db_name)
+    Returns:
+        dict: {'inseres', 'doublons', 'erreurs', 'par_profession'}
+    """
     cursor = conn.cursor()
     
-    # Vérifier que les tables existent
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = [row[0] for row in cursor.fetchall()]
-    
-    if 'Praticien' not in tables:
-        print("❌ La base de données n'existe pas. Lancez d'abord create_database.py")
-        conn.close()
-        return
-    
-    print(f"🔄 Insertion dans la base de données...\n")
-    
     inserted_count = 0
     duplicate_count = 0
     error_count = 0
@@ -73,7 +45,8 @@ def load_json_to_database(json_file: str, db_name: str = "praticiens_sante.db"):
     
     for i, prat in enumerate(praticiens, 1):
         if i % 50 == 0:
-            print(f"   [{i}/{len(praticiens)}] {inserted_count} insérés, {duplicate_count} doublons")
+            if progress:
+                print(f"   [{i}] {inserted_count} insérés, {duplicate_count} doublons")
             conn.commit()
         
         try:
@@ -87,33 +60,17 @@ def load_json_to_database(json_file: str, db_name: str = "praticiens_sante.db"):
             profession_name = PROFESSIONS.get(profession_code, 'Autre')
             stats_by_profession[profession_name] = stats_by_profession.get(profession_name, 0) + 1
             
-            # Insérer l'adresse
-            addr = prat['adresse']
-            cursor.execute("""
-                INSERT INTO Adresse (ligne, code_postal, ville, complete, latitude, longitude)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                addr.get('ligne'),
-                addr.get('code_postal'),
-                addr.get('ville'),
-                addr.get('complete'),
-                addr.get('latitude'),
-                addr.get('longitude')
-            ))
-            adresse_id = cursor.lastrowid
+            # Adresse partagée avec les autres praticiens du même lieu
+            adresse_id = get_or_create_adresse(cursor, prat['adresse'])
             
-            # Déterminer la spécialité
-            spe_id = '0'  # Par défaut : aucune spécialité
+            # Déterminer la spécialité (ajoutée si elle n'existe pas) et sa clé
+            spe_code, spe_libelle = SANS_SPECIALITE  # Par défaut : aucune spécialité
             if prat.get('specialites') and len(prat['specialites']) > 0:
                 spe_code = prat['specialites'][0]['code']
-                spe_id = spe_code[2:] if spe_code.startswith('SM') else spe_code
+                spe_code = spe_code[2:] if spe_code.startswith('SM') else spe_code
                 spe_libelle = prat['specialites'][0]['libelle']
-                
-                # Ajouter la spécialité si elle n'existe pas
-                cursor.execute(
-                    "INSERT OR IGNORE INTO Specialite (spe_id, libelle) VALUES (?, ?)",
-                    (spe_id, spe_libelle)
-                )
+            spe_id = ids_par_code(cursor, 'Specialite', {spe_code: spe_libelle})[spe_code]
+            metier_id = ids_par_code(cursor, 'Metier', {profession_code: profession_name})[profession_code]
             
             # Insérer le praticien
             cursor.execute("""
@@ -124,7 +81,7 @@ def load_json_to_database(json_file: str, db_name: str = "praticiens_sante.db"):
                 prat['nom'],
                 prat['prenom'],
                 prat['civilite'],
-                profession_code,
+                metier_id,
                 spe_id,
                 adresse_id
             ))
@@ -136,36 +93,361 @@ def load_json_to_database(json_file: str, db_name: str = "praticiens_sante.db"):
             error_count += 1
     
     conn.commit()
+    
+    return {
+        'inseres': inserted_count,
+        'doublons': duplicate_count,
+        'erreurs': error_count,
+        'par_profession': stats_by_profession
+    }
+
+
+def tune_for_bulk(conn):
+    """Pragmas pour les chargements en masse (WAL, fsync allégé, gros cache de pages)"""
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA cache_size = -200000")     # ~200 Mo
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+
+def drop_indexes(conn):
+    """
+    Supprime les index secondaires et suspend les index de recherche et spatial et les
+    statistiques (maintenus une seule fois à la fin du chargement)
+    """
+    for name in INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    drop_search_triggers(conn)
+    drop_spatial_triggers(conn)
+    drop_stats_triggers(conn)
+
+
+def create_indexes(conn):
+    """Recrée les index secondaires et reconstruit les index de recherche et spatial et les statistiques"""
+    for sql in INDEXES.values():
+        conn.execute(sql)
+    create_search_index(conn, rebuild=True)
+    create_spatial_index(conn, rebuild=True)
+    create_stats_tables(conn, rebuild=True)
+
+
+def write_batch(cursor, lot: List[Dict], update_existing: bool = False) -> set:
+    """
+    Écrit un lot de praticiens {'rpps', 'nom', 'prenom', 'civilite', 'metier_code', 'spe_code', 'adresse'}
+    avec executemany, dans la transaction en cours (un seul écrivain).
+    Les adresses sont partagées par clé normalisée (voir create_database.cle_adresse) ;
+    métiers et spécialités sont créés au besoin (libellé par défaut, voir create_database.ids_par_code).
+    Un praticien déjà en base est mis à jour si update_existing (adresse comprise, et il
+    redevient actif), sinon il est ignoré. Retourne les RPPS des praticiens nouveaux.
+    """
+    # Premier exemplaire de chaque RPPS du lot
+    uniques = {}
+    for prat in lot:
+        uniques.setdefault(prat['rpps'], prat)
+
+    existing = set()
+    rpps = list(uniques)
+    for i in range(0, len(rpps), 500):
+        chunk = rpps[i:i + 500]
+        cursor.execute(f"SELECT rpps FROM Praticien WHERE rpps IN ({','.join('?' * len(chunk))})", chunk)
+        existing.update(row[0] for row in cursor.fetchall())
+
+    # Adresses partagées des praticiens écrits (une ligne par clé normalisée)
+    nouveaux = [prat for r, prat in uniques.items() if r not in existing]
+    ecrits = list(uniques.values()) if update_existing else nouveaux
+    cles_praticiens = {}
+    adresses = {}
+    for prat in ecrits:
+        addr = prat['adresse']
+        cle = cle_adresse(addr.get('ligne'), addr.get('code_postal'), addr.get('ville'))
+        cles_praticiens[prat['rpps']] = cle
+        adresses.setdefault(cle, addr)
+
+    cursor.executemany("""
+        INSERT INTO Adresse (ligne, code_postal, ville, complete, latitude, longitude, cle)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (cle) DO UPDATE SET
+            latitude = COALESCE(Adresse.latitude, excluded.latitude),
+            longitude = COALESCE(Adresse.longitude, excluded.longitude)
+    """, [
+        (addr.get('ligne'), addr.get('code_postal'), addr.get('ville'), addr.get('complete'),
+         addr.get('latitude'), addr.get('longitude'), cle)
+        for cle, addr in adresses.items()
+    ])
+
+    ids_par_cle = {}
+    cles = list(adresses)
+    for i in range(0, len(cles), 500):
+        chunk = cles[i:i + 500]
+        cursor.execute(f"SELECT cle, adresse_id FROM Adresse WHERE cle IN ({','.join('?' * len(chunk))})", chunk)
+        ids_par_cle.update(cursor.fetchall())
+
+    adresse_ids = {rpps: ids_par_cle[cle] for rpps, cle in cles_praticiens.items()}
+    metier_ids = ids_par_code(cursor, 'Metier', {
+        prat['metier_code']: PROFESSIONS.get(prat['metier_code'], 'Autre') for prat in ecrits
+    })
+    spe_ids = ids_par_code(cursor, 'Specialite', {prat['spe_code']: prat['spe_code'] for prat in ecrits})
+
+    conflict = """
+        DO UPDATE SET nom = excluded.nom, prenom = excluded.prenom, civilite = excluded.civilite,
+                      metier_id = excluded.metier_id, spe_id = excluded.spe_id,
+                      adresse_id = excluded.adresse_id, retire_le = NULL
+    """ if update_existing else "DO NOTHING"
+    cursor.executemany(f"""
+        INSERT INTO Praticien (rpps, nom, prenom, civilite, metier_id, spe_id, adresse_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (rpps) {conflict}
+    """, [
+        (prat['rpps'], prat['nom'], prat['prenom'], prat['civilite'], metier_ids[prat['metier_code']],
+         spe_ids[prat['spe_code']], adresse_ids[prat['rpps']])
+        for prat in ecrits
+    ])
+
+    return {prat['rpps'] for prat in nouveaux}
+
+
+def to_batch_row(prat: Dict) -> Optional[Tuple[Dict, Optional[Tuple[str, str]]]]:
+    """
+    Convertit un praticien au format de fetch_city.py en ligne pour write_batch.
+    Retourne (ligne, (code de spécialité, libellé) ou None), ou None s'il est incomplet.
+    """
+    profession_code = prat.get('profession_code')
+    if not profession_code or not prat.get('adresse') or not prat.get('rpps'):
+        return None
+    
+    spe_code = SANS_SPECIALITE[0]  # Par défaut : aucune spécialité
+    specialite = None
+    if prat.get('specialites'):
+        spe_code = prat['specialites'][0]['code']
+        spe_code = spe_code[2:] if spe_code.startswith('SM') else spe_code
+        specialite = (spe_code, prat['specialites'][0]['libelle'])
+    
+    return {
+        'rpps': prat['rpps'],
+        'nom': prat['nom'],
+        'prenom': prat['prenom'],
+        'civilite': prat['civilite'],
+        'metier_code': profession_code,
+        'spe_code': spe_code,
+        'adresse': prat['adresse']
+    }, specialite
+
+
+def insert_praticiens_bulk(conn, praticiens, batch_size: int = BULK_BATCH_SIZE, progress: bool = True) -> dict:
+    """
+    Comme insert_praticiens, pour les gros volumes : une seule transaction, lots écrits avec
+    executemany et upserts, index secondaires reconstruits une fois à la fin.
+    La connexion doit être la seule à écrire dans la base pendant le chargement.
+    
+    Returns:
+        dict: {'inseres', 'doublons', 'erreurs', 'par_profession'}
+    """
+    cursor = conn.cursor()
+    
+    inserted_count = 0
+    duplicate_count = 0
+    error_count = 0
+    stats_by_profession = {}
+    
+    lot = []
+    specialites = {}
+    
+    def flush():
+        nonlocal inserted_count, duplicate_count
+        ids_par_code(cursor, 'Specialite', specialites)
+        new = len(write_batch(cursor, lot))
+        inserted_count += new
+        duplicate_count += len(lot) - new
+        lot.clear()
+        specialites.clear()
+    
+    drop_indexes(conn)
+    termine = False
+    try:
+        for i, prat in enumerate(praticiens, 1):
+            converti = to_batch_row(prat)
+            if converti is None:
+                error_count += 1
+                continue
+            ligne, specialite = converti
+            
+            profession_name = PROFESSIONS.get(ligne['metier_code'], 'Autre')
+            stats_by_profession[profession_name] = stats_by_profession.get(profession_name, 0) + 1
+            
+            if specialite:
+                specialites.setdefault(*specialite)
+            lot.append(ligne)
+            
+            if len(lot) >= batch_size:
+                flush()
+                if progress:
+                    print(f"   [{i}] {inserted_count} insérés, {duplicate_count} doublons")
+        
+        flush()
+        termine = True
+    finally:
+        # Index et déclencheurs restaurés même sur Ctrl-C
+        if not termine:
+            conn.rollback()
+        create_indexes(conn)
+        conn.commit()
+    
+    return {
+        'inseres': inserted_count,
+        'doublons': duplicate_count,
+        'erreurs': error_count,
+        'par_profession': stats_by_profession
+    }
+
+
+def upsert_praticiens(conn, praticiens: List[Dict], retires: Iterable[str] = ()) -> dict:
+    """
+    Applique un lot de changements (rafraîchissement incrémental) en une transaction :
+    praticiens (format de fetch_city.py) insérés ou mis à jour, adresse comprise,
+    et RPPS de `retires` marqués comme disparus de l'annuaire.
+    
+    Returns:
+        dict: {'inseres', 'mis_a_jour', 'retires', 'erreurs'}
+    """
+    cursor = conn.cursor()
+    
+    lot = []
+    specialites = {}
+    error_count = 0
+    for prat in praticiens:
+        converti = to_batch_row(prat)
+        if converti is None:
+            error_count += 1
+            continue
+        ligne, specialite = converti
+        if specialite:
+            specialites.setdefault(*specialite)
+        lot.append(ligne)
+    
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        ids_par_code(cursor, 'Specialite', specialites)
+        inserted_count = len(write_batch(cursor, lot, update_existing=True))
+        
+        retired_count = 0
+        retires = list(retires)
+        now = datetime.now().isoformat()
+        for i in range(0, len(retires), 500):
+            chunk = retires[i:i + 500]
+            cursor.execute(f"""
+                UPDATE Praticien SET retire_le = ?
+                WHERE retire_le IS NULL AND rpps IN ({','.join('?' * len(chunk))})
+            """, (now, *chunk))
+            retired_count += cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    
+    return {
+        'inseres': inserted_count,
+        'mis_a_jour': len({ligne['rpps'] for ligne in lot}) - inserted_count,
+        'retires': retired_count,
+        'erreurs': error_count
+    }
+
+
+def check_database(conn) -> bool:
+    """Vérifie que les tables existent"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    tables = [row[0] for row in cursor.fetchall()]
+    
+    if 'Praticien' not in tables:
+        print("❌ La base de données n'existe pas. Lancez d'abord create_database.py")
+        return False
+    
+    # Base antérieure à retire_le, aux adresses partagées, à la ville normalisée ou aux clés entières
+    migrate_database(conn)
+    
+    # Toutes les spécialités de la nomenclature (copie locale, voir sm.py), une seule fois :
+    # dans une base qui n'en a encore aucune (create_database.py les précharge déjà)
+    cursor.execute("SELECT 1 FROM Specialite WHERE code != ? LIMIT 1", (SANS_SPECIALITE[0],))
+    if cursor.fetchone() is None:
+        preload_specialites(conn)
+    return True
+
+
+def load_json_to_database(json_file: str, db_name: str = "praticiens_sante.db", bulk: bool = False):
+    """
+    Charge les praticiens d'un fichier NDJSON (ou ancien JSON) dans la base de données
+    (bulk : chargement en masse). Le fichier NDJSON est lu au fil de l'insertion.
+    """
+    
+    print(f"\n{'='*80}")
+    print(f"📂 CHARGEMENT DEPUIS JSON VERS BASE DE DONNÉES")
+    print(f"{'='*80}\n")
+    
+    if not os.path.exists(json_file):
+        print(f"❌ Fichier introuvable: {json_file}")
+        return
+    print(f"📖 Lecture de {json_file}...\n")
+    praticiens = read_praticiens(json_file)
+    
+    # Connexion à la base
+    conn = sqlite3.connect(db_name)
+    
+    if not check_database(conn):
+        conn.close()
+        return
+    
+    print(f"🔄 Insertion dans la base de données...\n")
+    
+    start_time = time.time()
+    try:
+        if bulk:
+            tune_for_bulk(conn)
+            stats = insert_praticiens_bulk(conn, praticiens)
+        else:
+            stats = insert_praticiens(conn, praticiens)
+    except ValueError as e:
+        # Ligne illisible (fichier tronqué) : relancer après correction, les doublons sont ignorés
+        print(f"❌ Erreur lors de la lecture du fichier: {e}")
+        conn.close()
+        return
     conn.close()
+    print(f"\n⏱️  {time.time() - start_time:.1f}s")
+    refresh_snapshot(db_name)
+    
+    print_results(stats)
     
+    return stats['inseres']
+
+
+def print_results(stats: dict):
+    """Affiche le résumé d'un chargement"""
     print(f"\n{'='*80}")
     print(f"📊 RÉSULTATS")
     print(f"{'='*80}")
-    print(f"   ✅ {inserted_count} praticiens insérés")
-    print(f"   ⚠️  {duplicate_count} doublons ignorés")
-    print(f"   ❌ {error_count} erreurs")
+    print(f"   ✅ {stats['inseres']} praticiens insérés")
+    print(f"   ⚠️  {stats['doublons']} doublons ignorés")
+    print(f"   ❌ {stats['erreurs']} erreurs")
     
     print(f"\n📋 Répartition par profession:")
-    for profession, count in sorted(stats_by_profession.items(), key=lambda x: x[1], reverse=True):
+    for profession, count in sorted(stats['par_profession'].items(), key=lambda x: x[1], reverse=True):
         print(f"   • {profession}: {count}")
     
     print(f"{'='*80}\n")
-    
-    return inserted_count
 
 
 def main():
     """Point d'entrée principal"""
-    if len(sys.argv) < 2:
-        print("\n❌ Usage: python3 load_json_to_db.py <fichier_json>")
-        print("\nExemple: python3 load_json_to_db.py praticiens_nancy_complet.json\n")
+    args = [arg for arg in sys.argv[1:] if arg != '--bulk']
+    if not args:
+        print("\n❌ Usage: python3 load_json_to_db.py <fichier> [--bulk]")
+        print("\nExemple: python3 load_json_to_db.py praticiens_nancy_complet.ndjson\n")
         sys.exit(1)
     
-    json_file = sys.argv[1]
-    inserted = load_json_to_database(json_file)
+    json_file = args[0]
+    inserted = load_json_to_database(json_file, bulk='--bulk' in sys.argv)
     
     # Supprimer le fichier JSON après insertion réussie
-    if inserted > 0:
+    if inserted:
         try:
             os.remove(json_file)
             print(f"🗑️  Fichier JSON supprimé: {json_file}\n")
@@ -3,293 +3,725 @@
 """
 Script pour alimenter la base de données avec TOUTES les communes d'une région
 Usage: python3 load_region_to_db.py "Grand Est"
+       python3 load_region_to_db.py "Grand Est" --incremental
+
+L'avancement est journalisé dans crawl_state.db : relancer la même commande reprend
+le rafraîchissement en cours, et plusieurs processus lancés en parallèle se
+répartissent les communes restantes.
+
+Les communes sont traitées par coût décroissant : durée mesurée au rafraîchissement
+précédent, sinon estimée par la population (registre des communes). Celles qui
+n'avaient aucune organisation au dernier passage sont sautées (--toutes-communes pour
+les reprendre).
+
+--incremental : seulement ce qui a changé dans l'annuaire depuis la dernière
+synchronisation réussie de la région (rafraîchissement complet ou incrémental).
 """
 
-import requests
-import subprocess
+import argparse
+import sqlite3
 import sys
 import time
-import os
-from datetime import datetime
-
-# Codes région INSEE
-REGIONS = {
-    'Auvergne-Rhône-Alpes': '84',
-    'Bourgogne-Franche-Comté': '27',
-    'Bretagne': '53',
-    'Centre-Val de Loire': '24',
-    'Corse': '94',
-    'Grand Est': '44',
-    'Hauts-de-France': '32',
-    'Île-de-France': '11',
-    'Normandie': '28',
-    'Nouvelle-Aquitaine': '75',
-    'Occitanie': '76',
-    'Pays de la Loire': '52',
-    'Provence-Alpes-Côte d\'Azur': '93'
-}
+import queue
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
+from fetch_city import (
+    find_organizations_in_city, find_organizations_by_postal_prefix,
+    iter_practitioners_from_orgs, claim_seen, release_seen,
+    find_changes, forget_organizations, resolve_organization_addresses,
+    practitioners_of_organizations, parse_practitioner, refresh_practitioner
+)
+from load_json_to_db import upsert_praticiens, check_database
+from sinks import SinkError, open_sink
+from snapshot_praticiens import refresh_snapshot
+from api_client import APIError, print_stats
+from registre_communes import (
+    REGIONS, connect_registre, get_communes, postal_prefix, region_code,
+    get_departements as get_registre_departements
+)
+import crawl_state
+import metriques
+import query_db
 
-def get_all_communes(region_name: str):
+# Nombre de communes récupérées en parallèle (producteurs)
+DEFAULT_WORKERS = 4
+# Nombre maximal de résultats de tâches en attente d'affichage
+QUEUE_SIZE = 8
+# Intervalle d'export des métriques (secondes)
+METRICS_INTERVAL = 15
+# Praticiens rafraîchis écrits en base par transaction (mode incrémental)
+INCREMENTAL_BATCH = 500
+# Une commune sans organisation au dernier passage est sautée tant que ce passage a moins de N jours
+VIDE_VALIDITE_JOURS = 90
+# Sans historique : coût d'une tâche ~ 1 requête + 1 par tranche de N habitants (ordre de grandeur)
+HABITANTS_PAR_REQUETE = 500
+
+def get_departements(region_name: str):
     """
-    Récupère toutes les communes d'une région
+    Récupère les départements d'une région (registre local des communes)
     """
-    region_code = REGIONS.get(region_name)
-    
-    if not region_code:
+    if not region_code(region_name):
         print(f"❌ Région '{region_name}' non reconnue")
         print(f"Régions disponibles: {', '.join(REGIONS.keys())}")
         return []
     
+    conn = connect_registre()
+    try:
+        departements = get_registre_departements(conn, region_name)
+    finally:
+        conn.close()
+    
+    print(f"   ✅ {len(departements)} départements trouvés")
+    
+    return departements
+
+
+def get_all_communes(region_name: str):
+    """
+    Récupère toutes les communes d'une région (registre local des communes, trié par nom)
+    """
     print(f"🔍 Récupération des communes de {region_name}...")
     
     # Récupérer les départements
-    response_depts = requests.get(
-        f"https://geo.api.gouv.fr/departements",
-        params={'codeRegion': region_code},
-        timeout=30
-    )
-    departements = response_depts.json()
-    
-    print(f"   ✅ {len(departements)} départements trouvés")
+    departements = get_departements(region_name)
+    if not departements:
+        return []
     
-    # Récupérer toutes les communes
-    all_communes = []
+    conn = connect_registre()
+    try:
+        all_communes = get_communes(conn, region_name)
+    finally:
+        conn.close()
     
     for dept in departements:
-        dept_code = dept['code']
-        dept_nom = dept['nom']
-        
-        response = requests.get(
-            f"https://geo.api.gouv.fr/departements/{dept_code}/communes",
-            params={'fields': 'nom,population'},
-            timeout=30
-        )
-        communes = response.json()
-        all_communes.extend(communes)
-        print(f"   ✅ {dept_nom} ({dept_code}): {len(communes)} communes")
+        count = sum(1 for c in all_communes if c['codeDepartement'] == dept['code'])
+        print(f"   ✅ {dept['nom']} ({dept['code']}): {count} communes")
+    
+    print(f"\n✅ Total: {len(all_communes)} communes récupérées\n")
+    
+    return all_communes
+
+
+def get_postal_prefixes(region_name: str):
+    """
+    Préfixes de code postal des départements d'une région (2A/2B -> 20)
+    """
+    print(f"🔍 Récupération des départements de {region_name}...")
     
-    # Trier par ordre alphabétique
-    all_communes_sorted = sorted(all_communes, key=lambda x: x.get('nom', ''))
+    prefixes = []
+    for dept in get_departements(region_name):
+        prefix = postal_prefix(dept['code'])
+        if prefix not in prefixes:
+            prefixes.append(prefix)
     
-    print(f"\n✅ Total: {len(all_communes_sorted)} communes récupérées\n")
+    print(f"\n✅ Total: {len(prefixes)} préfixes de code postal\n")
     
-    return all_communes_sorted
+    return prefixes
+
 
+def resultat_tache(tache: dict, message: str = '') -> dict:
+    """Résultat d'une tâche (échec par défaut, voir crawl_tache)"""
+    return {
+        'nom': tache['libelle'] or tache['cle'],
+        'success': False,
+        'praticiens': 0,
+        'doublons': 0,
+        'erreurs': 0,
+        'message': message,
+        'duree': 0.0,
+        'cout_estime': tache['cout_estime']
+    }
 
-def process_ville(ville_name: str, index: int, total: int):
+
+def crawl_tache(tache: dict, seen: dict, sink, state_conn, refresh_id: str) -> dict:
     """
-    Traite une ville : fetch + load
+    Traite une tâche du journal (producteur) : une commune ou un préfixe de code postal.
+    Les praticiens sont passés au puits dès qu'ils sont résolus ; la tâche n'est marquée
+    terminée qu'une fois ses praticiens écrits (sink.sync).
     
     Returns:
-        tuple: (success: bool, praticiens_count: int, message: str)
+        dict: {'nom', 'success', 'praticiens', 'doublons', 'erreurs', 'message', 'duree', 'cout_estime'}
     """
-    print(f"\n{'='*80}")
-    print(f"[{index}/{total}] 🏘️  {ville_name}")
-    print(f"{'='*80}")
-    
-    # Générer le nom du fichier JSON (normaliser les caractères spéciaux)
-    ville_normalized = ville_name.lower()
-    ville_normalized = ville_normalized.replace(' ', '_').replace('-', '_')
-    ville_normalized = ville_normalized.replace('œ', 'oe').replace('æ', 'ae')
-    ville_normalized = ville_normalized.replace('é', 'e').replace('è', 'e').replace('ê', 'e').replace('ë', 'e')
-    ville_normalized = ville_normalized.replace('à', 'a').replace('â', 'a').replace('ä', 'a')
-    ville_normalized = ville_normalized.replace('ô', 'o').replace('ö', 'o')
-    ville_normalized = ville_normalized.replace('û', 'u').replace('ù', 'u').replace('ü', 'u')
-    ville_normalized = ville_normalized.replace('î', 'i').replace('ï', 'i')
-    ville_normalized = ville_normalized.replace('ç', 'c').replace("'", '_')
-    json_filename = f"praticiens_{ville_normalized}_complet.json"
-    
     start_time = time.time()
+    tache_id = tache['tache_id']
+    result = resultat_tache(tache)
     
-    # Étape 1 : Fetch
-    print(f"   1️⃣  Récupération des praticiens via API (peut prendre plusieurs minutes pour les grandes villes)...")
+    org_ids = []
+    fhir_ids = []
     try:
-        result_fetch = subprocess.run(
-            ['python3', 'fetch_city.py', ville_name],
-            capture_output=False,  # Afficher la sortie en temps réel
-            text=True,
-            timeout=1800  # 30 minutes max pour les très grandes villes
-        )
-        
-        if result_fetch.returncode != 0:
-            print(f"   ⚠️  Échec du fetch")
-            return (False, 0, "Échec fetch")
+        if tache['type'] == 'prefixe':
+            orgs = find_organizations_by_postal_prefix(tache['cle'])
+        else:
+            orgs = find_organizations_in_city(tache['libelle'])
+        found = len(orgs)
         
-        # Vérifier si le JSON existe
-        if not os.path.exists(json_filename):
-            print(f"   ℹ️  Aucun praticien trouvé")
-            return (True, 0, "Aucun praticien")
+        orgs = [org for org in orgs if claim_seen(seen, 'Organization', org['id'])]
+        org_ids = [org['id'] for org in orgs]
         
-    except subprocess.TimeoutExpired:
-        print(f"   ⏱️  Timeout fetch")
-        if os.path.exists(json_filename):
-            os.remove(json_filename)
-        return (False, 0, "Timeout fetch")
+        for prat in iter_practitioners_from_orgs(orgs, verbose=False, seen=seen):
+            fhir_ids.append(prat['fhir_id'])
+            sink.write(prat, tache_id)
+        stats = sink.sync(tache_id)
     except Exception as e:
-        print(f"   ❌ Erreur fetch: {e}")
-        return (False, 0, f"Erreur: {e}")
+        # Rendre les ressources pour qu'une prochaine tâche les reprenne
+        release_seen(seen, 'Organization', org_ids)
+        release_seen(seen, 'Practitioner', fhir_ids)
+        prefix = "Erreur load" if isinstance(e, SinkError) else "Erreur fetch"
+        result['message'] = f"{prefix}: {e}"
+        result['duree'] = time.time() - start_time
+        crawl_state.fail_task(state_conn, tache_id, result['message'])
+        return result
     
-    # Étape 2 : Load
-    print(f"   2️⃣  Chargement dans la base de données...")
-    try:
-        result_load = subprocess.run(
-            ['python3', 'load_json_to_db.py', json_filename],
-            capture_output=True,
-            text=True,
-            timeout=600  # 10 minutes max
-        )
-        
-        if result_load.returncode != 0:
-            print(f"   ⚠️  Échec du chargement")
-            # Supprimer le JSON en cas d'erreur
-            if os.path.exists(json_filename):
-                os.remove(json_filename)
-            return (False, 0, "Échec load")
-        
-        # Extraire le nombre de praticiens insérés depuis la sortie
-        output = result_load.stdout
-        praticiens_count = 0
-        
-        # Chercher "✅ X praticiens insérés"
-        for line in output.split('\n'):
-            if 'praticiens insérés' in line or 'praticien inséré' in line:
+    result.update({
+        'praticiens': stats['inseres'],
+        'doublons': stats['doublons'],
+        'erreurs': stats['erreurs'],
+        'message': "Succès" if fhir_ids else "Aucun praticien"
+    })
+    
+    # Seulement une fois les données écrites : une reprise ne les récupérera pas à nouveau
+    crawl_state.save_seen(state_conn, refresh_id, 'Organization', org_ids)
+    crawl_state.save_seen(state_conn, refresh_id, 'Practitioner', fhir_ids)
+    crawl_state.complete_task(state_conn, tache_id)
+    
+    result['success'] = True
+    result['duree'] = time.time() - start_time
+    # Coût de référence du prochain rafraîchissement (organisations trouvées, même déjà vues)
+    crawl_state.record_cost(state_conn, tache['type'], tache['cle'], result['duree'], found, len(fhir_ids))
+    return result
+
+
+def run_pipeline(sink, state_conn, refresh_id: str, workers: int = DEFAULT_WORKERS, limit: int = None):
+    """
+    Pipeline en processus : `workers` threads réservent des tâches dans le journal, les
+    récupèrent et passent les praticiens au puits (voir sinks.py : pour la base, un thread
+    écrivain unique les écrit par lots). Génère le résultat de crawl_tache pour chaque
+    tâche, dans l'ordre de fin.
+    """
+    seen = crawl_state.load_seen(state_conn, refresh_id)
+    
+    results = queue.Queue(maxsize=QUEUE_SIZE)
+    claimed = {'count': 0}
+    claimed_lock = threading.Lock()
+    # Consommateur arrêté (Ctrl-C, erreur du puits...) : les producteurs ne réservent plus
+    # de tâche et n'attendent plus indéfiniment une place dans la file
+    stop = threading.Event()
+    
+    def deposer(item) -> bool:
+        """Met item dans la file ; False si le consommateur s'est arrêté entre-temps"""
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def producer():
+        # Une connexion SQLite par thread
+        producer_state = crawl_state.connect_state()
+        worker = crawl_state.worker_id()
+        try:
+            while not stop.is_set():
+                with claimed_lock:
+                    if limit and claimed['count'] >= limit:
+                        return
+                    tache = crawl_state.claim_task(producer_state, refresh_id, worker)
+                    if tache is None:
+                        return
+                    claimed['count'] += 1
                 try:
-                    praticiens_count = int(line.split()[1])
-                except:
-                    pass
-        
-        elapsed = time.time() - start_time
-        print(f"   ✅ Terminé en {elapsed:.1f}s - {praticiens_count} praticiens ajoutés")
-        
-        return (True, praticiens_count, "Succès")
+                    result = crawl_tache(tache, seen, sink, producer_state, refresh_id)
+                except Exception as e:
+                    # Journal inaccessible (base verrouillée...) : la tâche est signalée en échec
+                    # plutôt que de perdre le thread (l'exécuteur ne remonte pas l'exception)
+                    result = resultat_tache(tache, f"Erreur journal: {e}")
+                    try:
+                        crawl_state.fail_task(producer_state, tache['tache_id'], result['message'])
+                    except sqlite3.Error:
+                        pass  # Reprise à l'expiration de la réservation
+                if not deposer(result):
+                    return
+        finally:
+            producer_state.close()
+            deposer(None)
+    
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for _ in range(workers):
+            executor.submit(producer)
         
-    except subprocess.TimeoutExpired:
-        print(f"   ⏱️  Timeout load")
-        if os.path.exists(json_filename):
-            os.remove(json_filename)
-        return (False, 0, "Timeout load")
-    except Exception as e:
-        print(f"   ❌ Erreur load: {e}")
-        if os.path.exists(json_filename):
-            os.remove(json_filename)
-        return (False, 0, f"Erreur: {e}")
+        finished = 0
+        while finished < workers:
+            result = results.get()
+            if result is None:
+                finished += 1
+                continue
+            metriques.inc('crawl_tasks_total', resultat='succes' if result['success'] else 'echec')
+            yield result
+    finally:
+        # Les producteurs terminent leur tâche en cours puis s'arrêtent
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
 
 
-def load_region_to_db(region_name: str, start_from: int = 0, limit: int = None):
+def estimate_costs(cles: list, costs: dict, populations: dict = None) -> dict:
+    """
+    Coût estimé de chaque tâche : durée observée au dernier passage, sinon durée prédite
+    par la population (régression linéaire sur les communes déjà mesurées), sinon un
+    nombre de requêtes déduit de la population (aucun historique)
+    
+    Returns:
+        dict: {cle: coût}
+    """
+    populations = populations or {}
+    
+    # Durée ~ a + b * population sur les communes mesurées
+    points = [(populations[cle], costs[cle]['duree']) for cle in cles if cle in costs and cle in populations]
+    model = None
+    if len(points) >= 2:
+        n = len(points)
+        mean_x = sum(x for x, _ in points) / n
+        mean_y = sum(y for _, y in points) / n
+        var_x = sum((x - mean_x) ** 2 for x, _ in points)
+        b = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x if var_x else 0.0
+        model = (max(mean_y - max(b, 0.0) * mean_x, 0.0), max(b, 0.0))
+    
+    estimates = {}
+    for cle in cles:
+        if cle in costs:
+            estimates[cle] = costs[cle]['duree']
+        elif model:
+            estimates[cle] = model[0] + model[1] * populations.get(cle, 0)
+        elif costs:
+            # Historique sans population (préfixes) : durée moyenne
+            estimates[cle] = sum(c['duree'] for c in costs.values()) / len(costs)
+        else:
+            estimates[cle] = 1.0 + populations.get(cle, 0) / HABITANTS_PAR_REQUETE
+    return estimates
+
+
+def enqueue_region(state_conn, refresh_id: str, region_name: str, mode: str, skip_empty: bool = True) -> bool:
+    """
+    Ajoute au journal les tâches de la région (sans effet sur celles déjà présentes), avec
+    leur coût estimé : les plus coûteuses sont traitées en premier. Les communes (ou préfixes)
+    sans organisation au dernier passage sont sautées (skip_empty), sauf si ce passage date
+    de plus de VIDE_VALIDITE_JOURS jours.
+    """
+    if mode == 'departement':
+        type_tache = 'prefixe'
+        taches = [(prefix, prefix) for prefix in get_postal_prefixes(region_name)]
+        populations = {}
+    else:
+        type_tache = 'commune'
+        communes = get_all_communes(region_name)
+        taches = [(c['code'], c['nom']) for c in communes]
+        populations = {c['code']: c['population'] for c in communes}
+    if not taches:
+        return False
+    
+    costs = crawl_state.get_costs(state_conn, type_tache)
+    if skip_empty:
+        limit = (datetime.now() - timedelta(days=VIDE_VALIDITE_JOURS)).isoformat()
+        empty = {cle for cle, cost in costs.items() if cost['organisations'] == 0 and cost['maj_le'] >= limit}
+        skipped = [t for t in taches if t[0] in empty]
+        taches = [t for t in taches if t[0] not in empty]
+        if skipped:
+            print(f"⏭️  {len(skipped)} tâches sautées (aucune organisation au dernier passage)")
+    
+    estimates = estimate_costs([cle for cle, _ in taches], costs, populations)
+    known = sum(1 for cle, _ in taches if cle in costs)
+    print(f"📈 Tâches ordonnées par coût estimé: {known} mesurées au dernier passage, "
+          f"{len(taches) - known} estimées" + (" par la population" if populations else ""))
+    
+    crawl_state.enqueue_tasks(state_conn, refresh_id, type_tache, taches, estimates)
+    return True
+
+
+def load_region_to_db(region_name: str, limit: int = None, workers: int = DEFAULT_WORKERS,
+                      db_name: str = "praticiens_sante.db", mode: str = "commune",
+                      metrics_prom: str = None, metrics_jsonl: str = None, json_debug: str = None,
+                      skip_empty: bool = True):
     """
     Charge toutes les communes d'une région dans la base de données
     
     Args:
         region_name: Nom de la région
-        start_from: Commencer à partir de la Nième commune (pour reprendre)
-        limit: Limiter au N premières communes (None = toutes)
+        limit: Traiter au plus N tâches dans ce run (None = toutes)
+        workers: Nombre de tâches récupérées en parallèle
+        db_name: Base de données cible
+        mode: 'commune' (une recherche par commune) ou 'departement'
+              (une recherche par préfixe de code postal)
+        metrics_prom: Fichier texte Prometheus mis à jour pendant le run (None = pas d'export)
+        metrics_jsonl: Fichier JSON lines recevant un instantané des métriques toutes les
+                       METRICS_INTERVAL secondes (None = pas d'export)
+        json_debug: Fichier NDJSON recevant aussi les praticiens écrits en base (None = aucun)
+        skip_empty: Sauter les communes sans organisation au dernier passage (voir enqueue_region)
+    
+    Les tâches les plus coûteuses (durée au dernier passage, ou population) passent en
+    premier ; avec des durées mesurées, le temps restant est estimé à partir de ces coûts.
+    Chaque commune, organisation et praticien n'est traité qu'une fois par rafraîchissement :
+    un run interrompu reprend le rafraîchissement en cours (voir crawl_state.py).
     """
     print("\n" + "="*80)
     print(f"🌍 ALIMENTATION DE LA BASE POUR LA RÉGION: {region_name.upper()}")
     print("="*80 + "\n")
     
-    # Récupérer toutes les communes
-    communes = get_all_communes(region_name)
+    conn = sqlite3.connect(db_name, timeout=60)
+    if not check_database(conn):
+        conn.close()
+        return
+    
+    # Rafraîchissement en cours (repris s'il n'est pas terminé)
+    state_conn = crawl_state.connect_state()
+    refresh_id = crawl_state.start_refresh(state_conn, region_name)
+    print(f"🗂️  Rafraîchissement: {refresh_id}\n")
     
-    if not communes:
+    if not enqueue_region(state_conn, refresh_id, region_name, mode, skip_empty):
+        state_conn.close()
+        conn.close()
         return
     
-    # Appliquer start_from et limit
-    if start_from > 0:
-        print(f"⏭️  Démarrage à partir de la commune #{start_from + 1}")
-        communes = communes[start_from:]
+    counts = crawl_state.count_by_state(state_conn, refresh_id)
+    total = crawl_state.count_remaining(state_conn, refresh_id)
+    if counts[crawl_state.FAIT]:
+        print(f"⏭️  {counts[crawl_state.FAIT]} tâches déjà terminées, reprise des {total} restantes")
     
     if limit:
-        print(f"🔢 Limitation à {limit} communes")
-        communes = communes[:limit]
-    
-    total = len(communes)
+        print(f"🔢 Limitation à {limit} tâches")
+        total = min(total, limit)
     
     # Statistiques
     success_count = 0
     empty_count = 0
     error_count = 0
     total_praticiens = 0
+    processed = 0
+    # Coût estimé des tâches traitées dans ce run : avec des durées mesurées au passage
+    # précédent, le temps restant est estimé au prorata des coûts plutôt que des tâches
+    done_estimate = 0.0
+    cost_eta = bool(crawl_state.get_costs(state_conn, 'prefixe' if mode == 'departement' else 'commune'))
+    
+    # Écriture directe dans la base par un thread dédié (+ copie NDJSON si demandée)
+    sink = open_sink(db_name, ndjson=json_debug)
+    if json_debug:
+        print(f"📝 Copie des praticiens dans {json_debug}")
     
     start_time = time.time()
+    stop_metrics = metriques.start_exporter(metrics_prom, metrics_jsonl, METRICS_INTERVAL)
     
-    print(f"\n🚀 Traitement de {total} communes...\n")
+    print(f"\n🚀 Traitement de {total} tâches ({workers} en parallèle)...\n")
     print(f"⏰ Début: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
     
-    # Traiter chaque commune
-    for i, commune in enumerate(communes, 1):
-        ville_name = commune['nom']
-        population = commune.get('population', 0)
-        
-        success, prat_count, message = process_ville(ville_name, i + start_from, len(communes) + start_from)
-        
-        if success:
-            if prat_count > 0:
+    # Traiter chaque tâche
+    for i, result in enumerate(run_pipeline(sink, state_conn, refresh_id, workers, limit), 1):
+        processed = i
+        done_estimate += result['cout_estime']
+        if result['success']:
+            if result['praticiens'] > 0:
                 success_count += 1
-                total_praticiens += prat_count
+                total_praticiens += result['praticiens']
+                print(f"[{i}/{total}] ✅ {result['nom']}: "
+                      f"{result['praticiens']} praticiens ajoutés ({result['duree']:.1f}s)")
             else:
                 empty_count += 1
+                print(f"[{i}/{total}] ℹ️  {result['nom']}: {result['message']}")
         else:
             error_count += 1
+            print(f"[{i}/{total}] ❌ {result['nom']}: {result['message']}")
         
-        # Statistiques intermédiaires tous les 10 communes
+        # Statistiques intermédiaires tous les 10 tâches
         if i % 10 == 0:
             elapsed = time.time() - start_time
             avg_time = elapsed / i
-            remaining = avg_time * (total - i)
+            remaining_estimate = crawl_state.estimate_remaining(
+                state_conn, refresh_id, max(limit - i, 0) if limit else None
+            )
+            if cost_eta and done_estimate > 0:
+                remaining = remaining_estimate * elapsed / done_estimate
+            else:
+                remaining = avg_time * max(total - i, 0)
             
             print(f"\n📊 PROGRESSION")
-            print(f"   Communes traitées: {i}/{total}")
+            print(f"   Tâches traitées: {i}/{total}")
             print(f"   ✅ Succès: {success_count} ({total_praticiens} praticiens)")
             print(f"   ℹ️  Vides: {empty_count}")
             print(f"   ❌ Erreurs: {error_count}")
             print(f"   ⏱️  Temps écoulé: {elapsed/60:.1f} min")
             print(f"   ⏳ Temps restant estimé: {remaining/60:.1f} min")
-            print(f"   ⚡ Vitesse moyenne: {avg_time:.1f}s par commune\n")
+            print(f"   ⚡ Vitesse moyenne: {avg_time:.1f}s par tâche")
+            
+            # Débits, latences, erreurs HTTP, caches et files depuis le début du run
+            metriques.set_gauge('crawl_queue_depth', crawl_state.count_remaining(state_conn, refresh_id), file='journal')
+            metriques.print_summary()
+            print()
+    
+    sink.close()
     
     # Statistiques finales
     elapsed = time.time() - start_time
+    if stop_metrics:
+        stop_metrics.set()
     
     print("\n" + "="*80)
     print("🎉 TRAITEMENT TERMINÉ")
     print("="*80)
     print(f"\nRégion: {region_name}")
-    print(f"Communes traitées: {total}")
+    print(f"Tâches traitées: {processed} (mode {mode})")
     print(f"   ✅ Succès: {success_count} ({total_praticiens} praticiens ajoutés)")
     print(f"   ℹ️  Vides (aucun praticien): {empty_count}")
     print(f"   ❌ Erreurs: {error_count}")
-    print(f"\n⏱️  Temps total: {elapsed/60:.1f} minutes ({elapsed/3600:.2f} heures)")
-    print(f"⚡ Vitesse moyenne: {elapsed/total:.1f}s par commune")
-    print(f"📊 Taux de succès: {(success_count + empty_count) / total * 100:.1f}%")
+    if processed:
+        print(f"\n⏱️  Temps total: {elapsed/60:.1f} minutes ({elapsed/3600:.2f} heures)")
+        print(f"⚡ Vitesse moyenne: {elapsed/processed:.1f}s par tâche")
+        print(f"📊 Taux de succès: {(success_count + empty_count) / processed * 100:.1f}%")
     print(f"\n⏰ Fin: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("="*80 + "\n")
     
+    # Rafraîchissement terminé quand plus aucune tâche ne reste (tous workers confondus)
+    if crawl_state.finish_refresh(state_conn, refresh_id):
+        print(f"🗂️  Rafraîchissement {refresh_id} terminé\n")
+        failed = crawl_state.failed_tasks(state_conn, refresh_id)
+        if failed:
+            print(f"⚠️  {len(failed)} tâche(s) en échec définitif : synchronisation laissée au "
+                  f"{crawl_state.get_last_sync(state_conn, region_name)} (relancer un rafraîchissement complet)")
+            for tache in failed[:20]:
+                print(f"      • {tache['libelle'] or tache['cle']} ({tache['tentatives']} tentatives): {tache['erreur']}")
+            print()
+    else:
+        remaining = crawl_state.count_remaining(state_conn, refresh_id)
+        print(f"🗂️  Rafraîchissement {refresh_id} : {remaining} tâche(s) restante(s), relancer pour le compléter\n")
+    state_conn.close()
+    
+    # Requêtes HTTP (débit, nouvelles tentatives, erreurs par endpoint)
+    print_stats()
+    
     # Afficher les stats de la base
     print("📊 Vérification de la base de données...")
-    subprocess.run(['python3', 'query_db.py'])
+    query_db.print_stats(conn)
+    query_db.print_by_profession(conn)
+    query_db.print_by_department(conn)
+    query_db.print_by_city(conn)
+    query_db.print_top_specialties(conn)
+    
+    conn.close()
+    refresh_snapshot(db_name)
+
+
+def known_rpps(conn, rpps: list) -> set:
+    """RPPS déjà présents dans la base parmi ceux donnés"""
+    known = set()
+    for i in range(0, len(rpps), 500):
+        chunk = rpps[i:i + 500]
+        known.update(row[0] for row in conn.execute(
+            f"SELECT rpps FROM Praticien WHERE rpps IN ({','.join('?' * len(chunk))})", chunk
+        ))
+    return known
+
+
+def select_changed_practitioners(conn, changes: dict, prefixes: list) -> dict:
+    """
+    Praticiens à rafraîchir parmi les changements de l'annuaire : {id FHIR: ressource ou None}
+    - praticiens des organisations de la région modifiées (adresse)
+    - rôles modifiés dans une organisation de la région, ou d'un praticien déjà en base
+      (arrivée, départ, changement de lieu)
+    - praticiens modifiés déjà en base (identité, qualifications, désactivation) ; les
+      nouveaux praticiens de la région arrivent par leurs rôles
+    """
+    org_ids = [org['id'] for org in changes['organisations']]
+    candidates = {pract_id: None for pract_id in practitioners_of_organizations(org_ids)}
+    
+    details = {pract_id: parse_practitioner(resource) for pract_id, resource in changes['praticiens'].items()}
+    known = known_rpps(conn, list(
+        {change['rpps'] for change in changes['roles'].values() if change['rpps']}
+        | {d['rpps'] for d in details.values() if d}
+    ))
+    
+    for pract_id, change in changes['roles'].items():
+        in_region = any(cp.startswith(prefix) for cp in change['codes_postaux'] for prefix in prefixes)
+        if in_region or change['rpps'] in known:
+            candidates[pract_id] = changes['praticiens'].get(pract_id)
+    
+    for pract_id, d in details.items():
+        if d and d['rpps'] in known:
+            candidates[pract_id] = changes['praticiens'][pract_id]
+    
+    return candidates
+
+
+def load_region_incremental(region_name: str, workers: int = DEFAULT_WORKERS, db_name: str = "praticiens_sante.db"):
+    """
+    Rafraîchissement incrémental d'une région : seules les ressources modifiées depuis la
+    dernière synchronisation réussie (_lastUpdated) sont lues ; les praticiens concernés sont
+    insérés ou mis à jour (adresse comprise), et ceux qui n'exercent plus dans la région sont
+    marqués retirés (Praticien.retire_le).
+    
+    La date de synchronisation n'avance que si tous les praticiens ont pu être rafraîchis :
+    un run en échec est simplement relancé (les écritures sont idempotentes).
+    Les ressources supprimées de l'annuaire (et non désactivées) ne sont pas détectées.
+    """
+    print("\n" + "="*80)
+    print(f"🔄 RAFRAÎCHISSEMENT INCRÉMENTAL: {region_name.upper()}")
+    print("="*80 + "\n")
+    
+    conn = sqlite3.connect(db_name, timeout=60)
+    if not check_database(conn):
+        conn.close()
+        return
+    
+    state_conn = crawl_state.connect_state()
+    since = crawl_state.get_last_sync(state_conn, region_name)
+    if since is None:
+        print(f"❌ {region_name} n'a jamais été synchronisée : lancer d'abord un rafraîchissement complet")
+        state_conn.close()
+        conn.close()
+        return
+    
+    started = datetime.now()
+    start_time = time.time()
+    print(f"🕐 Changements depuis le {since}\n")
+    
+    prefixes = get_postal_prefixes(region_name)
+    if not prefixes:
+        state_conn.close()
+        conn.close()
+        return
+    
+    try:
+        changes = find_changes(since, prefixes)
+    except APIError as e:
+        print(f"❌ Erreur fetch: {e}")
+        print(f"🗂️  Synchronisation laissée au {since} : relancer le rafraîchissement incrémental\n")
+        state_conn.close()
+        print_stats()
+        conn.close()
+        return
+    print(f"   🏥 {len(changes['organisations'])} organisations de la région modifiées")
+    print(f"   🔗 {len(changes['roles'])} praticiens avec un rôle modifié (tout l'annuaire)")
+    print(f"   👤 {len(changes['praticiens'])} praticiens modifiés (tout l'annuaire)")
+    
+    # Adresses des organisations modifiées : résolues à nouveau
+    forget_organizations([org['id'] for org in changes['organisations']])
+    resolve_organization_addresses(changes['organisations'])
+    
+    candidates = select_changed_practitioners(conn, changes, prefixes)
+    print(f"\n🚀 {len(candidates)} praticiens à rafraîchir ({workers} en parallèle)...\n")
+    
+    def refresh(item):
+        pract_id, resource = item
+        try:
+            return refresh_practitioner(pract_id, prefixes, resource), None
+        except APIError as e:
+            return None, f"{pract_id}: {e}"
+    
+    totals = {'inseres': 0, 'mis_a_jour': 0, 'retires': 0, 'erreurs': 0}
+    failures = []
+    praticiens, retires = [], []
+    
+    def flush():
+        stats = upsert_praticiens(conn, praticiens, retires)
+        for key in totals:
+            totals[key] += stats[key]
+        praticiens.clear()
+        retires.clear()
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i, (result, erreur) in enumerate(executor.map(refresh, candidates.items()), 1):
+            if erreur:
+                failures.append(erreur)
+            elif result and result['praticien']:
+                praticiens.append(result['praticien'])
+            elif result:
+                retires.append(result['rpps'])
+            
+            if len(praticiens) + len(retires) >= INCREMENTAL_BATCH:
+                flush()
+                print(f"   [{i}/{len(candidates)}] {totals['inseres']} ajoutés, "
+                      f"{totals['mis_a_jour']} mis à jour, {totals['retires']} retirés")
+    flush()
+    
+    elapsed = time.time() - start_time
+    print("\n" + "="*80)
+    print("🎉 RAFRAÎCHISSEMENT INCRÉMENTAL TERMINÉ")
+    print("="*80)
+    print(f"   ✅ {totals['inseres']} praticiens ajoutés")
+    print(f"   🔁 {totals['mis_a_jour']} praticiens mis à jour")
+    print(f"   🚪 {totals['retires']} praticiens retirés")
+    print(f"   ❌ {len(failures)} praticiens non rafraîchis, {totals['erreurs']} incomplets")
+    for erreur in failures[:10]:
+        print(f"      • {erreur}")
+    print(f"\n⏱️  Temps total: {elapsed:.1f}s")
+    
+    # Praticiens incomplets (rejetés à l'écriture) : non écrits, donc pas synchronisés non plus
+    if failures or totals['erreurs']:
+        print(f"🗂️  Synchronisation laissée au {since} : relancer pour rafraîchir les praticiens en échec\n")
+    else:
+        crawl_state.set_last_sync(state_conn, region_name, started)
+        print(f"🗂️  {region_name} synchronisée jusqu'au {crawl_state.get_last_sync(state_conn, region_name)}\n")
+    state_conn.close()
+    
+    print_stats()
+    conn.close()
+    refresh_snapshot(db_name)
+    return totals
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("\n❌ Usage: python3 load_region_to_db.py <RÉGION> [start_from] [limit]")
-        print("\nExemples:")
-        print('  python3 load_region_to_db.py "Grand Est"')
-        print('  python3 load_region_to_db.py "Grand Est" 100        # Reprendre à partir de la 100ème commune')
-        print('  python3 load_region_to_db.py "Grand Est" 0 50       # Limiter aux 50 premières communes')
-        print("\nRégions disponibles:")
-        for region in sorted(REGIONS.keys()):
-            print(f"  - {region}")
-        print("\nATTENTION: Ce script peut prendre plusieurs heures pour une grande région !")
-        print("           Utilisez 'nohup' pour lancer en arrière-plan:")
-        print('           nohup python3 load_region_to_db.py "Grand Est" > grand_est.log 2>&1 &')
+    parser = argparse.ArgumentParser(
+        description="Alimente la base avec tous les praticiens d'une région.",
+        epilog=(
+            "Exemples:\n"
+            '  python3 load_region_to_db.py "Grand Est"\n'
+            '  python3 load_region_to_db.py "Grand Est" --limit 50       # Au plus 50 communes dans ce run\n'
+            '  python3 load_region_to_db.py "Grand Est" --workers 8      # 8 communes récupérées en parallèle\n'
+            '  python3 load_region_to_db.py "Grand Est" --departements   # Une recherche par département\n'
+            '  python3 load_region_to_db.py "Grand Est" --toutes-communes  # Sans sauter les communes vides au dernier passage\n'
+            '  python3 load_region_to_db.py "Grand Est" --incremental    # Seulement les changements depuis la dernière synchro\n'
+            '  python3 load_region_to_db.py "Grand Est" --json-debug grand_est.ndjson  # Copie NDJSON des praticiens écrits\n'
+            '  python3 load_region_to_db.py "Grand Est" --metrics-prom /var/lib/node_exporter/crawl.prom\n\n'
+            "Régions disponibles: " + ', '.join(sorted(REGIONS.keys())) + "\n\n"
+            "ATTENTION: Ce script peut prendre plusieurs heures pour une grande région !\n"
+            "Un run interrompu reprend là où il s'était arrêté, et plusieurs processus\n"
+            "lancés en parallèle se répartissent le travail :\n"
+            '  nohup python3 load_region_to_db.py "Grand Est" > grand_est_1.log 2>&1 &\n'
+            '  nohup python3 load_region_to_db.py "Grand Est" > grand_est_2.log 2>&1 &'
+        ),
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("region", help="Nom de la région")
+    parser.add_argument("--limit", type=int, default=None, help="Traiter au plus N tâches dans ce run")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Tâches récupérées en parallèle")
+    parser.add_argument("--departements", action='store_true', help="Une recherche par préfixe de code postal au lieu d'une par commune")
+    parser.add_argument("--toutes-communes", action='store_true', help="Ne pas sauter les communes sans organisation au dernier passage")
+    parser.add_argument("--incremental", action='store_true', help="Seulement les ressources modifiées depuis la dernière synchronisation")
+    parser.add_argument("--db", default="praticiens_sante.db", help="Base de données cible")
+    parser.add_argument("--metrics-prom", default=None, help="Fichier texte Prometheus (répertoire textfile de node_exporter)")
+    parser.add_argument("--metrics-jsonl", default=None, help="Fichier JSON lines des instantanés de métriques")
+    parser.add_argument("--json-debug", default=None, metavar="FICHIER", help="Copie NDJSON des praticiens écrits en base (débogage)")
+    args = parser.parse_args()
+    
+    if args.region not in REGIONS:
+        print(f"❌ Région '{args.region}' non reconnue")
+        print(f"Régions disponibles: {', '.join(REGIONS.keys())}")
         sys.exit(1)
     
-    region_name = sys.argv[1]
-    start_from = int(sys.argv[2]) if len(sys.argv) > 2 else 0
-    limit = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    if args.incremental:
+        load_region_incremental(args.region, workers=args.workers, db_name=args.db)
+        return
     
-    load_region_to_db(region_name, start_from, limit)
+    load_region_to_db(
+        args.region,
+        limit=args.limit,
+        workers=args.workers,
+        db_name=args.db,
+        mode='departement' if args.departements else 'commune',
+        metrics_prom=args.metrics_prom,
+        metrics_jsonl=args.metrics_jsonl,
+        json_debug=args.json_debug,
+        skip_empty=not args.toutes_communes
+    )
 
 
 if __name__ == "__main__":
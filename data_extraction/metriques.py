@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Métriques des crawls : compteurs, jauges et histogrammes en mémoire, exportés
+- au format texte Prometheus (à déposer dans le répertoire textfile de node_exporter)
+- en lignes JSON (un instantané par ligne, avec les débits depuis l'instantané précédent)
+
+Métriques alimentées par les scripts d'extraction :
+  crawl_http_requests_total{endpoint}                 requêtes envoyées (tentatives comprises)
+  crawl_http_responses_total{endpoint,statut}         réponses par statut HTTP ('reseau' = pas de réponse)
+  crawl_http_retries_total{endpoint}                  nouvelles tentatives
+  crawl_http_failures_total{endpoint}                 échecs définitifs
+  crawl_http_request_duration_seconds{endpoint}       latence (histogramme)
+  crawl_http_rate_limit{hote}                         débit autorisé par le limiteur (req/s)
+  crawl_cache_requests_total{cache,resultat}          accès aux caches (hit/miss)
+  crawl_queue_depth{file}                             profondeur des files du pipeline
+  crawl_db_write_duration_seconds                     durée des écritures SQLite (histogramme)
+  crawl_tasks_total{resultat}                         tâches du journal traitées
+
+Usage: python3 metriques.py <fichier.jsonl>   # Résumé du dernier instantané
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Bornes des histogrammes de durée (secondes)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+DESCRIPTIONS = {
+    'crawl_http_requests_total': ('counter', "Requêtes HTTP envoyées"),
+    'crawl_http_responses_total': ('counter', "Réponses HTTP par statut"),
+    'crawl_http_retries_total': ('counter', "Nouvelles tentatives HTTP"),
+    'crawl_http_failures_total': ('counter', "Échecs HTTP définitifs"),
+    'crawl_http_request_duration_seconds': ('histogram', "Latence des requêtes HTTP"),
+    'crawl_http_rate_limit': ('gauge', "Débit autorisé par le limiteur adaptatif (req/s)"),
+    'crawl_cache_requests_total': ('counter', "Accès aux caches"),
+    'crawl_queue_depth': ('gauge', "Profondeur des files du pipeline"),
+    'crawl_db_write_duration_seconds': ('histogram', "Durée des écritures SQLite"),
+    'crawl_tasks_total': ('counter', "Tâches du journal traitées"),
+}
+
+_lock = threading.Lock()
+_counters: Dict[str, Dict[Tuple, float]] = {}
+_gauges: Dict[str, Dict[Tuple, float]] = {}
+_histograms: Dict[str, Dict[Tuple, Dict]] = {}
+_last_snapshot: Optional[Dict] = None
+_started = time.time()
+
+
+def _key(labels: Dict) -> Tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    """Incrémente un compteur"""
+    key = _key(labels)
+    with _lock:
+        values = _counters.setdefault(name, {})
+        values[key] = values.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    """Fixe la valeur d'une jauge"""
+    with _lock:
+        _gauges.setdefault(name, {})[_key(labels)] = value
+
+
+def observe(name: str, value: float, **labels):
+    """Ajoute une observation à un histogramme"""
+    key = _key(labels)
+    with _lock:
+        values = _histograms.setdefault(name, {})
+        hist = values.get(key)
+        if hist is None:
+            hist = values[key] = {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                hist['buckets'][i] += 1
+                break
+        hist['sum'] += value
+        hist['count'] += 1
+
+
+def cache_access(cache: str, hit: bool):
+    """Enregistre un accès à un cache"""
+    inc('crawl_cache_requests_total', cache=cache, resultat='hit' if hit else 'miss')
+
+
+def reset():
+    """Remet toutes les métriques à zéro"""
+    global _last_snapshot, _started
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+        _last_snapshot = None
+        _started = time.time()
+
+
+def series(name: str) -> List[Tuple[Dict[str, str], object]]:
+    """Valeurs d'une métrique : [(labels, valeur)] (valeur = dict pour un histogramme)"""
+    with _lock:
+        if name in _histograms:
+            return [(dict(k), {**h, 'buckets': list(h['buckets'])}) for k, h in _histograms[name].items()]
+        values = _counters.get(name) or _gauges.get(name) or {}
+        return [(dict(k), v) for k, v in values.items()]
+
+
+def percentile(hist: Dict, q: float) -> Optional[float]:
+    """Percentile estimé depuis les buckets (borne supérieure du bucket atteint)"""
+    if not hist['count']:
+        return None
+    target = q * hist['count']
+    cumulative = 0
+    for bound, count in zip(BUCKETS, hist['buckets']):
+        cumulative += count
+        if cumulative >= target:
+            return bound
+    return float('inf')
+
+
+def snapshot() -> Dict:
+    """Instantané de toutes les métriques : {'ts', 'compteurs', 'jauges', 'histogrammes'}"""
+    def labels_str(key):
+        return ','.join(f"{k}={v}" for k, v in key)
+
+    with _lock:
+        counters = {name: {labels_str(k): v for k, v in values.items()} for name, values in _counters.items()}
+        gauges = {name: {labels_str(k): v for k, v in values.items()} for name, values in _gauges.items()}
+        histograms = {}
+        for name, values in _histograms.items():
+            histograms[name] = {}
+            for key, hist in values.items():
+                histograms[name][labels_str(key)] = {
+                    'count': hist['count'],
+                    'sum': hist['sum'],
+                    'p50': percentile(hist, 0.5),
+                    'p90': percentile(hist, 0.9),
+                    'p99': percentile(hist, 0.99),
+                }
+
+    return {'ts': time.time(), 'compteurs': counters, 'jauges': gauges, 'histogrammes': histograms}
+
+
+def rates(current: Dict, previous: Optional[Dict]) -> Dict[str, float]:
+    """Requêtes par seconde et par endpoint entre deux instantanés (depuis le démarrage sans précédent)"""
+    requests_now = current['compteurs'].get('crawl_http_requests_total', {})
+    previous = previous or {'ts': _started, 'compteurs': {}}
+    elapsed = current['ts'] - previous['ts']
+    requests_before = previous['compteurs'].get('crawl_http_requests_total', {})
+    if elapsed <= 0:
+        return {}
+    return {
+        labels: (value - requests_before.get(labels, 0)) / elapsed
+        for labels, value in requests_now.items()
+    }
+
+
+def cache_hit_rates(current: Dict) -> Dict[str, float]:
+    """Taux de succès de chaque cache"""
+    totals = {}
+    for labels, value in current['compteurs'].get('crawl_cache_requests_total', {}).items():
+        parts = dict(item.split('=', 1) for item in labels.split(','))
+        hits, total = totals.get(parts['cache'], (0, 0))
+        totals[parts['cache']] = (hits + (value if parts['resultat'] == 'hit' else 0), total + value)
+    return {cache: hits / total for cache, (hits, total) in totals.items() if total}
+
+
+def _prometheus_labels(key: Tuple, extra: str = '') -> str:
+    items = [f'{k}="{v}"' for k, v in key]
+    if extra:
+        items.append(extra)
+    return '{' + ','.join(items) + '}' if items else ''
+
+
+def to_prometheus() -> str:
+    """Toutes les métriques au format texte Prometheus"""
+    lines = []
+    with _lock:
+        names = sorted(set(_counters) | set(_gauges) | set(_histograms))
+        for name in names:
+            kind, help_text = DESCRIPTIONS.get(name, ('untyped', name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+            for values in (_counters.get(name, {}), _gauges.get(name, {})):
+                for key, value in sorted(values.items()):
+                    lines.append(f"{name}{_prometheus_labels(key)} {value}")
+
+            for key, hist in sorted(_histograms.get(name, {}).items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS, hist['buckets']):
+                    cumulative += count
+                    le = 'le="%s"' % bound
+                    lines.append(f"{name}_bucket{_prometheus_labels(key, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{name}_bucket{_prometheus_labels(key, le)} {hist['count']}")
+                lines.append(f"{name}_sum{_prometheus_labels(key)} {hist['sum']}")
+                lines.append(f"{name}_count{_prometheus_labels(key)} {hist['count']}")
+
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path: str):
+    """Écrit le fichier Prometheus de façon atomique (jamais lu à moitié écrit)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(to_prometheus())
+    os.replace(tmp_path, path)
+
+
+def append_jsonl(path: str) -> Dict:
+    """Ajoute un instantané (avec débits et taux de cache) au fichier JSON lines"""
+    global _last_snapshot
+
+    current = snapshot()
+    current['requetes_par_seconde'] = rates(current, _last_snapshot)
+    current['taux_cache'] = cache_hit_rates(current)
+    _last_snapshot = current
+
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(current, ensure_ascii=False) + '\n')
+    return current
+
+
+def start_exporter(prom_path: Optional[str] = None, jsonl_path: Optional[str] = None,
+                   interval: float = 15.0) -> Optional[threading.Event]:
+    """
+    Exporte périodiquement les métriques dans un thread de fond.
+    Retourne l'événement à positionner pour l'arrêter (un dernier export est fait à l'arrêt).
+    """
+    if not prom_path and not jsonl_path:
+        return None
+
+    stop = threading.Event()
+
+    def export():
+        if prom_path:
+            write_prometheus(prom_path)
+        if jsonl_path:
+            append_jsonl(jsonl_path)
+
+    def run():
+        while not stop.wait(interval):
+            export()
+        export()
+
+    threading.Thread(target=run, daemon=True, name='metriques').start()
+    return stop
+
+
+def print_summary(current: Optional[Dict] = None):
+    """Affiche un résumé : débits, latences, erreurs, caches, files"""
+    current = current or snapshot()
+    counters = current['compteurs']
+    histograms = current['histogrammes']
+
+    print(f"\n📈 MÉTRIQUES")
+
+    latencies = histograms.get('crawl_http_request_duration_seconds', {})
+    requests_total = counters.get('crawl_http_requests_total', {})
+    per_second = current.get('requetes_par_seconde', {})
+    for labels, count in sorted(requests_total.items()):
+        hist = latencies.get(labels, {})
+        rate = f", {per_second[labels]:.1f} req/s" if labels in per_second else ""
+        print(f"   • {labels.split('=', 1)[1]}: {count:.0f} requêtes{rate}, "
+              f"p50 ≤ {hist.get('p50')}s, p90 ≤ {hist.get('p90')}s, p99 ≤ {hist.get('p99')}s")
+
+    errors = {
+        labels: count for labels, count in counters.get('crawl_http_responses_total', {}).items()
+        if not labels.endswith('statut=200')
+    }
+    for labels, count in sorted(errors.items()):
+        print(f"   ⚠️  {labels}: {count:.0f}")
+    for labels, count in sorted(counters.get('crawl_http_retries_total', {}).items()):
+        print(f"   🔁 nouvelles tentatives {labels}: {count:.0f}")
+
+    for cache, rate in sorted(cache_hit_rates(current).items()):
+        print(f"   💾 cache {cache}: {rate * 100:.1f}% de succès")
+
+    for labels, depth in sorted(current['jauges'].get('crawl_queue_depth', {}).items()):
+        print(f"   📥 {labels}: {depth:.0f}")
+
+    writes = histograms.get('crawl_db_write_duration_seconds', {}).get('')
+    if writes:
+        print(f"   🗄️  écritures SQLite: {writes['count']} lots, {writes['sum']:.1f}s au total, p90 ≤ {writes['p90']}s")
+
+
+def main():
+    """Point d'entrée principal"""
+    if len(sys.argv) < 2:
+        print("\n❌ Usage: python3 metriques.py <fichier.jsonl>")
+        print("\nExemple: python3 metriques.py crawl_metrics.jsonl\n")
+        sys.exit(1)
+
+    last = None
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                last = json.loads(line)
+
+    if last is None:
+        print("❌ Aucun instantané dans le fichier")
+        return
+
+    print(f"Instantané du {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last['ts']))}")
+    print_summary(last)
+
+
+if __name__ == "__main__":
+    main()
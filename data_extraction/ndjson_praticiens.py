@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fichiers NDJSON de praticiens : un praticien (format de fetch_city.py) par ligne
+- NdjsonWriter    : écriture au fil de l'eau, chaque ligne vidée sur disque dès qu'elle est
+                    écrite ; un fichier existant est repris (les RPPS déjà écrits sont sautés,
+                    une dernière ligne tronquée par un arrêt brutal est retirée)
+- read_praticiens : lecture paresseuse d'un fichier NDJSON, ou d'un ancien fichier JSON
+                    {'ville', 'praticiens': [...]} (chargé en entier)
+
+Usage: python3 ndjson_praticiens.py <fichier.json> [sortie.ndjson]   # Convertit un ancien JSON
+"""
+
+import json
+import os
+import sys
+from typing import Dict, Iterator, Optional
+
+
+class NdjsonWriter:
+    """Écrivain NDJSON avec reprise (à utiliser comme gestionnaire de contexte)"""
+
+    def __init__(self, path: str, fsync: bool = False):
+        """
+        Args:
+            path: Fichier de sortie (repris s'il existe)
+            fsync: Forcer l'écriture physique de chaque ligne (plus lent, survit à une
+                   coupure de courant et pas seulement à l'arrêt du processus)
+        """
+        self.path = path
+        self.fsync = fsync
+        self.rpps = set()
+        self.fhir_ids = set()
+        self.ecrits = 0
+        self.repris = self._reprendre() if os.path.exists(path) else 0
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def _reprendre(self) -> int:
+        """Relit les lignes complètes du fichier existant et tronque la suite ; retourne leur nombre"""
+        count = 0
+        valid_end = 0
+        with open(self.path, 'rb+') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    prat = json.loads(line)
+                except ValueError:
+                    break
+                valid_end += len(line)
+                count += 1
+                self._noter(prat)
+            f.truncate(valid_end)
+        return count
+
+    def _noter(self, prat: Dict):
+        self.rpps.add(prat.get('rpps'))
+        if prat.get('fhir_id'):
+            self.fhir_ids.add(prat['fhir_id'])
+
+    def write(self, prat: Dict) -> bool:
+        """Écrit un praticien ; False s'il figure déjà dans le fichier (même RPPS)"""
+        if prat.get('rpps') in self.rpps:
+            return False
+        self.file.write(json.dumps(prat, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self._noter(prat)
+        self.ecrits += 1
+        return True
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_praticiens(path: str) -> Iterator[Dict]:
+    """Praticiens d'un fichier NDJSON (lus ligne à ligne) ou d'un ancien fichier JSON"""
+    with open(path, 'r', encoding='utf-8') as f:
+        first = f.readline()
+        try:
+            head = json.loads(first)
+        except ValueError:
+            head = None
+
+        # Ancien format : un seul document, indenté ou non
+        if not isinstance(head, dict) or 'praticiens' in head:
+            f.seek(0)
+            yield from json.load(f).get('praticiens', [])
+            return
+
+        yield head
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def convert(json_file: str, ndjson_file: Optional[str] = None) -> str:
+    """Convertit un ancien fichier JSON en NDJSON ; retourne le nom du fichier écrit"""
+    ndjson_file = ndjson_file or os.path.splitext(json_file)[0] + '.ndjson'
+    with NdjsonWriter(ndjson_file) as writer:
+        for prat in read_praticiens(json_file):
+            writer.write(prat)
+    print(f"✅ {writer.ecrits} praticiens écrits dans {ndjson_file}"
+          + (f" ({writer.repris} déjà présents)" if writer.repris else ""))
+    return ndjson_file
+
+
+def main():
+    """Point d'entrée principal"""
+    if len(sys.argv) < 2:
+        print("\n❌ Usage: python3 ndjson_praticiens.py <fichier.json> [sortie.ndjson]\n")
+        sys.exit(1)
+    convert(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,24 +8,14 @@ Exemples:
   - python3 populate.py 10 Paris    # Médecins de Paris
 """
 
-import requests
 import json
 import sys
-import time
 import sqlite3
 from typing import List, Dict, Optional
 from sm import get_spe
-
-# Configuration API
-API_URL = "https://gateway.api.esante.gouv.fr/fhir"
-API_KEY = "93f55893-96fa-4364-b558-9396fa2364d7"
-HEADERS = {
-    "ESANTE-API-KEY": API_KEY,
-    "Accept": "application/json"
-}
-
-# API de géocodage
-GEOCODING_API = "https://api-adresse.data.gouv.fr/search/"
+import ban_geocoder
+from api_client import GEOCODING_API, APIError, get_json, get_fhir
+from create_database import SANS_SPECIALITE, get_or_create_adresse, ids_par_code, migrate_adresses, migrate_cles
 
 # Mapping des codes profession
 PROFESSIONS = {
@@ -45,14 +35,13 @@ PROFESSIONS = {
 
 def geocode_address(address_complete: str) -> Dict[str, Optional[float]]:
     """Géocode une adresse pour obtenir latitude/longitude"""
+    # Base BAN locale en priorité (pas de réseau ni de quota)
+    coords = ban_geocoder.geocode_address(address_complete)
+    if coords['latitude'] is not None:
+        return coords
+    
     try:
-        response = requests.get(
-            GEOCODING_API,
-            params={'q': address_complete, 'limit': 1},
-            timeout=5
-        )
-        response.raise_for_status()
-        data = response.json()
+        data = get_json('geocoder', GEOCODING_API, params={'q': address_complete, 'limit': 1}, timeout=5)
         
         if data.get('features') and len(data['features']) > 0:
             coords = data['features'][0]['geometry']['coordinates']
@@ -60,8 +49,8 @@ def geocode_address(address_complete: str) -> Dict[str, Optional[float]]:
                 'longitude': coords[0],
                 'latitude': coords[1]
             }
-    except Exception:
-        pass
+    except APIError as e:
+        print(f"   ⚠️ Erreur géocodage: {e}")
     
     return {'longitude': None, 'latitude': None}
 
@@ -122,7 +111,6 @@ def get_full_address(addresses: List[Dict]) -> Optional[Dict]:
     # Géocoder l'adresse
     geocode_query = f"{' '.join(lines)} {postal} {city}"
     coords = geocode_address(geocode_query)
-    time.sleep(0.05)  # Petit délai pour ne pas surcharger l'API
     
     return {
         'ligne': ', '.join(lines),
@@ -150,13 +138,7 @@ def extract_codes(code_list: List[Dict]) -> List[Dict]:
 def get_practitioner_details(practitioner_id: str) -> Optional[Dict]:
     """Récupère les détails d'un praticien"""
     try:
-        response = requests.get(
-            f"{API_URL}/v2/Practitioner/{practitioner_id}",
-            headers=HEADERS,
-            timeout=30
-        )
-        response.raise_for_status()
-        practitioner = response.json()
+        practitioner = get_fhir('Practitioner', f"/{practitioner_id}")
         
         # Extraire les informations de base
         names = practitioner.get('name', [])
@@ -209,17 +191,12 @@ def get_organization_address(org_ref: str) -> Optional[Dict]:
     org_id = org_ref.split('/')[-1]
     
     try:
-        response = requests.get(
-            f"{API_URL}/v2/Organization/{org_id}",
-            headers=HEADERS,
-            timeout=30
-        )
-        response.raise_for_status()
-        org = response.json()
+        org = get_fhir('Organization', f"/{org_id}")
         
         return get_full_address(org.get('address', []))
         
-    except Exception:
+    except APIError as e:
+        print(f"   ⚠️ {e}")
         return None
 
 
@@ -235,17 +212,10 @@ def get_practitioners_in_city(city: str, profession_code: str) -> List[Dict]:
     print(f"📍 Recherche des organisations à {city}...")
     
     try:
-        response = requests.get(
-            f"{API_URL}/v2/Organization",
-            headers=HEADERS,
-            params={
-                'address-city': city,
-                '_count': 500
-            },
-            timeout=30
-        )
-        response.raise_for_status()
-        data = response.json()
+        data = get_fhir('Organization', params={
+            'address-city': city,
+            '_count': 500
+        })
         
         orgs = []
         for entry in data.get('entry', []):
@@ -272,17 +242,10 @@ def get_practitioners_in_city(city: str, profession_code: str) -> List[Dict]:
             print(f"   [{i}/{len(orgs)}] organisations traitées - {len(all_practitioners)} praticiens uniques")
         
         try:
-            response = requests.get(
-                f"{API_URL}/v2/PractitionerRole",
-                headers=HEADERS,
-                params={
-                    'organization': org['id'],
-                    '_count': 100
-                },
-                timeout=30
-            )
-            response.raise_for_status()
-            role_data = response.json()
+            role_data = get_fhir('PractitionerRole', params={
+                'organization': org['id'],
+                '_count': 100
+            })
             
             for entry in role_data.get('entry', []):
                 role = entry.get('resource', {})
@@ -295,10 +258,8 @@ def get_practitioners_in_city(city: str, profession_code: str) -> List[Dict]:
                         all_practitioners[pract_id] = []
                     all_practitioners[pract_id].append(org['ref'])
             
-            time.sleep(0.05)
-            
-        except Exception:
-            pass
+        except APIError as e:
+            print(f"   ⚠️ Praticiens de {org['name']} non récupérés: {e}")
     
     print(f"\n   ✅ {len(all_practitioners)} praticiens uniques trouvés\n")
     
@@ -336,6 +297,9 @@ def populate_database(profession_code: str, city: str, db_name: str = "praticien
         print("❌ La base de données n'existe pas. Lancez d'abord create_database.py")
         conn.close()
         return
+    migrate_adresses(conn)
+    migrate_cles(conn)
+    metier_id = ids_par_code(cursor, 'Metier', {profession_code: profession_name})[profession_code]
     
     print(f"🔄 Traitement des praticiens (détails + adresses + géocodage)...\n")
     
@@ -380,36 +344,22 @@ def populate_database(profession_code: str, city: str, db_name: str = "praticien
             continue
         
         # Déterminer la spécialité
-        spe_id = '0'
+        spe_code, spe_label = SANS_SPECIALITE
         if practitioner['specialites_sm'] and len(practitioner['specialites_sm']) > 0:
             code = practitioner['specialites_sm'][0]
-            spe_id = code[2:] if code.startswith('SM') else code
+            spe_code = code[2:] if code.startswith('SM') else code
             
-            # Ajouter la spécialité
+            # Libellé de la spécialité ajoutée
             try:
-                spe_label = get_spe(spe_id)
-                cursor.execute(
-                    "INSERT OR IGNORE INTO Specialite (spe_id, libelle) VALUES (?, ?)",
-                    (spe_id, spe_label)
-                )
+                spe_label = get_spe(spe_code)
             except Exception:
-                pass
+                spe_label = spe_code
         
         # Insérer dans la base
         try:
-            # Insérer l'adresse
-            cursor.execute("""
-                INSERT INTO Adresse (ligne, code_postal, ville, complete, latitude, longitude)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                valid_address['ligne'],
-                valid_address['code_postal'],
-                valid_address['ville'],
-                valid_address['complete'],
-                valid_address['latitude'],
-                valid_address['longitude']
-            ))
-            adresse_id = cursor.lastrowid
+            # Adresse partagée avec les autres praticiens du même lieu
+            adresse_id = get_or_create_adresse(cursor, valid_address)
+            spe_id = ids_par_code(cursor, 'Specialite', {spe_code: spe_label})[spe_code]
             
             # Insérer le praticien
             cursor.execute("""
@@ -420,7 +370,7 @@ def populate_database(profession_code: str, city: str, db_name: str = "praticien
                 practitioner['family'],
                 practitioner['given'],
                 practitioner['prefix'],
-                profession_code,
+                metier_id,
                 spe_id,
                 adresse_id
             ))
@@ -2,116 +2,200 @@
 # -*- coding: utf-8 -*-
 """
 Script pour interroger et vérifier la base de données praticiens_sante.db
-Usage: python3 query_db.py
+Usage: python3 query_db.py [--db base.db]                        # Rapport sur la base
+       python3 query_db.py [--db base.db] --stats [--json]       # Statistiques seules
+       python3 query_db.py [--db base.db] --recherche "muller nancy" [--json] [--limit 20]
+       python3 query_db.py [--db base.db] --bbox 6.1,48.6,6.3,48.75 [--metier 10 60] [--json]   # ouest,sud,est,nord
+       python3 query_db.py [--db base.db] --pres 48.69,6.18 --rayon 2 [--metier 10] [--json]
 """
 
-import sqlite3
+import argparse
+import math
+import os
 import json
+import sys
+from typing import Dict, List, Optional, Sequence
+
+from ban_geocoder import normaliser
+from create_database import SANS_SPECIALITE, SchemaPerime, connect_lecture, plier, verifier_schema
+
+# Poids bm25 des colonnes de l'index de recherche : nom, prénom, adresse
+POIDS_RECHERCHE = (10.0, 5.0, 1.0)
+
+RAYON_TERRE_KM = 6371.0
 
 
 def connect_db(db_name: str = "praticiens_sante.db"):
-    """Connexion à la base de données"""
-    return sqlite3.connect(db_name)
+    """Connexion à la base de données, en lecture seule (les migrations sont faites par les chargements)"""
+    return connect_lecture(db_name)
+
+
+def _table_existe(conn, nom: str) -> bool:
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (nom,))
+    return cursor.fetchone() is not None
+
+
+def _ensure_stats(conn):
+    """
+    Vérifie la présence des tables de statistiques (calculées par les chargements et les
+    migrations, voir create_database.create_stats_tables) : la lecture ne les crée pas.
+    Lève SchemaPerime si elles sont absentes.
+    """
+    if not _table_existe(conn, 'StatGlobal'):
+        raise SchemaPerime("Tables de statistiques absentes : migrez la base avec python3 create_database.py --migrer <base>")
+
+
+def general_counts(conn) -> Dict[str, int]:
+    """Totaux de la base : praticiens actifs et retirés, adresses (géocodées), spécialités, métiers"""
+    _ensure_stats(conn)
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT COALESCE(SUM(actifs), 0), COALESCE(SUM(retires), 0) FROM StatMetier")
+    praticiens, retires = cursor.fetchone()
+    cursor.execute("SELECT cle, valeur FROM StatGlobal")
+    globales = dict(cursor.fetchall())
+    cursor.execute("SELECT COUNT(*) FROM Specialite")
+    specialites = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM Metier")
+    metiers = cursor.fetchone()[0]
+    
+    return {
+        'praticiens': praticiens,
+        'retires': retires,
+        'adresses': globales.get('adresses', 0),
+        'adresses_geocodees': globales.get('adresses_geocodees', 0),
+        'specialites': specialites,
+        'metiers': metiers,
+    }
+
+
+def count_by_profession(conn) -> List[Dict]:
+    """Praticiens actifs par profession (metier_id : code du métier), du plus grand nombre au plus petit"""
+    _ensure_stats(conn)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT m.code, m.profession, s.actifs
+        FROM StatMetier s
+        JOIN Metier m ON m.metier_id = s.metier_id
+        WHERE s.actifs > 0
+        ORDER BY s.actifs DESC
+    """)
+    return [{'metier_id': metier_id, 'profession': profession, 'praticiens': count}
+            for metier_id, profession, count in cursor.fetchall()]
+
+
+def count_by_city(conn, limit: Optional[int] = 10) -> List[Dict]:
+    """Villes comptant le plus de praticiens actifs (accents et casse confondus)"""
+    _ensure_stats(conn)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT ville, actifs
+        FROM StatVille
+        WHERE actifs > 0 AND ville_cle != ''
+        ORDER BY actifs DESC
+        {'LIMIT ?' if limit else ''}
+    """, (limit,) if limit else ())
+    return [{'ville': ville, 'praticiens': count} for ville, count in cursor.fetchall()]
+
+
+def count_by_specialty(conn, limit: Optional[int] = 10) -> List[Dict]:
+    """Spécialités les plus représentées parmi les praticiens actifs (spe_id : code de la spécialité)"""
+    _ensure_stats(conn)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT sp.code, sp.libelle, s.actifs
+        FROM StatSpecialite s
+        JOIN Specialite sp ON sp.spe_id = s.spe_id
+        WHERE sp.code != ? AND s.actifs > 0
+        ORDER BY s.actifs DESC
+        {'LIMIT ?' if limit else ''}
+    """, (SANS_SPECIALITE[0], limit) if limit else (SANS_SPECIALITE[0],))
+    return [{'spe_id': spe_id, 'specialite': libelle, 'praticiens': count}
+            for spe_id, libelle, count in cursor.fetchall()]
+
+
+def count_by_department(conn) -> List[Dict]:
+    """Praticiens actifs par département (d'après le code postal)"""
+    _ensure_stats(conn)
+    cursor = conn.cursor()
+    cursor.execute("SELECT departement, actifs FROM StatDepartement WHERE actifs > 0 ORDER BY departement")
+    return [{'departement': departement, 'praticiens': count} for departement, count in cursor.fetchall()]
+
+
+def get_stats(conn, limit: Optional[int] = 10) -> Dict:
+    """Statistiques complètes (tables de statistiques : instantané quelle que soit la taille de la base)"""
+    return {
+        **general_counts(conn),
+        'par_profession': count_by_profession(conn),
+        'par_specialite': count_by_specialty(conn, limit),
+        'par_ville': count_by_city(conn, limit),
+        'par_departement': count_by_department(conn),
+    }
 
 
 def print_stats(conn):
     """Affiche les statistiques générales de la base"""
-    cursor = conn.cursor()
+    stats = general_counts(conn)
     
     print("\n" + "="*80)
     print("📊 STATISTIQUES GÉNÉRALES")
     print("="*80)
     
-    # Nombre total de praticiens
-    cursor.execute("SELECT COUNT(*) FROM Praticien")
-    total_prat = cursor.fetchone()[0]
-    print(f"\n   Total praticiens: {total_prat}")
+    # Nombre total de praticiens (hors retirés de l'annuaire)
+    print(f"\n   Total praticiens: {stats['praticiens']}")
+    if stats['retires']:
+        print(f"   Praticiens retirés de l'annuaire: {stats['retires']}")
     
-    # Nombre d'adresses
-    cursor.execute("SELECT COUNT(*) FROM Adresse")
-    total_addr = cursor.fetchone()[0]
+    # Adresses, dont géocodées
+    total_addr = stats['adresses']
     print(f"   Total adresses: {total_addr}")
+    pct = (stats['adresses_geocodees'] / total_addr * 100) if total_addr > 0 else 0
+    print(f"   Adresses géocodées: {stats['adresses_geocodees']} ({pct:.1f}%)")
     
-    # Adresses avec coordonnées GPS
-    cursor.execute("SELECT COUNT(*) FROM Adresse WHERE latitude IS NOT NULL AND longitude IS NOT NULL")
-    addr_geocoded = cursor.fetchone()[0]
-    pct = (addr_geocoded / total_addr * 100) if total_addr > 0 else 0
-    print(f"   Adresses géocodées: {addr_geocoded} ({pct:.1f}%)")
-    
-    # Nombre de spécialités
-    cursor.execute("SELECT COUNT(*) FROM Specialite")
-    total_spe = cursor.fetchone()[0]
-    print(f"   Total spécialités: {total_spe}")
-    
-    # Nombre de métiers
-    cursor.execute("SELECT COUNT(*) FROM Metier")
-    total_metier = cursor.fetchone()[0]
-    print(f"   Total métiers: {total_metier}")
+    # Nombre de spécialités et de métiers
+    print(f"   Total spécialités: {stats['specialites']}")
+    print(f"   Total métiers: {stats['metiers']}")
 
 
 def print_by_profession(conn):
     """Affiche la répartition par profession"""
-    cursor = conn.cursor()
-    
     print("\n" + "="*80)
     print("👥 RÉPARTITION PAR PROFESSION")
     print("="*80 + "\n")
     
-    cursor.execute("""
-        SELECT m.profession, COUNT(p.rpps) as count
-        FROM Metier m
-        LEFT JOIN Praticien p ON m.metier_id = p.metier_id
-        GROUP BY m.metier_id, m.profession
-        HAVING COUNT(p.rpps) > 0
-        ORDER BY count DESC
-    """)
-    
-    for profession, count in cursor.fetchall():
-        print(f"   • {profession}: {count}")
+    for row in count_by_profession(conn):
+        print(f"   • {row['profession']}: {row['praticiens']}")
 
 
 def print_by_city(conn):
     """Affiche la répartition par ville"""
-    cursor = conn.cursor()
-    
     print("\n" + "="*80)
     print("🏙️  RÉPARTITION PAR VILLE")
     print("="*80 + "\n")
     
-    cursor.execute("""
-        SELECT a.ville, COUNT(p.rpps) as count
-        FROM Adresse a
-        JOIN Praticien p ON a.adresse_id = p.adresse_id
-        GROUP BY a.ville
-        ORDER BY count DESC
-        LIMIT 10
-    """)
+    for row in count_by_city(conn, limit=10):
+        print(f"   • {row['ville']}: {row['praticiens']} praticiens")
+
+
+def print_by_department(conn):
+    """Affiche la répartition par département"""
+    print("\n" + "="*80)
+    print("🗺️  RÉPARTITION PAR DÉPARTEMENT")
+    print("="*80 + "\n")
     
-    for ville, count in cursor.fetchall():
-        print(f"   • {ville}: {count} praticiens")
+    for row in count_by_department(conn):
+        print(f"   • {row['departement']}: {row['praticiens']} praticiens")
 
 
 def print_top_specialties(conn):
     """Affiche les spécialités les plus représentées"""
-    cursor = conn.cursor()
-    
     print("\n" + "="*80)
     print("🏥 TOP 10 SPÉCIALITÉS")
     print("="*80 + "\n")
     
-    cursor.execute("""
-        SELECT s.libelle, COUNT(p.rpps) as count
-        FROM Specialite s
-        LEFT JOIN Praticien p ON s.spe_id = p.spe_id
-        WHERE s.spe_id != '0'
-        GROUP BY s.spe_id, s.libelle
-        HAVING COUNT(p.rpps) > 0
-        ORDER BY count DESC
-        LIMIT 10
-    """)
-    
-    for libelle, count in cursor.fetchall():
-        print(f"   • {libelle}: {count}")
+    for row in count_by_specialty(conn, limit=10):
+        print(f"   • {row['specialite']}: {row['praticiens']}")
 
 
 def show_sample_practitioners(conn, limit: int = 5):
@@ -133,6 +217,7 @@ def show_sample_practitioners(conn, limit: int = 5):
         JOIN Metier m ON p.metier_id = m.metier_id
         JOIN Specialite s ON p.spe_id = s.spe_id
         JOIN Adresse a ON p.adresse_id = a.adresse_id
+        WHERE p.retire_le IS NULL
         LIMIT ?
     """, (limit,))
     
@@ -151,29 +236,167 @@ def show_sample_practitioners(conn, limit: int = 5):
         print()
 
 
-def search_by_name(conn, nom: str):
-    """Recherche un praticien par nom"""
+def search_practitioners(conn, texte: str, limit: int = 20) -> List[Dict]:
+    """
+    Recherche des praticiens par nom, prénom ou adresse, sans tenir compte des accents
+    ni de la casse ("muller" trouve MÜLLER, "jean pierre nancy" trouve JEAN-PIERRE ... NANCY).
+    Chaque mot est cherché n'importe où dans les champs (préfixe ou sous-chaîne) ;
+    les résultats sont classés par pertinence, le nom comptant plus que l'adresse.
+    
+    Utilise l'index RecherchePraticien (voir create_database.create_search_index) ;
+    sans index (base non migrée), recherche séquentielle sur le nom et le prénom.
+    """
+    mots = plier(texte).split()
+    if not mots:
+        return []
     cursor = conn.cursor()
     
-    print("\n" + "="*80)
-    print(f"🔍 RECHERCHE: '{nom}'")
-    print("="*80 + "\n")
+    indexee = _table_existe(conn, 'RecherchePraticien')
+    # Trigrammes : l'index ne sert qu'aux mots d'au moins 3 caractères
+    longs = [mot for mot in mots if len(mot) >= 3]
     
-    cursor.execute("""
+    select = """
         SELECT 
             p.rpps, p.nom, p.prenom, p.civilite,
             m.profession,
             s.libelle as specialite,
-            a.complete
-        FROM Praticien p
-        JOIN Metier m ON p.metier_id = m.metier_id
-        JOIN Specialite s ON p.spe_id = s.spe_id
-        JOIN Adresse a ON p.adresse_id = a.adresse_id
-        WHERE UPPER(p.nom) LIKE UPPER(?)
-        LIMIT 20
-    """, (f'%{nom}%',))
+            a.complete, a.latitude, a.longitude
+    """
+    jointures = """
+        LEFT JOIN Metier m ON p.metier_id = m.metier_id
+        LEFT JOIN Specialite s ON p.spe_id = s.spe_id
+        LEFT JOIN Adresse a ON p.adresse_id = a.adresse_id
+    """
+    if indexee and longs:
+        # Mots courts ("57", "de", "l") : sous-chaîne du nom, du prénom ou de l'adresse
+        courts = [mot for mot in mots if len(mot) < 3]
+        filtre = ''.join(" AND (r.nom || ' ' || r.prenom || ' ' || COALESCE(r.adresse, '')) LIKE ?"
+                         for _ in courts)
+        # Chaque mot est une chaîne FTS5 entre guillemets (guillemets internes doublés)
+        correspondance = ' '.join('"' + mot.replace('"', '""') + '"' for mot in longs)
+        cursor.execute(f"""
+            {select}
+            FROM RecherchePraticien r
+            JOIN Praticien p ON p.rowid = r.rowid
+            {jointures}
+            WHERE RecherchePraticien MATCH ? {filtre} AND p.retire_le IS NULL
+            ORDER BY bm25(RecherchePraticien, {', '.join(map(str, POIDS_RECHERCHE))})
+            LIMIT ?
+        """, (correspondance, *(f'%{mot}%' for mot in courts), limit))
+    else:
+        filtre = ' AND '.join("(UPPER(p.nom) || ' ' || UPPER(p.prenom)) LIKE ?" for _ in mots)
+        cursor.execute(f"""
+            {select}
+            FROM Praticien p
+            {jointures}
+            WHERE {filtre} AND p.retire_le IS NULL
+            ORDER BY p.nom, p.prenom
+            LIMIT ?
+        """, (*(f'%{mot}%' for mot in mots), limit))
+    
+    colonnes = ('rpps', 'nom', 'prenom', 'civilite', 'profession', 'specialite',
+                'adresse', 'latitude', 'longitude')
+    return [dict(zip(colonnes, row)) for row in cursor.fetchall()]
+
+
+def practitioners_in_bbox(conn, ouest: float, sud: float, est: float, nord: float,
+                          metiers: Optional[Sequence[str]] = None, limit: Optional[int] = None) -> List[Dict]:
+    """
+    Praticiens actifs dont l'adresse géocodée est dans le rectangle (degrés WGS84),
+    éventuellement limités à des métiers (codes).
+    Utilise l'index GeoAdresse (voir create_database.create_spatial_index) ;
+    sans index (base non migrée), parcours de toutes les adresses.
+    """
+    params = [sud, nord, ouest, est]
+    if _table_existe(conn, 'GeoAdresse'):
+        source = """
+            FROM GeoAdresse g
+            CROSS JOIN Adresse a ON a.adresse_id = g.adresse_id
+            CROSS JOIN Praticien p ON p.adresse_id = a.adresse_id
+        """
+        filtre = "g.max_lat >= ? AND g.min_lat <= ? AND g.max_lon >= ? AND g.min_lon <= ? AND "
+        params = params * 2
+    else:
+        source = """
+            FROM Adresse a
+            JOIN Praticien p ON p.adresse_id = a.adresse_id
+        """
+        filtre = ""
+    if metiers:
+        filtre_metiers = f" AND p.metier_id IN (SELECT metier_id FROM Metier WHERE code IN ({', '.join('?' * len(metiers))}))"
+        params += list(metiers)
+    else:
+        filtre_metiers = ""
     
-    results = cursor.fetchall()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT 
+            p.rpps, p.nom, p.prenom, p.civilite,
+            m.code, m.profession,
+            a.adresse_id, a.complete, a.latitude, a.longitude
+        {source}
+        LEFT JOIN Metier m ON p.metier_id = m.metier_id
+        WHERE {filtre}a.latitude BETWEEN ? AND ? AND a.longitude BETWEEN ? AND ?
+          AND p.retire_le IS NULL{filtre_metiers}
+        {'LIMIT ?' if limit else ''}
+    """, (*params, limit) if limit else params)
+    
+    colonnes = ('rpps', 'nom', 'prenom', 'civilite', 'metier_id', 'profession',
+                'adresse_id', 'adresse', 'latitude', 'longitude')
+    return [dict(zip(colonnes, row)) for row in cursor.fetchall()]
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distance à vol d'oiseau (haversine)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlambda = phi2 - phi1, math.radians(lon2 - lon1)
+    h = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * RAYON_TERRE_KM * math.asin(math.sqrt(h))
+
+
+def practitioners_near(conn, lat: float, lon: float, rayon_km: float,
+                       metiers: Optional[Sequence[str]] = None, limit: Optional[int] = 20) -> List[Dict]:
+    """
+    Praticiens actifs à moins de rayon_km du point, du plus proche au plus éloigné
+    (champ distance_km). Rectangle englobant le cercle via l'index spatial, puis distance exacte.
+    """
+    dlat = math.degrees(rayon_km / RAYON_TERRE_KM)
+    dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    candidats = practitioners_in_bbox(conn, lon - dlon, lat - dlat, lon + dlon, lat + dlat, metiers)
+    
+    proches = []
+    for prat in candidats:
+        prat['distance_km'] = round(distance_km(lat, lon, prat['latitude'], prat['longitude']), 3)
+        if prat['distance_km'] <= rayon_km:
+            proches.append(prat)
+    proches.sort(key=lambda prat: prat['distance_km'])
+    return proches[:limit] if limit else proches
+
+
+def _print_praticiens_geo(titre: str, results: List[Dict]):
+    print("\n" + "="*80)
+    print(titre)
+    print("="*80 + "\n")
+    
+    if not results:
+        print("   ❌ Aucun praticien trouvé\n")
+        return
+    
+    print(f"   ✅ {len(results)} praticien(s) trouvé(s):\n")
+    for prat in results:
+        distance = f" ({prat['distance_km']} km)" if 'distance_km' in prat else ""
+        print(f"   • {prat['prenom']} {prat['nom']} - {prat['profession']}{distance}")
+        print(f"     {prat['adresse']} - GPS: {prat['latitude']}, {prat['longitude']}")
+    print()
+
+
+def search_by_name(conn, nom: str, limit: int = 20):
+    """Recherche un praticien par nom (voir search_practitioners)"""
+    print("\n" + "="*80)
+    print(f"🔍 RECHERCHE: '{nom}'")
+    print("="*80 + "\n")
+    
+    results = search_practitioners(conn, nom, limit)
     
     if not results:
         print(f"   ❌ Aucun praticien trouvé avec le nom '{nom}'\n")
@@ -181,35 +404,63 @@ def search_by_name(conn, nom: str):
     
     print(f"   ✅ {len(results)} praticien(s) trouvé(s):\n")
     
-    for rpps, nom, prenom, civilite, profession, specialite, adresse in results:
-        print(f"   • {civilite} {prenom} {nom}")
-        print(f"     {profession} - {specialite}")
-        print(f"     {adresse}")
-        print(f"     RPPS: {rpps}")
+    for prat in results:
+        print(f"   • {prat['civilite']} {prat['prenom']} {prat['nom']}")
+        print(f"     {prat['profession']} - {prat['specialite']}")
+        print(f"     {prat['adresse']}")
+        print(f"     RPPS: {prat['rpps']}")
         print()
 
 
+def metier_ids(conn, profession: str) -> List[int]:
+    """Clés des métiers d'une profession, sans tenir compte des accents ni de la casse"""
+    cle = normaliser(profession)
+    cursor = conn.cursor()
+    cursor.execute("SELECT metier_id, profession FROM Metier")
+    return [metier_id for metier_id, libelle in cursor.fetchall() if normaliser(libelle) == cle]
+
+
+def _par_ville(conn, select: str, profession: str, ville: str) -> List[tuple]:
+    """
+    Praticiens actifs d'une profession dans une ville (accents et casse ignorés), par nom.
+    Parcours indexé : Adresse.ville_cle -> Praticien(adresse_id, metier_id) ; sans
+    ville_cle (base non migrée, voir create_database.migrate_villes), parcours de Adresse.
+    """
+    metiers = metier_ids(conn, profession)
+    if not metiers:
+        return []
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_xinfo(Adresse)")
+    if 'ville_cle' in [row[1] for row in cursor.fetchall()]:
+        ville_cle = 'a.ville_cle'
+    else:
+        conn.create_function('normaliser', 1, normaliser, deterministic=True)
+        ville_cle = 'normaliser(a.ville)'
+    cursor.execute(f"""
+        {select}
+        FROM Adresse a
+        CROSS JOIN Praticien p ON p.adresse_id = a.adresse_id  -- CROSS : ville d'abord, quelles que soient les statistiques
+        JOIN Metier m ON p.metier_id = m.metier_id
+        LEFT JOIN Specialite s ON p.spe_id = s.spe_id
+        WHERE {ville_cle} = ? AND p.metier_id IN ({', '.join('?' * len(metiers))}) AND p.retire_le IS NULL
+        ORDER BY p.nom
+    """, (normaliser(ville), *metiers))
+    return cursor.fetchall()
+
+
 def get_practitioners_by_profession_and_city(conn, profession: str, ville: str):
     """Récupère les praticiens d'une profession dans une ville"""
-    cursor = conn.cursor()
     
     print("\n" + "="*80)
     print(f"🔍 {profession.upper()}S À {ville.upper()}")
     print("="*80 + "\n")
     
-    cursor.execute("""
+    results = _par_ville(conn, """
         SELECT 
             p.rpps, p.nom, p.prenom,
             a.ligne, a.code_postal,
             a.latitude, a.longitude
-        FROM Praticien p
-        JOIN Metier m ON p.metier_id = m.metier_id
-        JOIN Adresse a ON p.adresse_id = a.adresse_id
-        WHERE m.profession = ? AND UPPER(a.ville) = UPPER(?)
-        ORDER BY p.nom
-    """, (profession, ville))
-    
-    results = cursor.fetchall()
+    """, profession, ville)
     
     if not results:
         print(f"   ❌ Aucun {profession} trouvé à {ville}\n")
@@ -228,26 +479,21 @@ def get_practitioners_by_profession_and_city(conn, profession: str, ville: str):
 
 
 def export_to_json(conn, profession: str, ville: str, filename: str):
-    """Exporte les praticiens d'une profession/ville en JSON"""
-    cursor = conn.cursor()
-    
-    cursor.execute("""
+    """
+    Exporte les praticiens d'une profession/ville en JSON (résultat chargé en mémoire :
+    pour les gros volumes et les autres filtres, voir export_praticiens.py)
+    """
+    rows = _par_ville(conn, """
         SELECT 
             p.rpps, p.nom, p.prenom, p.civilite,
             m.profession,
             s.libelle as specialite,
             a.ligne, a.code_postal, a.ville,
             a.complete, a.latitude, a.longitude
-        FROM Praticien p
-        JOIN Metier m ON p.metier_id = m.metier_id
-        JOIN Specialite s ON p.spe_id = s.spe_id
-        JOIN Adresse a ON p.adresse_id = a.adresse_id
-        WHERE m.profession = ? AND UPPER(a.ville) = UPPER(?)
-        ORDER BY p.nom
-    """, (profession, ville))
+    """, profession, ville)
     
     praticiens = []
-    for row in cursor.fetchall():
+    for row in rows:
         rpps, nom, prenom, civilite, prof, spe, ligne, postal, ville_res, complete, lat, lon = row
         praticiens.append({
             'rpps': rpps,
@@ -279,19 +525,78 @@ def export_to_json(conn, profession: str, ville: str, filename: str):
 
 def main():
     """Point d'entrée principal"""
+    parser = argparse.ArgumentParser(description="Interroge la base des praticiens")
+    parser.add_argument('--db', default="praticiens_sante.db", help="Base SQLite")
+    parser.add_argument('--recherche', help="Recherche par nom, prénom ou adresse")
+    parser.add_argument('--json', action='store_true', help="Résultats de la recherche en JSON (pour l'API)")
+    parser.add_argument('--limit', type=int, default=20, help="Nombre maximal de résultats")
+    parser.add_argument('--bbox', help="Praticiens dans un rectangle : ouest,sud,est,nord (degrés)")
+    parser.add_argument('--pres', help="Praticiens proches d'un point : lat,lon")
+    parser.add_argument('--rayon', type=float, default=1.0, help="Rayon autour de --pres (km)")
+    parser.add_argument('--metier', nargs='+', help="Métiers (codes : 10, 60...) pour --bbox et --pres")
+    parser.add_argument('--stats', action='store_true', help="Statistiques seules (tables de statistiques)")
+    args = parser.parse_args()
+    
+    if not os.path.exists(args.db):
+        print(f"❌ Base introuvable: {args.db}", file=sys.stderr)
+        sys.exit(1)
+    
+    conn = connect_db(args.db)
+    try:
+        verifier_schema(conn)
+        _ensure_stats(conn)
+    except SchemaPerime as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+    
+    if args.stats:
+        if args.json:
+            print(json.dumps(get_stats(conn, args.limit), ensure_ascii=False))
+        else:
+            print_stats(conn)
+            print_by_profession(conn)
+            print_by_department(conn)
+            print_by_city(conn)
+            print_top_specialties(conn)
+        conn.close()
+        return
+    
+    if args.bbox or args.pres:
+        if args.bbox:
+            ouest, sud, est, nord = (float(v) for v in args.bbox.split(','))
+            results = practitioners_in_bbox(conn, ouest, sud, est, nord, args.metier, args.limit)
+            titre = f"🗺️  PRATICIENS DANS [{args.bbox}]"
+        else:
+            lat, lon = (float(v) for v in args.pres.split(','))
+            results = practitioners_near(conn, lat, lon, args.rayon, args.metier, args.limit)
+            titre = f"📍 PRATICIENS À MOINS DE {args.rayon} KM DE {lat}, {lon}"
+        if args.json:
+            print(json.dumps(results, ensure_ascii=False))
+        else:
+            _print_praticiens_geo(titre, results)
+        conn.close()
+        return
+    
+    if args.recherche is not None:
+        if args.json:
+            print(json.dumps(search_practitioners(conn, args.recherche, args.limit), ensure_ascii=False))
+        else:
+            search_by_name(conn, args.recherche, args.limit)
+        conn.close()
+        return
+    
     print("\n" + "="*80)
     print("🗄️  INTERROGATION DE LA BASE DE DONNÉES")
     print("="*80)
     
-    conn = connect_db()
-    
     # Statistiques générales
     print_stats(conn)
     
     # Répartition par profession
     print_by_profession(conn)
     
-    # Répartition par ville
+    # Répartition par département et par ville
+    print_by_department(conn)
     print_by_city(conn)
     
     # Top spécialités
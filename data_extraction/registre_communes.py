@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registre local des communes (base séparée de la base praticiens), partagé par
+list_communes.py, get_villes_raw.py et load_region_to_db.py
+- RegistreDepartement : départements (code, nom, région)
+- RegistreCommune     : communes (code INSEE, nom, département, région, population,
+                        centre, contour GeoJSON facultatif)
+- RegistreCodePostal  : codes postaux des communes (une commune peut en avoir plusieurs)
+- RegistreRegion      : régions chargées (date et source)
+
+Une région est chargée en une seule requête (/regions/{code}/communes) la première fois
+qu'elle est demandée, ou en masse depuis un fichier local ; ensuite tout est lu en base.
+
+Usage: python3 registre_communes.py                          # Régions chargées
+       python3 registre_communes.py "Grand Est" [--contours]  # (Re)charge une région
+       python3 registre_communes.py --toutes [--contours]     # (Re)charge toutes les régions
+       python3 registre_communes.py --fichier communes.json   # Charge un fichier geo.api
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from api_client import GEO_API, get_json
+
+# Base du registre (modifiable via la variable d'environnement COMMUNES_DB)
+COMMUNES_DB = os.environ.get('COMMUNES_DB', 'communes.db')
+
+# Codes région INSEE
+REGIONS = {
+    'Auvergne-Rhône-Alpes': '84',
+    'Bourgogne-Franche-Comté': '27',
+    'Bretagne': '53',
+    'Centre-Val de Loire': '24',
+    'Corse': '94',
+    'Grand Est': '44',
+    'Hauts-de-France': '32',
+    'Île-de-France': '11',
+    'Normandie': '28',
+    'Nouvelle-Aquitaine': '75',
+    'Occitanie': '76',
+    'Pays de la Loire': '52',
+    'Provence-Alpes-Côte d\'Azur': '93'
+}
+
+# Champs demandés à geo.api.gouv.fr (le contour alourdit fortement la réponse)
+FIELDS = 'nom,code,codesPostaux,codeDepartement,codeRegion,population,centre'
+
+
+def connect_registre(db_name: str = None) -> sqlite3.Connection:
+    """Connexion au registre, tables créées au besoin"""
+    conn = sqlite3.connect(db_name or COMMUNES_DB, timeout=60)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS RegistreDepartement (
+            code TEXT PRIMARY KEY,
+            nom TEXT,
+            region TEXT NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS RegistreCommune (
+            code TEXT PRIMARY KEY,
+            nom TEXT NOT NULL,
+            departement TEXT NOT NULL,
+            region TEXT NOT NULL,
+            population INTEGER,
+            latitude REAL,
+            longitude REAL,
+            contour TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_commune_region ON RegistreCommune(region)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_commune_departement ON RegistreCommune(departement)")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS RegistreCodePostal (
+            code_postal TEXT NOT NULL,
+            commune TEXT NOT NULL,
+            PRIMARY KEY (code_postal, commune)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_code_postal_commune ON RegistreCodePostal(commune)")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS RegistreRegion (
+            region TEXT PRIMARY KEY,
+            charge_le TEXT NOT NULL,
+            source TEXT NOT NULL
+        )
+    """)
+
+    conn.commit()
+    return conn
+
+
+def region_code(region_name: str) -> Optional[str]:
+    """Code INSEE d'une région (None si inconnue)"""
+    return REGIONS.get(region_name)
+
+
+def postal_prefix(dept_code: str) -> str:
+    """Préfixe de code postal d'un département (2A/2B -> 20)"""
+    return '20' if dept_code in ('2A', '2B') else dept_code
+
+
+def store_communes(conn, communes: Iterable[Dict], departements: Iterable[Dict] = (),
+                   region: Optional[str] = None, source: str = 'geo.api'):
+    """
+    Enregistre des communes au format geo.api.gouv.fr (remplace celles déjà présentes).
+    La région est celle de chaque commune (codeRegion), à défaut `region`.
+    Les régions concernées sont marquées chargées.
+    """
+    communes_rows = []
+    codes_postaux = []
+    depts = {d['code']: (d['code'], d.get('nom'), d.get('codeRegion') or region) for d in departements}
+
+    for c in communes:
+        code_region = c.get('codeRegion') or region
+        if not code_region or not c.get('codeDepartement'):
+            continue
+        lon, lat = (c.get('centre') or {}).get('coordinates') or (None, None)
+        contour = json.dumps(c['contour'], separators=(',', ':')) if c.get('contour') else None
+        communes_rows.append((c['code'], c['nom'], c['codeDepartement'], code_region,
+                              c.get('population'), lat, lon, contour))
+        codes_postaux.extend((cp, c['code']) for cp in c.get('codesPostaux', []))
+        depts.setdefault(c['codeDepartement'], (c['codeDepartement'], None, code_region))
+
+    cursor = conn.cursor()
+    cursor.executemany("""
+        INSERT INTO RegistreDepartement (code, nom, region) VALUES (?, ?, ?)
+        ON CONFLICT (code) DO UPDATE SET nom = COALESCE(excluded.nom, nom), region = excluded.region
+    """, list(depts.values()))
+
+    # Les communes fusionnées ou déplacées ne doivent pas survivre à un rechargement
+    regions = {row[3] for row in communes_rows}
+    for code_region in regions:
+        cursor.execute(
+            "DELETE FROM RegistreCodePostal WHERE commune IN (SELECT code FROM RegistreCommune WHERE region = ?)",
+            (code_region,)
+        )
+        cursor.execute("DELETE FROM RegistreCommune WHERE region = ?", (code_region,))
+
+    cursor.executemany("""
+        INSERT OR REPLACE INTO RegistreCommune
+            (code, nom, departement, region, population, latitude, longitude, contour)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, communes_rows)
+    cursor.executemany("INSERT OR IGNORE INTO RegistreCodePostal (code_postal, commune) VALUES (?, ?)", codes_postaux)
+    for code_region in regions:
+        cursor.execute("""
+            DELETE FROM RegistreDepartement
+            WHERE region = ? AND code NOT IN (SELECT departement FROM RegistreCommune WHERE region = ?)
+        """, (code_region, code_region))
+
+    now = datetime.now().isoformat(timespec='seconds')
+    cursor.executemany(
+        "INSERT OR REPLACE INTO RegistreRegion (region, charge_le, source) VALUES (?, ?, ?)",
+        [(code_region, now, source) for code_region in regions]
+    )
+    conn.commit()
+    return len(communes_rows)
+
+
+def fetch_region(conn, region_name: str, contours: bool = False) -> int:
+    """(Re)charge une région depuis geo.api.gouv.fr : départements puis toutes les communes en une requête"""
+    code = region_code(region_name)
+    departements = get_json('geo', f"{GEO_API}/departements", params={'codeRegion': code}, timeout=30)
+    communes = get_json(
+        'geo',
+        f"{GEO_API}/regions/{code}/communes",
+        params={'fields': FIELDS + (',contour' if contours else '')},
+        timeout=120
+    )
+    return store_communes(conn, communes, departements, region=code)
+
+
+def load_file(conn, path: str) -> int:
+    """
+    Charge un fichier de communes au format geo.api.gouv.fr : liste JSON (ex: réponse de
+    /communes?fields=...) ou NDJSON, chaque commune avec codeDepartement et codeRegion
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        head = f.read(1)
+        f.seek(0)
+        if head == '[':
+            communes = json.load(f)
+        else:
+            communes = [json.loads(line) for line in f if line.strip()]
+    return store_communes(conn, communes, source=os.path.basename(path))
+
+
+def is_loaded(conn, region_name: str) -> bool:
+    """La région figure-t-elle dans le registre ?"""
+    row = conn.execute("SELECT 1 FROM RegistreRegion WHERE region = ?", (region_code(region_name),)).fetchone()
+    return row is not None
+
+
+def ensure_region(conn, region_name: str):
+    """Charge la région depuis geo.api.gouv.fr si le registre ne la contient pas encore"""
+    if not is_loaded(conn, region_name):
+        # Sur la sortie d'erreur : la sortie standard de get_villes_raw.py reste exploitable
+        print(f"   🌐 {region_name} absente du registre : chargement depuis geo.api.gouv.fr...", file=sys.stderr)
+        count = fetch_region(conn, region_name)
+        print(f"   ✅ {count} communes ajoutées au registre", file=sys.stderr)
+
+
+def get_departements(conn, region_name: str) -> List[Dict]:
+    """Départements d'une région : [{'code', 'nom'}] (nom = code si inconnu)"""
+    ensure_region(conn, region_name)
+    rows = conn.execute(
+        "SELECT code, COALESCE(nom, code) AS nom FROM RegistreDepartement WHERE region = ? ORDER BY code",
+        (region_code(region_name),)
+    )
+    return [dict(row) for row in rows]
+
+
+def get_communes(conn, region_name: str, departement: Optional[str] = None,
+                 order: str = 'nom') -> List[Dict]:
+    """
+    Communes d'une région (ou d'un de ses départements), au format geo.api.gouv.fr :
+    [{'code', 'nom', 'codesPostaux', 'codeDepartement', 'population', 'centre'}]
+
+    Args:
+        order: 'nom' ou 'population' (les plus peuplées d'abord)
+    """
+    ensure_region(conn, region_name)
+    order_by = "c.population DESC, c.nom" if order == 'population' else "c.nom"
+    params = [region_code(region_name)]
+    where = "c.region = ?"
+    if departement:
+        where += " AND c.departement = ?"
+        params.append(departement)
+
+    rows = conn.execute(f"""
+        SELECT c.code, c.nom, c.departement, c.population, c.latitude, c.longitude,
+               GROUP_CONCAT(cp.code_postal) AS codes_postaux
+        FROM RegistreCommune c
+        LEFT JOIN RegistreCodePostal cp ON cp.commune = c.code
+        WHERE {where}
+        GROUP BY c.code
+        ORDER BY {order_by}
+    """, params)
+
+    return [{
+        'code': row['code'],
+        'nom': row['nom'],
+        'codesPostaux': sorted(row['codes_postaux'].split(',')) if row['codes_postaux'] else [],
+        'codeDepartement': row['departement'],
+        'population': row['population'] or 0,
+        'centre': {'type': 'Point', 'coordinates': [row['longitude'], row['latitude']]}
+                  if row['latitude'] is not None else None,
+    } for row in rows]
+
+
+def communes_by_postal_code(conn, code_postal: str) -> List[str]:
+    """Codes INSEE des communes desservies par un code postal"""
+    return [row[0] for row in conn.execute(
+        "SELECT commune FROM RegistreCodePostal WHERE code_postal = ?", (code_postal,)
+    )]
+
+
+def print_regions(conn):
+    """Régions chargées dans le registre"""
+    names = {code: name for name, code in REGIONS.items()}
+    rows = conn.execute("""
+        SELECT r.region, r.charge_le, r.source, COUNT(c.code) AS communes, SUM(c.population) AS population
+        FROM RegistreRegion r
+        LEFT JOIN RegistreCommune c ON c.region = r.region
+        GROUP BY r.region
+        ORDER BY r.region
+    """).fetchall()
+
+    print(f"\n🗺️  Registre des communes ({COMMUNES_DB}) : {len(rows)} région(s)\n")
+    for row in rows:
+        print(f"   - {names.get(row['region'], row['region']):30s} {row['communes']:>6} communes, "
+              f"{row['population'] or 0:>10,} hab. (chargée le {row['charge_le']}, {row['source']})")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Registre local des communes (geo.api.gouv.fr).")
+    parser.add_argument("region", nargs='?', help="Région à (re)charger")
+    parser.add_argument("--toutes", action='store_true', help="(Re)charger toutes les régions")
+    parser.add_argument("--fichier", default=None, help="Fichier de communes au format geo.api.gouv.fr")
+    parser.add_argument("--contours", action='store_true', help="Enregistrer aussi les contours des communes")
+    parser.add_argument("--db", default=None, help="Base du registre (défaut: COMMUNES_DB)")
+    args = parser.parse_args()
+
+    if args.region and args.region not in REGIONS:
+        print(f"❌ Région '{args.region}' non reconnue")
+        print(f"Régions disponibles: {', '.join(REGIONS.keys())}")
+        sys.exit(1)
+
+    conn = connect_registre(args.db)
+
+    if args.fichier:
+        print(f"📖 Chargement de {args.fichier}...")
+        print(f"   ✅ {load_file(conn, args.fichier)} communes enregistrées")
+
+    for region_name in (REGIONS if args.toutes else [args.region] if args.region else []):
+        print(f"🌐 {region_name}...", end=' ', flush=True)
+        print(f"{fetch_region(conn, region_name, contours=args.contours)} communes")
+
+    print_regions(conn)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
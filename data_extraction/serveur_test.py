@@ -0,0 +1,605 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serveur local imitant les APIs utilisées par les scripts d'extraction, pour mesurer le débit
+des crawls sans consommer les quotas de production :
+- /fhir/v2/Organization, PractitionerRole, Practitioner (recherche paginée, lecture, _include,
+                            _lastUpdated)
+- /adresse/search/          API Adresse (géocodage)
+- /geo/...                  geo.api.gouv.fr (régions, départements, communes)
+- /smt/CodeSystem/...       nomenclature des spécialités (sm.py), avec ETag et 304
+- /_stats                   compteurs du serveur (requêtes par ressource et par statut)
+- /_avancer                 passe à l'époque suivante (modifications de l'annuaire, voir ci-dessous)
+
+Les données sont synthétiques et déterministes (fonction de --seed et des identifiants) :
+chaque région a --departements départements, chaque département --communes communes, chaque
+commune 0 à --organisations organisations, chaque organisation 1 à --roles praticiens tirés
+d'un vivier départemental (un même praticien exerce dans plusieurs organisations).
+
+Évolution de l'annuaire : à chaque époque (/_avancer), une proportion --taux-modif des
+organisations (adresse), praticiens (identité, qualifications, désactivation) et rôles (clos)
+est modifiée, et de nouveaux praticiens arrivent dans certaines organisations. Chaque ressource
+porte meta.lastUpdated, la date de l'époque où elle a changé pour la dernière fois.
+
+Injection de pannes : latence (--latence, --gigue), erreurs 5xx (--taux-erreur) et limite de
+débit globale (--debit-max, réponses 429 avec Retry-After au-delà).
+
+Usage: python3 serveur_test.py [--port 8099] [--latence 50] [--taux-erreur 0.02] [--debit-max 100]
+Puis, dans le shell du crawler, les variables affichées au démarrage (ESANTE_API_URL, ...).
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+# Configuration par défaut (surchargée par make_server / la ligne de commande)
+CONFIG = {
+    'seed': 42,
+    'departements': 3,          # départements par région
+    'communes': 20,             # communes par département
+    'organisations': 4,         # organisations par commune (maximum)
+    'roles': 6,                 # praticiens par organisation (maximum)
+    'latence': 0.0,             # latence de base (ms)
+    'gigue': 0.0,               # latence aléatoire supplémentaire, moyenne (ms)
+    'taux_erreur': 0.0,         # proportion de réponses 500/502/503
+    'debit_max': 0.0,           # requêtes par seconde acceptées (0 = illimité)
+    'page_max': 500,            # _count maximal
+    'taux_modif': 0.05,         # proportion de ressources modifiées à chaque époque
+}
+
+# Codes utilisés par fetch_city.get_practitioner_details / load_json_to_db
+PROFESSIONS = ['10', '10', '10', '21', '40', '50', '60', '60', '70', '80', '91', '86', '96', '94']
+SPECIALITES = ['01', '02', '03', '04', '06', '07', '08', '09', '10', '11', '12', '13', '14', '15']
+# Version de la nomenclature servie (ETag de /smt/CodeSystem)
+CODE_SYSTEM_VERSION = '20240101'
+NOMS = ['Martin', 'Bernard', 'Thomas', 'Petit', 'Robert', 'Richard', 'Durand', 'Dubois', 'Moreau',
+        'Laurent', 'Simon', 'Michel', 'Lefebvre', 'Leroy', 'Roux', 'David', 'Bertrand', 'Morel']
+PRENOMS = ['Marie', 'Jean', 'Pierre', 'Nathalie', 'Isabelle', 'Philippe', 'Sophie', 'Nicolas',
+           'Camille', 'Julien', 'Claire', 'Thomas', 'Émilie', 'Antoine', 'Léa', 'Hugo']
+VOIES = ['rue de la République', 'avenue du Général de Gaulle', 'place Stanislas', 'rue Victor Hugo',
+         'boulevard Jean Jaurès', 'rue Pasteur', 'chemin des Vignes', 'allée des Tilleuls']
+
+# Codes région utilisés par geo.api.gouv.fr (parcours de tout l'annuaire)
+CODES_REGIONS = ('11', '24', '27', '28', '32', '44', '52', '53', '75', '76', '84', '93', '94')
+
+SYSTEM_PROFESSION = "https://mos.esante.gouv.fr/NOS/TRE_G15-ProfessionSante/FHIR/TRE-G15-ProfessionSante"
+SYSTEM_SPECIALITE = "https://mos.esante.gouv.fr/NOS/TRE_R38-SpecialiteOrdinale/FHIR/TRE-R38-SpecialiteOrdinale"
+EXT_NUMERO = "http://hl7.org/fhir/StructureDefinition/iso21090-ADXP-houseNumber"
+EXT_VOIE = "http://hl7.org/fhir/StructureDefinition/iso21090-ADXP-streetNameBase"
+
+
+# ---------------------------------------------------------------------------
+# Données synthétiques (pures fonctions des identifiants)
+# ---------------------------------------------------------------------------
+
+def _rng(config: Dict, *keys) -> random.Random:
+    """Générateur déterministe propre à une ressource"""
+    return random.Random(':'.join([str(config['seed'])] + [str(k) for k in keys]))
+
+
+def derniere_modif(config: Dict, *keys) -> int:
+    """Dernière époque où la ressource a changé (0 = version initiale)"""
+    for epoque in range(len(config.get('dates', [0])) - 1, 0, -1):
+        if _rng(config, 'modif', epoque, *keys).random() < config['taux_modif']:
+            return epoque
+    return 0
+
+
+def _meta(config: Dict, epoque: int) -> Dict:
+    """meta.lastUpdated d'une ressource modifiée pour la dernière fois à l'époque donnée"""
+    moment = datetime.fromtimestamp(config.get('dates', [0])[epoque], timezone.utc)
+    return {'lastUpdated': moment.strftime('%Y-%m-%dT%H:%M:%SZ')}
+
+
+def departements(config: Dict, region: str) -> List[Dict]:
+    """Départements d'une région (codes sur 2 chiffres, utilisables comme préfixe postal)"""
+    codes = []
+    for i in range(config['departements']):
+        code = f"{(int(region) * 3 + i) % 95 + 1:02d}"
+        if code == '20':
+            code = '2A'
+        codes.append({'nom': f"Département {code}", 'code': code, 'codeRegion': region})
+    return codes
+
+
+def communes(config: Dict, dept: str) -> List[Dict]:
+    """Communes d'un département"""
+    prefix = '20' if dept in ('2A', '2B') else dept
+    result = []
+    for j in range(1, config['communes'] + 1):
+        rng = _rng(config, 'commune', dept, j)
+        code = f"{dept}{j:03d}"
+        result.append({
+            'nom': f"Commune {code}",
+            'code': code,
+            'codesPostaux': [f"{prefix}{j:03d}"],
+            'codeDepartement': dept,
+            'population': int(rng.paretovariate(1.2) * 200),
+            'centre': {'type': 'Point', 'coordinates': _coordinates(f"{dept}{j:03d}")},
+        })
+    return result
+
+
+def _commune_from_code(config: Dict, code: str) -> Optional[Dict]:
+    dept, num = code[:-3], code[-3:]
+    if not num.isdigit() or not 1 <= int(num) <= config['communes']:
+        return None
+    return communes(config, dept)[int(num) - 1]
+
+
+def _coordinates(key: str) -> List[float]:
+    """Coordonnées stables dans l'hexagone à partir d'une clé quelconque"""
+    digest = hashlib.md5(key.encode('utf-8')).digest()
+    lon = -1.5 + 8.5 * int.from_bytes(digest[:4], 'big') / 2 ** 32
+    lat = 43.0 + 7.5 * int.from_bytes(digest[4:8], 'big') / 2 ** 32
+    return [round(lon, 6), round(lat, 6)]
+
+
+def organisations(config: Dict, commune: Dict) -> List[Dict]:
+    """Organisations (ressources FHIR) d'une commune ; certaines communes n'en ont aucune"""
+    rng = _rng(config, 'organisations', commune['code'])
+    count = rng.randint(0, config['organisations'])
+    return [organisation(config, f"org-{commune['code']}-{k}") for k in range(count)]
+
+
+def organisation(config: Dict, org_id: str) -> Optional[Dict]:
+    """Ressource Organization (None si l'id ne correspond à rien)"""
+    try:
+        _, code, _ = org_id.split('-')
+    except ValueError:
+        return None
+    commune = _commune_from_code(config, code)
+    if commune is None:
+        return None
+
+    # Une organisation modifiée change d'adresse
+    epoque = derniere_modif(config, 'organisation', org_id)
+    rng = _rng(config, 'organisation', org_id, *([epoque] if epoque else []))
+    numero = str(rng.randint(1, 150))
+    voie = rng.choice(VOIES)
+
+    address = {'postalCode': commune['codesPostaux'][0], 'city': commune['nom'].upper()}
+    # Comme l'annuaire : lignes structurées en extensions, ou ligne simple
+    if rng.random() < 0.8:
+        address['line'] = [None]
+        address['_line'] = [{'extension': [
+            {'url': EXT_NUMERO, 'valueString': numero},
+            {'url': EXT_VOIE, 'valueString': voie},
+        ]}]
+    else:
+        address['line'] = [f"{numero} {voie}"]
+
+    return {
+        'resourceType': 'Organization',
+        'id': org_id,
+        'meta': _meta(config, epoque),
+        'name': f"Cabinet {rng.choice(NOMS)} {code}",
+        'address': [address],
+    }
+
+
+def praticiens_organisation(config: Dict, org_id: str) -> List[str]:
+    """Ids des praticiens d'une organisation, tirés du vivier du département"""
+    dept = org_id.split('-')[1][:-3]
+    pool = max(1, config['communes'] * config['organisations'] * config['roles'] // 4)
+    rng = _rng(config, 'roles', org_id)
+    count = rng.randint(1, config['roles'])
+    ids = {f"pra-{dept}-{rng.randrange(pool)}" for _ in range(count)}
+    # Arrivées : nouveau praticien 'pra-<dept>-n<époque>x<org>' dans l'organisation
+    for epoque in range(1, len(config.get('dates', [0]))):
+        if _rng(config, 'arrivee', epoque, org_id).random() < config['taux_modif']:
+            ids.add(f"pra-{dept}-n{epoque}x{org_id.split('-')[1]}{org_id.split('-')[2]}")
+    return sorted(ids)
+
+
+def role(config: Dict, org_id: str, pract_id: str) -> Dict:
+    """Ressource PractitionerRole (un rôle modifié est clos une fois sur deux)"""
+    numero = pract_id.split('-')[-1]
+    creation = int(numero[1:].split('x')[0]) if numero.startswith('n') else 0
+    epoque = max(creation, derniere_modif(config, 'role', org_id, pract_id))
+    clos = epoque > creation and _rng(config, 'clos', epoque, org_id, pract_id).random() < 0.5
+    return {
+        'resourceType': 'PractitionerRole',
+        'id': f"role-{org_id}-{pract_id}",
+        'meta': _meta(config, epoque),
+        'active': not clos,
+        'practitioner': {'reference': f"Practitioner/{pract_id}"},
+        'organization': {'reference': f"Organization/{org_id}"},
+    }
+
+
+def praticien(config: Dict, pract_id: str) -> Optional[Dict]:
+    """Ressource Practitioner (None si l'id ne correspond à rien)"""
+    if not pract_id.startswith('pra-'):
+        return None
+
+    # Un praticien modifié change d'identité et de qualifications, et se désactive parfois
+    epoque = derniere_modif(config, 'praticien', pract_id)
+    rng = _rng(config, 'praticien', pract_id, *([epoque] if epoque else []))
+    profession = rng.choice(PROFESSIONS)
+    qualifications = [{'code': {'coding': [{'system': SYSTEM_PROFESSION, 'code': profession}]}}]
+    if profession == '10':
+        qualifications.append({'code': {'coding': [{'system': SYSTEM_SPECIALITE, 'code': f"SM{rng.choice(SPECIALITES)}"}]}})
+
+    identifiers = [{
+        'type': {'coding': [{'code': 'RPPS'}]},
+        'value': f"10{int(hashlib.md5(pract_id.encode('utf-8')).hexdigest()[:12], 16) % 10 ** 9:09d}",
+    }]
+    # Quelques praticiens sans RPPS, ignorés par le crawler
+    if rng.random() < 0.03:
+        identifiers = []
+
+    return {
+        'resourceType': 'Practitioner',
+        'id': pract_id,
+        'meta': _meta(config, epoque),
+        'active': not epoque or rng.random() >= 0.2,
+        'identifier': identifiers,
+        'name': [{
+            'family': rng.choice(NOMS).upper(),
+            'given': [rng.choice(PRENOMS)],
+            'prefix': [rng.choice(['MME', 'M', 'DR'])],
+        }],
+        'qualification': qualifications,
+    }
+
+
+def code_system() -> Dict:
+    """Nomenclature TRE-A02 réduite aux spécialités générées"""
+    return {
+        'resourceType': 'CodeSystem',
+        'version': CODE_SYSTEM_VERSION,
+        'concept': [{'code': f"G15_10/SM{code}", 'display': f"Spécialité {code}"} for code in SPECIALITES],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Recherches FHIR
+# ---------------------------------------------------------------------------
+
+def search_organisations(config: Dict, params: Dict[str, str]) -> List[Dict]:
+    """Recherche par address-city (égalité sans casse) ou address-postalcode (commence par)"""
+    if 'address-city' in params:
+        code = params['address-city'].strip().split(' ')[-1].upper()
+        commune = _commune_from_code(config, code)
+        if commune is None or commune['nom'].upper() != params['address-city'].strip().upper():
+            return []
+        return organisations(config, commune)
+
+    if 'address-postalcode' in params:
+        prefix = params['address-postalcode']
+        dept = '2A' if prefix.startswith('20') else prefix[:2]
+        orgs = []
+        for commune in communes(config, dept):
+            if commune['codesPostaux'][0].startswith(prefix):
+                orgs.extend(organisations(config, commune))
+        return orgs
+
+    return []
+
+
+def search_roles(config: Dict, params: Dict[str, str]) -> Tuple[List[Dict], List[Dict]]:
+    """Recherche par organization ou practitioner ; retourne (rôles, ressources incluses)"""
+    roles = []
+    if 'organization' in params:
+        org_id = params['organization'].split('/')[-1]
+        if organisation(config, org_id) is not None:
+            roles = [role(config, org_id, pract_id) for pract_id in praticiens_organisation(config, org_id)]
+    elif 'practitioner' in params:
+        # Parcours du département du praticien (serveur de test : pas d'index inverse)
+        pract_id = params['practitioner'].split('/')[-1]
+        parts = pract_id.split('-')
+        if len(parts) == 3:
+            for commune in communes(config, parts[1]):
+                for org in organisations(config, commune):
+                    if pract_id in praticiens_organisation(config, org['id']):
+                        roles.append(role(config, org['id'], pract_id))
+    elif '_lastUpdated' in params:
+        roles = tous_roles(config)
+    roles = filtre_maj(roles, params)
+
+    included = []
+    includes = params.get('_include', '')
+    if 'PractitionerRole:practitioner' in includes:
+        ids = sorted({r['practitioner']['reference'].split('/')[-1] for r in roles})
+        included.extend(praticien(config, pract_id) for pract_id in ids)
+    if 'PractitionerRole:organization' in includes:
+        ids = sorted({r['organization']['reference'].split('/')[-1] for r in roles})
+        included.extend(organisation(config, org_id) for org_id in ids)
+
+    return roles, included
+
+
+def tous_roles(config: Dict) -> List[Dict]:
+    """Tous les rôles de l'annuaire (recherches sans critère de lieu)"""
+    return [
+        role(config, org['id'], pract_id)
+        for region in CODES_REGIONS
+        for dept in departements(config, region)
+        for commune in communes(config, dept['code'])
+        for org in organisations(config, commune)
+        for pract_id in praticiens_organisation(config, org['id'])
+    ]
+
+
+def search_praticiens(config: Dict, params: Dict[str, str]) -> List[Dict]:
+    """Recherche de praticiens (seul critère géré : _lastUpdated, sur tout l'annuaire)"""
+    if '_lastUpdated' not in params:
+        return []
+    ids = sorted({r['practitioner']['reference'].split('/')[-1] for r in tous_roles(config)})
+    return filtre_maj([praticien(config, pract_id) for pract_id in ids], params)
+
+
+def filtre_maj(resources: List[Dict], params: Dict[str, str]) -> List[Dict]:
+    """Filtre _lastUpdated=gt|ge|lt|le<instant> (sans préfixe : égalité à la seconde)"""
+    value = params.get('_lastUpdated')
+    if not value:
+        return resources
+    prefix, instant = (value[:2], value[2:]) if value[:2] in ('gt', 'ge', 'lt', 'le') else ('eq', value)
+    limit = datetime.fromisoformat(instant.replace('Z', '+00:00'))
+    tests = {
+        'gt': lambda d: d > limit, 'ge': lambda d: d >= limit,
+        'lt': lambda d: d < limit, 'le': lambda d: d <= limit, 'eq': lambda d: d == limit,
+    }
+    return [
+        r for r in resources
+        if tests[prefix](datetime.fromisoformat(r['meta']['lastUpdated'].replace('Z', '+00:00')))
+    ]
+
+
+def bundle(base_url: str, params: Dict[str, str], matches: List[Dict], included: List[Dict],
+           page_max: int) -> Dict:
+    """Bundle searchset paginé (_count/_offset) avec lien 'next'"""
+    count = min(int(params.get('_count', 50)), page_max)
+    offset = int(params.get('_offset', 0))
+    page = matches[offset:offset + count]
+
+    # Ressources incluses : seulement celles référencées par la page
+    references = {
+        ref for resource in page
+        for ref in (resource.get('practitioner', {}).get('reference'), resource.get('organization', {}).get('reference'))
+        if ref
+    }
+    entries = [{'resource': r, 'search': {'mode': 'match'}} for r in page]
+    entries += [
+        {'resource': r, 'search': {'mode': 'include'}}
+        for r in included if f"{r['resourceType']}/{r['id']}" in references
+    ]
+
+    links = [{'relation': 'self', 'url': f"{base_url}?{urlencode(params)}"}]
+    if offset + count < len(matches):
+        links.append({'relation': 'next', 'url': f"{base_url}?{urlencode({**params, '_offset': offset + count})}"})
+
+    return {'resourceType': 'Bundle', 'type': 'searchset', 'total': len(matches), 'link': links, 'entry': entries}
+
+
+# ---------------------------------------------------------------------------
+# Serveur
+# ---------------------------------------------------------------------------
+
+class Handler(BaseHTTPRequestHandler):
+    """Routage des requêtes et injection de pannes"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        config = server.config
+        url = urlparse(self.path)
+        params = {k: ','.join(v) if k == '_include' else v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [p for p in url.path.split('/') if p]
+        resource = parts[2] if parts[:2] == ['fhir', 'v2'] and len(parts) > 2 else (parts[0] if parts else '')
+
+        if parts == ['_stats']:
+            return self._send(200, server.get_stats(), resource)
+        if parts == ['_avancer']:
+            return self._send(200, {'epoque': server.avancer()}, resource)
+
+        # Limite de débit globale
+        if config['debit_max'] and not server.take_token():
+            return self._send(429, {'error': 'Too Many Requests'}, resource, {'Retry-After': '1'})
+
+        delay = config['latence'] / 1000
+        if config['gigue']:
+            delay += server.random('expovariate', 1000 / config['gigue'])
+        if delay:
+            time.sleep(delay)
+
+        if config['taux_erreur'] and server.random('random') < config['taux_erreur']:
+            return self._send(server.random('choice', (500, 502, 503)), {'error': 'injected'}, resource)
+
+        # Nomenclature : ETag = version, réponse 304 aux requêtes conditionnelles à jour
+        if parts[:2] == ['smt', 'CodeSystem']:
+            etag = f'"{CODE_SYSTEM_VERSION}"'
+            if self.headers.get('If-None-Match') == etag:
+                return self._send(304, None, resource, {'ETag': etag})
+            return self._send(200, code_system(), resource, {'ETag': etag})
+
+        try:
+            status, body = self._route(config, parts, params, url.path)
+        except (ValueError, IndexError) as e:
+            status, body = 400, {'error': str(e)}
+        self._send(status, body, resource)
+
+    def _route(self, config: Dict, parts: List[str], params: Dict[str, str], path: str):
+        base_url = f"http://{self.headers.get('Host')}{path}"
+
+        if parts[:2] == ['fhir', 'v2'] and len(parts) in (3, 4):
+            resource = parts[2]
+            if len(parts) == 4:
+                found = {
+                    'Organization': organisation,
+                    'Practitioner': praticien,
+                }.get(resource, lambda c, i: None)(config, parts[3])
+                return (200, found) if found else (404, {'resourceType': 'OperationOutcome'})
+
+            if resource == 'Organization':
+                orgs = filtre_maj(search_organisations(config, params), params)
+                return 200, bundle(base_url, params, orgs, [], config['page_max'])
+            if resource == 'Practitioner':
+                return 200, bundle(base_url, params, search_praticiens(config, params), [], config['page_max'])
+            if resource == 'PractitionerRole':
+                roles, included = search_roles(config, params)
+                return 200, bundle(base_url, params, roles, included, config['page_max'])
+
+        if parts[:2] == ['adresse', 'search']:
+            query = params.get('q', '')
+            if not query.strip():
+                return 400, {'error': 'q required'}
+            return 200, {'type': 'FeatureCollection', 'features': [{
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': _coordinates(query.lower())},
+                'properties': {'label': query, 'score': 0.9},
+            }]}
+
+        if parts and parts[0] == 'geo':
+            fields = params.get('fields', 'nom,code').split(',')
+            if parts[1:] == ['regions']:
+                return 200, [{'nom': f"Région {code}", 'code': code} for code in CODES_REGIONS]
+            if parts[1:] == ['departements']:
+                return 200, departements(config, params['codeRegion'])
+            if len(parts) == 4 and parts[1] == 'departements' and parts[3] == 'communes':
+                return 200, [{k: c[k] for k in fields if k in c} for c in communes(config, parts[2])]
+            if len(parts) == 4 and parts[1] == 'regions' and parts[3] == 'communes':
+                return 200, [{k: c[k] for k in fields if k in c}
+                             for d in departements(config, parts[2]) for c in communes(config, d['code'])]
+
+        return 404, {'error': f"not found: {path}"}
+
+    def _send(self, status: int, body, resource: str, headers: Optional[Dict] = None):
+        self.server.record(resource, status)
+        payload = b'' if body is None else json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Serveur multi-thread avec configuration, compteurs et seau à jetons partagés"""
+
+    daemon_threads = True
+
+    def __init__(self, address, config: Dict):
+        super().__init__(address, Handler)
+        self.config = config
+        self.lock = threading.Lock()
+        self.rng = random.Random(config['seed'])
+        self.stats = {}
+        self.tokens = config['debit_max']
+        self.last_refill = time.monotonic()
+
+    def random(self, method: str, *args):
+        with self.lock:
+            return getattr(self.rng, method)(*args)
+
+    def take_token(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            rate = self.config['debit_max']
+            self.tokens = min(rate, self.tokens + (now - self.last_refill) * rate)
+            self.last_refill = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def avancer(self) -> int:
+        """Passe à l'époque suivante, datée de maintenant ; retourne son numéro"""
+        with self.lock:
+            self.config['dates'] = self.config['dates'] + [time.time()]
+            return len(self.config['dates']) - 1
+
+    def record(self, resource: str, status: int):
+        with self.lock:
+            by_status = self.stats.setdefault(resource, {})
+            by_status[status] = by_status.get(status, 0) + 1
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {resource: {str(k): v for k, v in s.items()} for resource, s in self.stats.items()}
+
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def environment(self) -> Dict[str, str]:
+        return environment(self.base_url())
+
+
+def environment(base_url: str) -> Dict[str, str]:
+    """Variables d'environnement pointant les scripts d'extraction vers un serveur de test"""
+    base = base_url.rstrip('/')
+    return {
+        'ESANTE_API_URL': f"{base}/fhir",
+        'GEOCODING_API_URL': f"{base}/adresse/search/",
+        'GEO_API_URL': f"{base}/geo",
+        'SMT_API_URL': f"{base}/smt",
+    }
+
+
+def make_server(host: str = '127.0.0.1', port: int = 0, **options) -> StandInServer:
+    """Crée le serveur (port 0 = port libre) ; options = clés de CONFIG"""
+    unknown = set(options) - set(CONFIG)
+    if unknown:
+        raise ValueError(f"Options inconnues: {', '.join(sorted(unknown))}")
+    return StandInServer((host, port), {**CONFIG, **options, 'dates': [time.time()]})
+
+
+def start_in_thread(**options) -> StandInServer:
+    """Démarre le serveur dans un thread de fond (pour les tests de charge)"""
+    server = make_server(**options)
+    threading.Thread(target=server.serve_forever, daemon=True, name='serveur_test').start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur local imitant l'annuaire santé FHIR et l'API Adresse.")
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--seed", type=int, default=CONFIG['seed'], help="Graine des données synthétiques")
+    parser.add_argument("--departements", type=int, default=CONFIG['departements'], help="Départements par région")
+    parser.add_argument("--communes", type=int, default=CONFIG['communes'], help="Communes par département")
+    parser.add_argument("--organisations", type=int, default=CONFIG['organisations'], help="Organisations par commune (max)")
+    parser.add_argument("--roles", type=int, default=CONFIG['roles'], help="Praticiens par organisation (max)")
+    parser.add_argument("--latence", type=float, default=CONFIG['latence'], help="Latence de base (ms)")
+    parser.add_argument("--gigue", type=float, default=CONFIG['gigue'], help="Latence aléatoire moyenne ajoutée (ms)")
+    parser.add_argument("--taux-erreur", type=float, default=CONFIG['taux_erreur'], help="Proportion de réponses 5xx")
+    parser.add_argument("--debit-max", type=float, default=CONFIG['debit_max'], help="Requêtes/s acceptées (0 = illimité)")
+    parser.add_argument("--taux-modif", type=float, default=CONFIG['taux_modif'], help="Ressources modifiées par époque")
+    args = parser.parse_args()
+
+    options = {key: value for key, value in vars(args).items() if key in CONFIG}
+    server = make_server(args.host, args.port, **options)
+
+    print(f"\n🧪 Serveur de test sur {server.base_url()}")
+    print(f"   {args.departements} départements/région, {args.communes} communes/département, "
+          f"latence {args.latence:.0f} ms (+{args.gigue:.0f}), {args.taux_erreur * 100:.1f}% d'erreurs, "
+          f"débit max {args.debit_max or '∞'} req/s")
+    print("\nPour y pointer les scripts d'extraction :")
+    for key, value in server.environment().items():
+        print(f"   export {key}={value}")
+    print(f"\nCompteurs: {server.base_url()}/_stats, époque suivante: {server.base_url()}/_avancer  (Ctrl+C pour arrêter)\n")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.get_stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Puits des praticiens résolus par le crawler (format de fetch_city.py)
+- SqliteSink : écriture directe dans la base, par lots (executemany), depuis un thread
+               écrivain unique alimenté par une file bornée
+- NdjsonSink : fichier NDJSON, un praticien par ligne (débogage, ou chargement différé
+               avec load_json_to_db.py)
+- TeeSink    : plusieurs puits à la fois (ex: base + NDJSON de contrôle)
+
+Tous les puits ont la même interface, utilisable depuis plusieurs threads :
+    sink.write(prat, source)  # source : clé de regroupement (ex: id de la tâche du crawl)
+    sink.sync(source)         # attend que les praticiens de la source soient écrits ;
+                              # retourne {'inseres', 'doublons', 'erreurs'} pour cette source
+    sink.close()
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, Hashable, Optional
+
+import metriques
+from create_database import ids_par_code
+from load_json_to_db import to_batch_row, write_batch
+from ndjson_praticiens import NdjsonWriter
+
+# Praticiens par transaction
+SINK_BATCH = 500
+# Délai maximal avant l'écriture d'un lot incomplet (secondes)
+SINK_INTERVAL = 1.0
+# Praticiens en attente d'écriture au-delà desquels write() bloque
+SINK_QUEUE = 5000
+
+_PRATICIEN, _SYNC, _STOP = 'praticien', 'sync', 'stop'
+
+
+def _empty_stats() -> Dict[str, int]:
+    return {'inseres': 0, 'doublons': 0, 'erreurs': 0}
+
+
+class SinkError(Exception):
+    """Écriture impossible des praticiens d'une source"""
+
+
+class SqliteSink:
+    """Écrit les praticiens dans la base par lots, depuis un thread écrivain unique"""
+
+    def __init__(self, db_name: str, batch_size: int = SINK_BATCH, interval: float = SINK_INTERVAL):
+        self.db_name = db_name
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = queue.Queue(maxsize=SINK_QUEUE)
+        self.fatal = None
+        self.thread = threading.Thread(target=self._run, daemon=True, name='sqlite_sink')
+        self.thread.start()
+
+    def _put(self, item):
+        """Met en file, sans rester bloqué si le thread écrivain s'est arrêté"""
+        while True:
+            if not self.thread.is_alive():
+                raise SinkError(f"thread écrivain arrêté: {self.fatal}")
+            try:
+                self.queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+    def write(self, prat: Dict, source: Hashable = None):
+        """Met un praticien en file d'écriture (bloque si l'écrivain a trop de retard)"""
+        self._put((_PRATICIEN, source, prat))
+
+    def sync(self, source: Hashable = None) -> Dict[str, int]:
+        """Écrit tout ce qui est en file et retourne les compteurs de la source (SinkError si échec)"""
+        done = threading.Event()
+        box = {}
+        self._put((_SYNC, source, (done, box)))
+        while not done.wait(1):
+            if not self.thread.is_alive():
+                raise SinkError(f"thread écrivain arrêté: {self.fatal}")
+        if 'erreur' in box:
+            raise SinkError(box['erreur'])
+        return box['stats']
+
+    def close(self):
+        """Écrit ce qui reste et arrête le thread écrivain"""
+        if self.thread.is_alive():
+            self._put((_STOP, None, None))
+        self.thread.join()
+        if self.fatal:
+            raise SinkError(f"thread écrivain arrêté: {self.fatal}")
+
+    def _run(self):
+        try:
+            self._write_loop()
+        except Exception as e:
+            self.fatal = e
+
+    def _write_loop(self):
+        # Connexion propre au thread écrivain : seul écrivain de la base
+        conn = sqlite3.connect(self.db_name, timeout=60)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+
+        lot = []
+        stats = {}
+        erreurs = {}
+        last_flush = time.monotonic()
+
+        def flush():
+            if not lot:
+                return
+            start_time = time.time()
+            cursor = conn.cursor()
+            lignes = []
+            specialites = {}
+            for source, prat in lot:
+                converti = to_batch_row(prat)
+                if converti is None:
+                    stats.setdefault(source, _empty_stats())['erreurs'] += 1
+                    continue
+                ligne, specialite = converti
+                if specialite:
+                    specialites.setdefault(*specialite)
+                lignes.append((source, ligne))
+
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                ids_par_code(cursor, 'Specialite', specialites)
+                nouveaux = write_batch(cursor, [ligne for _, ligne in lignes])
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                for source, _ in lignes:
+                    erreurs[source] = str(e)
+            else:
+                for source, ligne in lignes:
+                    compteurs = stats.setdefault(source, _empty_stats())
+                    if ligne['rpps'] in nouveaux:
+                        compteurs['inseres'] += 1
+                        nouveaux.discard(ligne['rpps'])
+                    else:
+                        compteurs['doublons'] += 1
+            finally:
+                lot.clear()
+                metriques.observe('crawl_db_write_duration_seconds', time.time() - start_time)
+
+        try:
+            while True:
+                try:
+                    kind, source, item = self.queue.get(timeout=self.interval)
+                except queue.Empty:
+                    kind = None
+                metriques.set_gauge('crawl_queue_depth', self.queue.qsize(), file='ecriture')
+
+                if kind == _PRATICIEN:
+                    lot.append((source, item))
+                    if len(lot) < self.batch_size and time.monotonic() - last_flush < self.interval:
+                        continue
+                flush()
+                last_flush = time.monotonic()
+
+                if kind == _SYNC:
+                    done, box = item
+                    if source in erreurs:
+                        box['erreur'] = erreurs.pop(source)
+                        stats.pop(source, None)
+                    else:
+                        box['stats'] = stats.pop(source, _empty_stats())
+                    done.set()
+                elif kind == _STOP:
+                    return
+        finally:
+            conn.close()
+
+
+class NdjsonSink:
+    """Écrit les praticiens dans un fichier NDJSON (repris s'il existe, voir NdjsonWriter)"""
+
+    def __init__(self, path: str):
+        self.writer = NdjsonWriter(path)
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def write(self, prat: Dict, source: Hashable = None):
+        with self.lock:
+            compteurs = self.stats.setdefault(source, _empty_stats())
+            compteurs['inseres' if self.writer.write(prat) else 'doublons'] += 1
+
+    def sync(self, source: Hashable = None) -> Dict[str, int]:
+        with self.lock:
+            return self.stats.pop(source, _empty_stats())
+
+    def close(self):
+        with self.lock:
+            self.writer.close()
+
+
+class TeeSink:
+    """Transmet les praticiens à plusieurs puits ; les compteurs sont ceux du premier"""
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def write(self, prat: Dict, source: Hashable = None):
+        for sink in self.sinks:
+            sink.write(prat, source)
+
+    def sync(self, source: Hashable = None) -> Dict[str, int]:
+        results = [sink.sync(source) for sink in self.sinks]
+        return results[0]
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def open_sink(db_name: Optional[str] = None, ndjson: Optional[str] = None):
+    """Puits vers la base et/ou un fichier NDJSON"""
+    sinks = []
+    if db_name:
+        sinks.append(SqliteSink(db_name))
+    if ndjson:
+        sinks.append(NdjsonSink(ndjson))
+    if not sinks:
+        raise ValueError("Aucun puits : indiquer une base ou un fichier NDJSON")
+    return sinks[0] if len(sinks) == 1 else TeeSink(*sinks)
@@ -1,17 +1,42 @@
-import requests
+"""
+Nomenclature des spécialités (TRE-A02-ProfessionSavFaire-CISIS) : code -> libellé
 
-URL = "https://smt.esante.gouv.fr/fhir/CodeSystem/TRE-A02-ProfessionSavFaire-CISIS"
+La nomenclature est gardée sur disque (SPE_CACHE_FILE) avec sa version et son ETag :
+- moins de SPE_CACHE_TTL_HOURS heures : utilisée telle quelle, sans réseau
+- au-delà : requête conditionnelle (If-None-Match / If-Modified-Since), re-téléchargée
+  seulement si elle a changé ; si le serveur est injoignable, l'ancienne copie sert
 
-def fetch_codes():
+get_spe() est une simple recherche en mémoire une fois la nomenclature chargée
+(load_codes(), appelée au premier get_spe si besoin).
+
+Usage: python3 sm.py [--refresh] [base.db]   # Met à jour le cache (et la table Specialite)
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from api_client import SMT_API, APIError, request
+
+URL = f"{SMT_API}/CodeSystem/TRE-A02-ProfessionSavFaire-CISIS"
+
+# Copie locale de la nomenclature (chaîne vide = pas de persistance)
+SPE_CACHE_FILE = os.environ.get('SPE_CACHE_FILE', 'cache_specialites.json')
+SPE_CACHE_TTL_HOURS = 24
+
+_codes = None
+_lock = threading.Lock()
+
+
+def build_codes(data: Dict) -> Dict[str, str]:
     """
-    Télécharge la nomenclature TRE-A02 et construit un dict :
-    code -> libellé.
+    Construit le dict code -> libellé à partir du CodeSystem.
     Gère aussi les codes abrégés (ex : SM08 -> 08).
     """
-    resp = requests.get(URL)
-    resp.raise_for_status()
-    data = resp.json()
-
     codes = {}
 
     for entry in data.get("concept", []):
@@ -37,6 +62,130 @@ def fetch_codes():
     return codes
 
 
+def fetch_codes() -> Dict[str, str]:
+    """Télécharge la nomenclature TRE-A02 et construit un dict code -> libellé"""
+    return build_codes(download()['data'])
+
+
+def download(cached: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    Télécharge le CodeSystem ; avec une copie en cache, requête conditionnelle.
+
+    Returns:
+        dict: {'data', 'version', 'etag', 'last_modified'}, ou None si la copie est à jour (304)
+    """
+    headers = {}
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    response = request('CodeSystem', URL, headers=headers, timeout=60)
+    if response.status_code == 304:
+        return None
+
+    try:
+        data = response.json()
+    except ValueError as e:
+        raise APIError('CodeSystem', f"réponse JSON invalide: {e}")
+    return {
+        'data': data,
+        'version': data.get('version'),
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    }
+
+
+def read_cache() -> Optional[Dict]:
+    """Copie locale de la nomenclature (None si absente ou illisible)"""
+    if not SPE_CACHE_FILE or not os.path.exists(SPE_CACHE_FILE):
+        return None
+    try:
+        with open(SPE_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return cached if isinstance(cached.get('codes'), dict) else None
+
+
+def write_cache(cached: Dict):
+    """Écrit la copie locale (fichier temporaire puis renommage : jamais de fichier à moitié écrit)"""
+    if not SPE_CACHE_FILE:
+        return
+    tmp = f"{SPE_CACHE_FILE}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(cached, f, ensure_ascii=False)
+    os.replace(tmp, SPE_CACHE_FILE)
+
+
+def refresh_cache(force: bool = False) -> Dict:
+    """
+    Copie locale à jour de la nomenclature : {'version', 'etag', 'last_modified', 'verifie_le', 'codes'}
+
+    Args:
+        force: Vérifier auprès du serveur même si la copie a moins de SPE_CACHE_TTL_HOURS heures
+    """
+    cached = read_cache()
+    if cached and not force:
+        checked = datetime.fromisoformat(cached['verifie_le'])
+        if datetime.now() - checked < timedelta(hours=SPE_CACHE_TTL_HOURS):
+            return cached
+
+    try:
+        fresh = download(cached)
+    except APIError as e:
+        if cached is None:
+            raise
+        print(f"⚠️  Nomenclature des spécialités non vérifiée ({e}) : copie du {cached['verifie_le']} utilisée")
+        return cached
+
+    if fresh is not None:
+        cached = {
+            'version': fresh['version'],
+            'etag': fresh['etag'],
+            'last_modified': fresh['last_modified'],
+            'codes': build_codes(fresh['data']),
+        }
+    cached['verifie_le'] = datetime.now().isoformat()
+    write_cache(cached)
+    return cached
+
+
+def load_codes(force: bool = False) -> Dict[str, str]:
+    """Charge la nomenclature en mémoire (une seule fois par processus, sauf force)"""
+    global _codes
+    with _lock:
+        if _codes is None or force:
+            _codes = refresh_cache(force)['codes']
+        return _codes
+
+
+def preload_specialites(conn) -> int:
+    """
+    Remplit la table Specialite avec toutes les spécialités ordinales (SMxx -> xx) de la
+    nomenclature. Non bloquant : sans nomenclature, les spécialités restent ajoutées au fil
+    des praticiens. Retourne le nombre de spécialités écrites.
+    """
+    try:
+        codes = load_codes()
+    except APIError as e:
+        # Les chargements ne préchargent qu'une base encore sans spécialités : reprise manuelle
+        print(f"⚠️  Spécialités non préchargées (nomenclature injoignable: {e}) : "
+              f"relancer python3 sm.py <base> une fois le serveur disponible")
+        return 0
+
+    specialites = [(code[2:], libelle) for code, libelle in codes.items()
+                   if code.startswith('SM') and len(code) > 2]
+    conn.executemany(
+        "INSERT INTO Specialite (code, libelle) VALUES (?, ?) "
+        "ON CONFLICT (code) DO UPDATE SET libelle = excluded.libelle",
+        specialites
+    )
+    conn.commit()
+    return len(specialites)
+
+
 # ⬇️ La fonction simple que tu vas utiliser partout
 def get_spe(code: str):
     """
@@ -45,12 +194,25 @@ def get_spe(code: str):
     """
     code = code.strip()
 
-    # On charge une seule fois (lazy loading)
-    if not hasattr(get_spe, "codes_dict"):
-        get_spe.codes_dict = fetch_codes()
-
-    d = get_spe.codes_dict
+    d = _codes if _codes is not None else load_codes()
     return d.get(code, d.get(code.upper(), f"Code {code} non trouvé"))
 
+
+def main():
+    """Point d'entrée principal"""
+    args = [arg for arg in sys.argv[1:] if arg != '--refresh']
+    codes = load_codes(force='--refresh' in sys.argv)
+    cached = read_cache() or {}
+    print(f"✅ Nomenclature {cached.get('version') or '(sans version)'}: {len(codes)} codes"
+          + (f" (vérifiée le {cached['verifie_le']})" if cached else ""))
+
+    if args:
+        conn = sqlite3.connect(args[0])
+        print(f"✅ {preload_specialites(conn)} spécialités écrites dans {args[0]}")
+        conn.close()
+
+    print(get_spe("48"))  # Test rapide
+
+
 if __name__ == "__main__":
-    print(get_spe("48"))  # Test rapide
\ No newline at end of file
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Instantané colonnaire des praticiens actifs : jointure Praticien/Adresse dénormalisée, au
+format Arrow IPC non compressé, lisible par projection mémoire (memory map) sans copie ni
+conversion (backend/compute_regions.py, analyses avec pyarrow, pandas, polars, DuckDB...)
+
+Colonnes :
+- rpps, adresse_id
+- metier_id, spe_id : codes de la nomenclature en dictionnaires (le filtre par métier compare des entiers)
+- latitude, longitude, x, y (Lambert-93, EPSG:2154) : NaN si l'adresse n'est pas géocodée,
+  sans masque de validité (tableaux NumPy obtenus sans copie)
+- commune (code INSEE, d'après le registre des communes, voir registre_communes.py), departement
+
+Fichier : <base sans extension>.arrow à côté de la base (voir snapshot_path), réécrit à la fin
+de chaque chargement (refresh_snapshot). Nécessite pyarrow (pip install pyarrow) : sans lui,
+les chargements continuent sans instantané.
+
+Usage: python3 snapshot_praticiens.py [base.db] [--sortie fichier.arrow]
+"""
+
+import argparse
+import math
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Callable, Optional, Tuple
+
+from ban_geocoder import normaliser
+from create_database import SchemaPerime, connect_lecture, verifier_schema
+from registre_communes import COMMUNES_DB
+
+# Praticiens par lot Arrow (record batch)
+SNAPSHOT_CHUNK = 65536
+
+# Lambert-93 (conique conforme, ellipsoïde GRS80) : constantes de projection IGN
+_A, _E = 6378137.0, 0.0818191910428158
+_LAMBDA0 = math.radians(3.0)
+_X0, _Y0 = 700000.0, 6600000.0
+
+
+def _m(phi: float) -> float:
+    return math.cos(phi) / math.sqrt(1 - (_E * math.sin(phi)) ** 2)
+
+
+def _t(phi: float) -> float:
+    return math.tan(math.pi / 4 - phi / 2) / ((1 - _E * math.sin(phi)) / (1 + _E * math.sin(phi))) ** (_E / 2)
+
+
+_PHI1, _PHI2 = math.radians(44.0), math.radians(49.0)
+_N = (math.log(_m(_PHI1)) - math.log(_m(_PHI2))) / (math.log(_t(_PHI1)) - math.log(_t(_PHI2)))
+_AF = _A * _m(_PHI1) / (_N * _t(_PHI1) ** _N)
+_RHO0 = _AF * _t(math.radians(46.5)) ** _N
+
+
+def lambert93(latitude: float, longitude: float) -> Tuple[float, float]:
+    """Coordonnées Lambert-93 (EPSG:2154, mètres) d'un point WGS84"""
+    rho = _AF * _t(math.radians(latitude)) ** _N
+    theta = _N * (math.radians(longitude) - _LAMBDA0)
+    return _X0 + rho * math.sin(theta), _Y0 + _RHO0 - rho * math.cos(theta)
+
+
+def snapshot_path(db_name: str) -> str:
+    """Fichier de l'instantané d'une base (GrandEst.db -> GrandEst.arrow)"""
+    return os.path.splitext(db_name)[0] + '.arrow'
+
+
+def departement(code_postal: Optional[str]) -> Optional[str]:
+    """Département d'un code postal (même règle que create_database.departement_sql)"""
+    if not code_postal:
+        return None
+    return code_postal[:3] if code_postal[:2] in ('97', '98') else code_postal[:2]
+
+
+def commune_resolver() -> Callable[[Optional[str], Optional[str]], Optional[str]]:
+    """
+    Code INSEE de la commune d'une adresse (code postal, ville) d'après le registre des
+    communes : commune du code postal portant ce nom, ou seule commune du code postal.
+    Sans registre (ou région non chargée) : None.
+    """
+    par_nom = {}
+    par_cp = {}
+    if os.path.exists(COMMUNES_DB):
+        registre = sqlite3.connect(COMMUNES_DB)
+        try:
+            rows = registre.execute("""
+                SELECT cp.code_postal, c.code, c.nom
+                FROM RegistreCodePostal cp
+                JOIN RegistreCommune c ON c.code = cp.commune
+            """).fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+        finally:
+            registre.close()
+        for code_postal, code, nom in rows:
+            par_nom[(code_postal, normaliser(nom))] = code
+            par_cp.setdefault(code_postal, set()).add(code)
+
+    cache = {}
+
+    def resolve(code_postal: Optional[str], ville: Optional[str]) -> Optional[str]:
+        cle = (code_postal, ville)
+        if cle not in cache:
+            code = par_nom.get((code_postal, normaliser(ville)))
+            if code is None and len(par_cp.get(code_postal, ())) == 1:
+                code = next(iter(par_cp[code_postal]))
+            cache[cle] = code
+        return cache[cle]
+
+    return resolve
+
+
+def write_snapshot(db_name: str, sortie: Optional[str] = None, chunk: int = SNAPSHOT_CHUNK) -> int:
+    """
+    Écrit l'instantané des praticiens actifs de la base (par lots : mémoire bornée), dans un
+    fichier temporaire renommé à la fin (les lecteurs en cours gardent l'ancien).
+    Retourne le nombre de praticiens écrits.
+    """
+    import pyarrow as pa
+
+    sortie = sortie or snapshot_path(db_name)
+    conn = connect_lecture(db_name)
+    try:
+        cursor = conn.cursor()
+
+        # Dictionnaires complets (codes), identiques pour tous les lots (exigé par le format fichier)
+        cursor.execute("SELECT metier_id, code FROM Metier ORDER BY code")
+        metiers = cursor.fetchall()
+        cursor.execute("SELECT spe_id, code FROM Specialite ORDER BY code")
+        specialites = cursor.fetchall()
+        index_metier = {metier_id: i for i, (metier_id, _) in enumerate(metiers)}
+        index_spe = {spe_id: i for i, (spe_id, _) in enumerate(specialites)}
+        dict_metiers = pa.array([code for _, code in metiers], pa.string())
+        dict_specialites = pa.array([code for _, code in specialites], pa.string())
+
+        schema = pa.schema([
+            ('rpps', pa.string()),
+            ('adresse_id', pa.int64()),
+            ('metier_id', pa.dictionary(pa.int32(), pa.string())),
+            ('spe_id', pa.dictionary(pa.int32(), pa.string())),
+            ('latitude', pa.float64()),
+            ('longitude', pa.float64()),
+            ('x', pa.float64()),
+            ('y', pa.float64()),
+            ('commune', pa.string()),
+            ('departement', pa.string()),
+        ], metadata={
+            'source': os.path.abspath(db_name),
+            'cree_le': datetime.now().isoformat(),
+            'crs_xy': 'EPSG:2154',
+        })
+
+        commune = commune_resolver()
+        cursor.execute("""
+            SELECT p.rpps, p.adresse_id, p.metier_id, p.spe_id,
+                   a.latitude, a.longitude, a.code_postal, a.ville
+            FROM Praticien p
+            LEFT JOIN Adresse a ON a.adresse_id = p.adresse_id
+            WHERE p.retire_le IS NULL
+        """)
+
+        tmp = f"{sortie}.{os.getpid()}.tmp"
+        count = 0
+        try:
+            with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+                while True:
+                    rows = cursor.fetchmany(chunk)
+                    if not rows:
+                        break
+                    nan = float('nan')
+                    lats, lons, xs, ys = [], [], [], []
+                    for row in rows:
+                        lat, lon = row[4], row[5]
+                        if lat is None or lon is None:
+                            lat = lon = x = y = nan
+                        else:
+                            x, y = lambert93(lat, lon)
+                        lats.append(lat)
+                        lons.append(lon)
+                        xs.append(x)
+                        ys.append(y)
+                    writer.write_batch(pa.record_batch([
+                        pa.array([row[0] for row in rows], pa.string()),
+                        pa.array([row[1] for row in rows], pa.int64()),
+                        pa.DictionaryArray.from_arrays(
+                            pa.array([index_metier.get(row[2]) for row in rows], pa.int32()), dict_metiers),
+                        pa.DictionaryArray.from_arrays(
+                            pa.array([index_spe.get(row[3]) for row in rows], pa.int32()), dict_specialites),
+                        pa.array(lats, pa.float64()),
+                        pa.array(lons, pa.float64()),
+                        pa.array(xs, pa.float64()),
+                        pa.array(ys, pa.float64()),
+                        pa.array([commune(row[6], row[7]) for row in rows], pa.string()),
+                        pa.array([departement(row[6]) for row in rows], pa.string()),
+                    ], schema=schema))
+                    count += len(rows)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        os.replace(tmp, sortie)
+        return count
+    finally:
+        conn.close()
+
+
+def refresh_snapshot(db_name: str) -> Optional[int]:
+    """
+    Réécrit l'instantané après un chargement. Non bloquant : sans pyarrow ou en cas d'erreur,
+    le chargement reste valide et les lecteurs reviennent aux requêtes SQL.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("ℹ️  Instantané colonnaire non écrit (pyarrow absent)")
+        return None
+
+    start_time = time.time()
+    try:
+        count = write_snapshot(db_name)
+    except Exception as e:
+        print(f"⚠️  Instantané colonnaire non écrit: {e}")
+        return None
+    print(f"🧊 Instantané {snapshot_path(db_name)} : {count} praticiens ({time.time() - start_time:.1f}s)")
+    return count
+
+
+def main():
+    """Point d'entrée principal"""
+    parser = argparse.ArgumentParser(description="Écrit l'instantané colonnaire (Arrow) des praticiens actifs")
+    parser.add_argument('db', nargs='?', default="praticiens_sante.db", help="Base SQLite")
+    parser.add_argument('--sortie', help="Fichier Arrow (défaut : <base>.arrow)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ Base introuvable: {args.db}")
+        return
+
+    # Base lue sans être modifiée : elle doit être au schéma courant (voir create_database.migrate_database)
+    conn = connect_lecture(args.db)
+    try:
+        verifier_schema(conn)
+    except SchemaPerime as e:
+        print(f"❌ {e}")
+        return
+    finally:
+        conn.close()
+
+    start_time = time.time()
+    count = write_snapshot(args.db, args.sortie)
+    print(f"✅ {count} praticiens écrits dans {args.sortie or snapshot_path(args.db)} en {time.time() - start_time:.1f}s")
+
+
+if __name__ == "__main__":
+    main()